@@ -1,9 +1,16 @@
 from __future__ import annotations
-from quart import Blueprint, jsonify, current_app  # type: ignore
+from quart import Blueprint, jsonify, current_app, request  # type: ignore
 import time
+from pathlib import Path
+from werkzeug.http import http_date
+from . import metrics
+from .catalog import catalog_for
 from .config import Config
-from .services.video import scan_and_convert_videos
-from .services.music import scan_and_convert_music
+from .playlist_cache import playlist_cache, COMPRESS_MIN_BYTES, brotli
+from .playlist_index import PlaylistQuery, StaleCursor
+from .search import search_index, index_tracks, search_tracks, DEFAULT_LIMIT as SEARCH_DEFAULT_LIMIT, MAX_LIMIT as SEARCH_MAX_LIMIT
+from .jobs import STATES as JOB_STATES
+from .services.tasks import PRIORITY_PLAYLIST, PRIORITY_SCAN
 
 
 bp = Blueprint('api', __name__)
@@ -18,88 +25,215 @@ async def health():
     return jsonify({'status': 'ok'})
 
 
-@bp.get('/video/playlist')
-async def get_video_playlist():
-    cfg = get_cfg()
+async def _playlist_response(path: Path, kind: str):
+    """Serve a playlist file from the in-memory cache with ETag/Last-Modified validation.
+
+    With any of ``cursor``/``limit``/``artist``/``title``/``format``/``hasHLS``/``sort``
+    in the query string, returns one page ``{items, nextCursor, total, version}``
+    instead of the full array. ``version`` is the store's write counter (None
+    for files written without one) and is also sent as ``X-Playlist-Version``.
+    Cursors are opaque and tied to the playlist content and the query; one
+    issued before the list was rewritten gets 409.
+    """
     try:
-        text = cfg.VIDEO_PLAYLIST_FILE.read_text(encoding='utf-8')
-        # Validate JSON to avoid propagating corrupt files
-        import json as _json
-        data = _json.loads(text)
-        return jsonify(data)
-    except FileNotFoundError:
-        return jsonify([])
+        query = PlaylistQuery.from_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        entry = await playlist_cache.get(path)
     except Exception as e:  # pragma: no cover
-        current_app.logger.exception("read video playlist failed: %s", e)
+        current_app.logger.exception("read %s playlist failed: %s", kind, e)
+        entry = None
+    if query is not None:
+        if entry is None:
+            if query.cursor:
+                return jsonify({'error': 'playlist changed since this cursor was issued; restart from the first page',
+                                'version': None}), 409
+            return jsonify({'items': [], 'nextCursor': None, 'total': 0, 'version': None})
+        try:
+            page = entry.index.page(query)
+        except StaleCursor as e:
+            return jsonify({'error': str(e), 'version': entry.version}), 409
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        page['version'] = entry.version
+        metrics.PLAYLIST_RESPONSES.inc(kind, 'page')
+        resp = jsonify(page)
+        if entry.version is not None:
+            resp.headers['X-Playlist-Version'] = str(entry.version)
+        return resp
+    if entry is None:
         return jsonify([])
 
+    encoding = None
+    if len(entry.body) >= COMPRESS_MIN_BYTES:
+        accept = request.accept_encodings
+        if brotli is not None and accept['br']:
+            encoding = 'br'
+        elif accept['gzip']:
+            encoding = 'gzip'
+    etag = f"{entry.etag}-{encoding}" if encoding else entry.etag
+    headers = {
+        'ETag': f'"{etag}"',
+        'Last-Modified': http_date(entry.mtime),
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding',
+    }
+    if entry.version is not None:
+        headers['X-Playlist-Version'] = str(entry.version)
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        ims = request.if_modified_since
+        not_modified = ims is not None and int(entry.mtime) <= ims.timestamp()
+    if not_modified:
+        metrics.PLAYLIST_RESPONSES.inc(kind, 'not_modified')
+        return current_app.response_class(status=304, headers=headers)
+    metrics.PLAYLIST_RESPONSES.inc(kind, 'full')
+
+    body = entry.body
+    if encoding:
+        body = await playlist_cache.encoded(entry, encoding)
+        headers['Content-Encoding'] = encoding
+    return current_app.response_class(body, status=200, headers=headers, mimetype='application/json')
 
-@bp.post('/scan/video')
-async def scan_video():
-    cfg = get_cfg()
-    app = current_app
-    lock = app.scan_locks['video']
-    now = time.time()
-    last = app.scan_last.get('video', 0.0)
-    debounce = app.config.get('SCAN_DEBOUNCE_SECONDS', 10)
 
-    # 正在运行
-    if lock.locked():
-        return jsonify({'error': 'video scan is already running'}), 409
-    # 防抖
-    if last and (now - last) < debounce:
-        wait_sec = max(0, int(debounce - (now - last)))
-        return jsonify({'error': f'video scan debounced, retry in ~{wait_sec}s'}), 429
-    lines: list[str] = []
+@bp.get('/video/playlist')
+async def get_video_playlist():
+    return await _playlist_response(get_cfg().VIDEO_PLAYLIST_FILE, 'video')
 
-    def log(line: str):
-        lines.append(line)
-        current_app.logger.info(line)
 
-    async with lock:
-        app.scan_last['video'] = time.time()
-        result = await scan_and_convert_videos(cfg, log=log)
-    return jsonify({'result': result, 'logs': lines[-200:]})
+@bp.post('/scan/video')
+async def scan_video():
+    return _enqueue_scan('video')
 
 
 @bp.get('/music/playlist')
 async def get_music_playlist():
-    cfg = get_cfg()
-    try:
-        text = cfg.MUSIC_PLAYLIST_FILE.read_text(encoding='utf-8')
-        import json as _json
-        data = _json.loads(text)
-        return jsonify(data)
-    except FileNotFoundError:
-        return jsonify([])
-    except Exception as e:  # pragma: no cover
-        current_app.logger.exception("read music playlist failed: %s", e)
-        return jsonify([])
+    return await _playlist_response(get_cfg().MUSIC_PLAYLIST_FILE, 'music')
 
 
 @bp.post('/scan/music')
 async def scan_music():
-    cfg = get_cfg()
+    return _enqueue_scan('music')
+
+
+def _enqueue_scan(kind: str):
+    """Queue a scan job and return its id right away (202); transcodes run in background workers."""
     app = current_app
-    lock = app.scan_locks['music']
+    queue = app.job_queue
     now = time.time()
-    last = app.scan_last.get('music', 0.0)
+    last = app.scan_last.get(kind, 0.0)
     debounce = app.config.get('SCAN_DEBOUNCE_SECONDS', 10)
-
-    # 正在运行
-    if lock.locked():
-        return jsonify({'error': 'music scan is already running'}), 409
+    # 先校验参数，无效请求不占用防抖窗口；优先级限制在播放列表任务与扫描默认值之间
+    try:
+        priority = int(request.args.get('priority') or PRIORITY_SCAN)
+    except ValueError:
+        return jsonify({'error': 'priority must be an integer'}), 400
+    priority = max(PRIORITY_PLAYLIST, min(priority, PRIORITY_SCAN))
+
+    # 已有排队/运行中的扫描：直接返回该任务
+    job = queue.find_pending(kind, 'scan')
+    if job:
+        return jsonify({'job': job.to_dict()}), 202
     # 防抖
     if last and (now - last) < debounce:
         wait_sec = max(0, int(debounce - (now - last)))
-        return jsonify({'error': f'music scan debounced, retry in ~{wait_sec}s'}), 429
-    lines: list[str] = []
+        return jsonify({'error': f'{kind} scan debounced, retry in ~{wait_sec}s'}), 429
+    app.scan_last[kind] = now
+    job_id = queue.enqueue(kind, 'scan', priority=priority)
+    return jsonify({'job': queue.get(job_id).to_dict()}), 202
+
+
+@bp.get('/jobs')
+async def list_jobs():
+    args = request.args
+    state = args.get('state') or None
+    if state and state not in JOB_STATES:
+        return jsonify({'error': f"state must be one of: {', '.join(JOB_STATES)}"}), 400
+    try:
+        limit = max(1, min(int(args.get('limit') or 100), 1000))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    queue = current_app.job_queue
+    jobs = queue.list(state=state, kind=args.get('kind') or None, type=args.get('type') or None, limit=limit)
+    return jsonify({'jobs': [j.to_dict() for j in jobs], 'counts': queue.counts()})
+
+
+@bp.get('/jobs/<int:job_id>')
+async def get_job(job_id: int):
+    job = current_app.job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'job not found'}), 404
+    return jsonify(job.to_dict())
+
+
+@bp.get('/<kind>/tracks')
+async def find_tracks(kind: str):
+    """Catalog lookup by ``artist`` / ``title`` prefix (case-sensitive, index range scan)."""
+    if kind not in ('video', 'music'):
+        return jsonify({'error': "kind must be 'video' or 'music'"}), 404
+    args = request.args
+    try:
+        limit = max(1, min(int(args.get('limit') or 50), 500))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    items = catalog_for(get_cfg()).find_tracks(kind, artist=args.get('artist') or None, title=args.get('title') or None, limit=limit)
+    return jsonify({'items': items})
 
-    def log(line: str):
-        lines.append(line)
-        current_app.logger.info(line)
 
-    async with lock:
-        app.scan_last['music'] = time.time()
-        result = await scan_and_convert_music(cfg, log=log)
-    return jsonify({'result': result, 'logs': lines[-200:]})
+@bp.get('/<kind>/tracks/<track_id>')
+async def get_track(kind: str, track_id: str):
+    track = catalog_for(get_cfg()).track(kind, track_id) if kind in ('video', 'music') else None
+    if track is None:
+        return jsonify({'error': 'track not found'}), 404
+    return jsonify(track)
+
+
+@bp.get('/catalog')
+async def catalog_status():
+    """Row counts per library and the most recent scans."""
+    catalog = catalog_for(get_cfg())
+    try:
+        limit = max(1, min(int(request.args.get('limit') or 20), 200))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    return jsonify({'counts': catalog.counts(), 'scans': catalog.scans(request.args.get('kind') or None, limit)})
+
+
+async def _sync_search_index(kind: str, path: Path):
+    """Bring the search index up to date with the playlist file (diff-based, per version)."""
+    try:
+        entry = await playlist_cache.get(path)
+    except Exception as e:  # pragma: no cover
+        current_app.logger.exception("read %s playlist failed: %s", kind, e)
+        return
+    if entry is None:
+        if search_index.version(kind) is not None:
+            await index_tracks(kind, [], None)
+        return
+    if search_index.version(kind) != entry.etag:
+        await index_tracks(kind, entry.tracks if isinstance(entry.tracks, list) else [], entry.etag)
+
+
+@bp.get('/search')
+async def search():
+    q = (request.args.get('q') or '').strip()
+    kind = request.args.get('kind') or None
+    if kind not in (None, 'video', 'music'):
+        return jsonify({'error': "kind must be 'video' or 'music'"}), 400
+    try:
+        limit = int(request.args.get('limit') or SEARCH_DEFAULT_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    if not q:
+        return jsonify({'items': [], 'total': 0})
+
+    cfg = get_cfg()
+    if kind in (None, 'video'):
+        await _sync_search_index('video', cfg.VIDEO_PLAYLIST_FILE)
+    if kind in (None, 'music'):
+        await _sync_search_index('music', cfg.MUSIC_PLAYLIST_FILE)
+    return jsonify(await search_tracks(q, kind, limit))
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from quart import Quart, send_from_directory, websocket, request
+from quart import Quart, abort, g, websocket, request
 import os
 from urllib.parse import urlparse
 import time
@@ -8,14 +8,30 @@ import time
 
 # Support both package and script execution
 try:
+    from . import metrics
     from .config import Config
     from .api import bp as api_bp
+    from .catalog import close_catalogs
+    from .jobs import JobQueue
+    from .media import serve_media
+    from .site import SiteRoutes, serve_site_file
+    from .services.events import ScanReporter
+    from .services.hub import ScanHub
+    from .services.tasks import entry_point, make_upload_watcher, register_handlers
 except Exception:
     import os
     import sys
     sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from backend import metrics
     from backend.config import Config
     from backend.api import bp as api_bp
+    from backend.catalog import close_catalogs
+    from backend.jobs import JobQueue
+    from backend.media import serve_media
+    from backend.site import SiteRoutes, serve_site_file
+    from backend.services.events import ScanReporter
+    from backend.services.hub import ScanHub
+    from backend.services.tasks import entry_point, make_upload_watcher, register_handlers
 
 
 def create_app() -> Quart:
@@ -27,40 +43,25 @@ def create_app() -> Quart:
     app.register_blueprint(api_bp, url_prefix='/api')
 
     # Static serving for HLS and uploads during development (and simple deployments)
-    async def _serve_static(root_dir: str, filename: str):
-        resp = await send_from_directory(root_dir, filename)
-        # Fix common HLS MIME types
-        if filename.endswith('.m3u8'):
-            resp.mimetype = 'application/vnd.apple.mpegurl'
-        elif filename.endswith('.ts'):
-            resp.mimetype = 'video/mp2t'
-        return resp
-
     @app.get('/video-hls/<path:filename>')
     async def _video_hls(filename: str):
-        return await _serve_static(str(cfg.VIDEO_HLS_DIR), filename)
+        return await serve_media(cfg.VIDEO_HLS_DIR, filename, cfg.VIDEO_HLS_PUBLIC_PREFIX)
 
     @app.get('/music-hls/<path:filename>')
     async def _music_hls(filename: str):
-        return await _serve_static(str(cfg.MUSIC_HLS_DIR), filename)
+        return await serve_media(cfg.MUSIC_HLS_DIR, filename, cfg.MUSIC_HLS_PUBLIC_PREFIX, audio=True)
 
     @app.get('/video-upload/<path:filename>')
     async def _video_upload(filename: str):
-        return await send_from_directory(str(cfg.VIDEO_UPLOAD_DIR), filename)
+        return await serve_media(cfg.VIDEO_UPLOAD_DIR, filename, cfg.VIDEO_ORIG_PUBLIC_PREFIX, hls=False)
 
     @app.get('/music-upload/<path:filename>')
     async def _music_upload(filename: str):
-        return await send_from_directory(str(cfg.MUSIC_UPLOAD_DIR), filename)
+        return await serve_media(cfg.MUSIC_UPLOAD_DIR, filename, cfg.MUSIC_ORIG_PUBLIC_PREFIX, hls=False, audio=True)
 
     # WebSocket streaming logs for scans
     import asyncio
     import json as _json
-    try:
-        from .services.video import scan_and_convert_videos
-        from .services.music import scan_and_convert_music
-    except Exception:  # running as script (no package context)
-        from backend.services.video import scan_and_convert_videos
-        from backend.services.music import scan_and_convert_music
 
     app.scan_locks = {
         'video': asyncio.Lock(),
@@ -78,45 +79,114 @@ def create_app() -> Quart:
         debounce_sec = 10
     app.config['SCAN_DEBOUNCE_SECONDS'] = debounce_sec
 
+    # 后台任务队列：POST /api/scan/* 只入队，由这里的 worker 逐个消费
+    # 多一个 worker 让扫描/刷新任务不被长时间转码占满
+    app.job_queue = JobQueue(
+        cfg.JOBS_DB_FILE, workers=cfg.TRANSCODE_CONCURRENCY + 1,
+        max_attempts=cfg.JOB_MAX_ATTEMPTS, backoff_seconds=cfg.JOB_RETRY_BACKOFF_SECONDS,
+        logger=app.logger,
+    )
+    # 所有扫描（WebSocket、任务队列、上传监听）都发布到 ScanHub，任何 WebSocket 客户端都能订阅
+    app.scan_hub = ScanHub(replay=cfg.SCAN_REPLAY_EVENTS, queue_limit=cfg.SCAN_SUBSCRIBER_QUEUE)
+    register_handlers(app.job_queue, cfg, app.scan_locks, app.logger, hub=app.scan_hub)
+    # 上传目录监听（可选）：新文件写完后自动入队单文件扫描
+    app.upload_watcher = make_upload_watcher(app.job_queue, cfg, app.logger) if cfg.WATCH_UPLOADS else None
+
+    # ========== Metrics ==========
+    # 仅在开启时注册钩子与 /metrics，关闭时请求路径上没有任何额外开销
+    metrics.enabled = cfg.METRICS_ENABLE
+    if cfg.METRICS_ENABLE:
+        def _job_counts():
+            for kind, states in app.job_queue.counts().items():
+                for state, n in states.items():
+                    yield (kind, state), n
+
+        metrics.JOBS.collect = _job_counts
+
+        @app.before_request
+        async def _metrics_start():
+            g.metrics_t0 = time.perf_counter()
+
+        @app.after_request
+        async def _metrics_finish(resp):
+            t0 = g.get('metrics_t0')
+            if t0 is not None:
+                # 按路由模板而不是实际路径打标签，避免标签基数随文件数增长
+                route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+                metrics.REQUEST_SECONDS.observe(time.perf_counter() - t0, route, request.method)
+                metrics.REQUESTS.inc(route, str(resp.status_code))
+                if resp.content_length:
+                    metrics.RESPONSE_BYTES.inc(route, value=resp.content_length)
+            return resp
+
+        @app.get('/metrics')
+        async def _metrics():
+            return app.response_class(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    @app.before_serving
+    async def _start_jobs():
+        await app.job_queue.start()
+        if app.upload_watcher is not None:
+            await app.upload_watcher.start()
+
+    @app.after_serving
+    async def _stop_jobs():
+        await app.scan_hub.stop()
+        if app.upload_watcher is not None:
+            await app.upload_watcher.stop()
+        await app.job_queue.stop()
+        close_catalogs()
+
+    # 扫描事件推送的节拍：每个订阅者每个 tick 最多一条 WebSocket 消息
+    SCAN_WS_TICK_SECONDS = 0.2
+
+    # WebSocket 触发的扫描在后台任务中运行，与发起它的连接无关；
+    # 之后连上来的客户端直接订阅同一次扫描（先回放最近的事件，再接收实时事件）
+    async def _scan(kind: str, rep: ScanReporter) -> dict:
+        # 扫描服务在首次扫描时才导入
+        return await entry_point(kind, 'scan')(app.config['APP_CONFIG'], log=rep)
+
+    async def _follow_scan(run):
+        sub, replay = run.subscribe()
+        try:
+            if replay:
+                await websocket.send(_json.dumps({ 'type': 'batch', 'replay': True, 'events': replay }))
+            while run.running or sub.events or sub.latest:
+                await sub.wake.wait()
+                if sub.dropped:
+                    await websocket.send(_json.dumps({ 'type': 'error', 'message': f'{run.kind} scan subscriber fell behind and was dropped; the scan continues' }))
+                    return
+                batch = sub.drain()
+                if batch:
+                    await websocket.send(_json.dumps({ 'type': 'batch', 'events': batch }))
+                await asyncio.sleep(SCAN_WS_TICK_SECONDS)
+            if run.error is not None:
+                await websocket.send(_json.dumps({ 'type': 'error', 'message': run.error }))
+            else:
+                await websocket.send(_json.dumps({ 'type': 'done', 'result': run.result }))
+        finally:
+            # 客户端断开只影响自己的订阅，扫描照常进行
+            run.unsubscribe(sub)
+
     async def _stream_scan(kind: str):
-        lock = app.scan_locks[kind]
-        cfg2 = app.config['APP_CONFIG']
-        now = time.time()
-        last = app.scan_last.get(kind, 0.0)
-        debounce = app.config.get('SCAN_DEBOUNCE_SECONDS', 10)
-
-        # 若已在运行，直接提示忙碌
-        if lock.locked():
-            try:
-                await websocket.send(_json.dumps({'type': 'error', 'message': f'{kind} scan is already running'}))
-            finally:
-                return
-        # 若在防抖间隔内，拒绝并提示稍后再试
-        if last and (now - last) < debounce:
-            wait_sec = max(0, int(debounce - (now - last)))
-            try:
-                await websocket.send(_json.dumps({'type': 'error', 'message': f'{kind} scan debounced, please retry in ~{wait_sec}s'}))
-            finally:
-                return
-
-        async with lock:
-            # 记录开始时间
-            app.scan_last[kind] = time.time()
-            async def send_log(line: str):
+        run = app.scan_hub.current(kind)
+        if run is None or not run.running:
+            now = time.time()
+            last = app.scan_last.get(kind, 0.0)
+            debounce = app.config.get('SCAN_DEBOUNCE_SECONDS', 10)
+
+            # 若在防抖间隔内，拒绝并提示稍后再试
+            if last and (now - last) < debounce:
+                wait_sec = max(0, int(debounce - (now - last)))
                 try:
-                    await websocket.send(_json.dumps({ 'type': 'log', 'line': line }))
-                except Exception:
-                    # client likely disconnected; stop sending further logs
-                    pass
-
-            try:
-                if kind == 'video':
-                    result = await scan_and_convert_videos(cfg2, log=send_log)
-                else:
-                    result = await scan_and_convert_music(cfg2, log=send_log)
-                await websocket.send(_json.dumps({ 'type': 'done', 'result': result }))
-            except Exception as e:  # pragma: no cover
-                await websocket.send(_json.dumps({ 'type': 'error', 'message': str(e) }))
+                    await websocket.send(_json.dumps({'type': 'error', 'message': f'{kind} scan debounced, please retry in ~{wait_sec}s'}))
+                finally:
+                    return
+            # 记录开始时间
+            app.scan_last[kind] = now
+            # 锁被任务扫描占用时不拒绝：本次扫描排在其后，客户端先订阅着等它开始
+            run = app.scan_hub.start(kind, lambda rep: _scan(kind, rep), lock=app.scan_locks[kind])
+        await _follow_scan(run)
 
     @app.websocket('/ws/scan/video')
     async def ws_scan_video():
@@ -190,7 +260,7 @@ def create_app() -> Quart:
         origin = request.headers.get('Origin')
         if _is_origin_allowed(origin):
             resp.headers['Access-Control-Allow-Origin'] = origin
-            resp.headers['Vary'] = 'Origin'
+            resp.vary.add('Origin')
         # 若无需携带凭证，这里不必强制设置 Allow-Credentials
         # 避免缓存错误（不同 Origin）
         else:
@@ -217,44 +287,34 @@ def create_app() -> Quart:
             return resp
 
     # ========== Frontend: serve static exported site ==========
+    # 路由表在首个请求时由一次目录遍历建立（站点重新部署后自动重建），启动时不检查站点目录；
+    # 之后每个请求只查一次字典，小文件连同压缩版本直接从内存返回
     if cfg.FRONTEND_ENABLE:
         from pathlib import Path
-        site_dir = Path(cfg.FRONTEND_SITE_DIR) if cfg.FRONTEND_SITE_DIR else None
-
-        if site_dir and site_dir.exists():
-            static_dir = site_dir / '_next' / 'static'
-
-            if static_dir.exists():
-                @app.get('/_next/static/<path:filename>')
-                async def _next_static(filename: str):
-                    return await send_from_directory(str(static_dir), filename)
-
-            async def _serve_site_path(p: str):
-                # Try direct file
-                f1 = site_dir / p.lstrip('/')
-                if f1.is_file():
-                    return await send_from_directory(str(site_dir), p.lstrip('/'))
-                # Try directory index
-                f2 = site_dir / p.lstrip('/') / 'index.html'
-                if f2.is_file():
-                    return await send_from_directory(str(f2.parent), 'index.html')
-                # Try html file
-                f3 = site_dir / (p.lstrip('/') + '.html')
-                if f3.is_file():
-                    return await send_from_directory(str(site_dir), p.lstrip('/') + '.html')
-                # Fallback to 404 or index
-                f404 = site_dir / '404.html'
-                if f404.is_file():
-                    return await send_from_directory(str(site_dir), '404.html')
-                return await send_from_directory(str(site_dir), 'index.html')
-
-            @app.get('/')
-            async def _site_index():
-                return await send_from_directory(str(site_dir), 'index.html')
-
-            @app.get('/<path:rest>')
-            async def _site_catch_all(rest: str):
-                return await _serve_site_path('/' + rest)
+        app.site_routes = SiteRoutes(Path(cfg.FRONTEND_SITE_DIR) if cfg.FRONTEND_SITE_DIR else None,
+                                     inline_max=cfg.FRONTEND_INLINE_MAX_BYTES, cache_max=cfg.FRONTEND_CACHE_MAX_BYTES)
+
+        @app.get('/_next/static/<path:filename>')
+        async def _next_static(filename: str):
+            f = await app.site_routes.resolve('/_next/static/' + filename)
+            if f is None:
+                abort(404)
+            return await serve_site_file(f)
+
+        async def _serve_site_path(p: str):
+            # 依次匹配：文件本身、目录 index.html、同名 .html；都没有时回退到 404.html 或 index.html
+            f = await app.site_routes.resolve(p) or await app.site_routes.fallback()
+            if f is None:
+                abort(404)
+            return await serve_site_file(f)
+
+        @app.get('/')
+        async def _site_index():
+            return await _serve_site_path('/')
+
+        @app.get('/<path:rest>')
+        async def _site_catch_all(rest: str):
+            return await _serve_site_path('/' + rest)
 
     return app
 
@@ -0,0 +1,388 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    kind TEXT NOT NULL,
+    rel TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    hash TEXT,
+    safe TEXT NOT NULL,
+    has_hls INTEGER NOT NULL DEFAULT 0,
+    strategy TEXT,
+    packaging TEXT,
+    meta TEXT,
+    dup_of TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (kind, rel)
+);
+CREATE INDEX IF NOT EXISTS files_safe ON files(kind, safe);
+CREATE INDEX IF NOT EXISTS files_size ON files(kind, size);
+CREATE INDEX IF NOT EXISTS files_hash ON files(kind, hash);
+CREATE TABLE IF NOT EXISTS renditions (
+    kind TEXT NOT NULL,
+    safe TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (kind, safe, name)
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    safe TEXT,
+    artist TEXT,
+    title TEXT,
+    format TEXT,
+    has_hls INTEGER NOT NULL DEFAULT 0,
+    duration REAL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS tracks_safe ON tracks(kind, safe);
+CREATE INDEX IF NOT EXISTS tracks_artist ON tracks(kind, artist);
+CREATE INDEX IF NOT EXISTS tracks_title ON tracks(kind, title);
+CREATE TABLE IF NOT EXISTS orphans (
+    kind TEXT NOT NULL,
+    safe TEXT NOT NULL,
+    mtime INTEGER NOT NULL,
+    meta TEXT,
+    PRIMARY KEY (kind, safe)
+);
+CREATE TABLE IF NOT EXISTS probes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    discovered INTEGER NOT NULL DEFAULT 0,
+    removed INTEGER NOT NULL DEFAULT 0,
+    tracks INTEGER NOT NULL DEFAULT 0,
+    version INTEGER
+);
+CREATE INDEX IF NOT EXISTS scans_kind ON scans(kind, id);
+CREATE TABLE IF NOT EXISTS state (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (kind, key)
+);
+'''
+
+# 文件记录里除 size/mtime 外单独成列的字段；其余（如 renditions）另表或不存
+_FILE_COLS = {'hash': 'hash', 'safe': 'safe', 'strategy': 'strategy', 'packaging': 'packaging', 'dup_of': 'dupOf'}
+
+
+def _loads(v: Optional[str]):
+    return json.loads(v) if v else None
+
+
+def _dumps(v) -> Optional[str]:
+    return json.dumps(v, ensure_ascii=False, separators=(',', ':')) if v is not None else None
+
+
+class Catalog:
+    """SQLite (WAL) catalog of everything the scans know about the libraries.
+
+    - ``files``: upload identity (size + mtime_ns, optional content hash),
+      safe name, codec decision, HLS status and metadata, per (kind, rel).
+    - ``renditions``: ABR variants written for an HLS output.
+    - ``tracks``: the playlist entries, indexed by id, safe name, artist and title.
+    - ``orphans``: metadata of HLS outputs without an upload (back-fill cache).
+    - ``probes``: ffprobe results keyed by path + size + mtime_ns.
+    - ``scans``: one row per finished scan or single-file update.
+
+    Writes go through :meth:`transaction` (nestable; only the outermost level
+    commits), so a scan's file records, tracks and probes land together.
+    ``meta.json`` files in the HLS dirs are only an export/import format,
+    see :meth:`export_meta` / :meth:`import_meta`.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._depth = 0
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(self.path), isolation_level=None, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            cols = {r['name'] for r in db.execute('PRAGMA table_info(files)')}
+            if cols and 'dup_of' not in cols:  # 旧库升级（须在建索引前）
+                db.execute('ALTER TABLE files ADD COLUMN dup_of TEXT')
+            db.executescript(_SCHEMA)
+            self._db = db
+        return self._db
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        db = self.db
+        if self._depth == 0:
+            db.execute('BEGIN IMMEDIATE')
+        self._depth += 1
+        try:
+            yield db
+        except BaseException:
+            self._depth -= 1
+            if self._depth == 0:
+                db.execute('ROLLBACK')
+            raise
+        self._depth -= 1
+        if self._depth == 0:
+            db.execute('COMMIT')
+
+    # ---- key/value state ----
+    def get_state(self, kind: str, key: str) -> Optional[str]:
+        row = self.db.execute('SELECT value FROM state WHERE kind=? AND key=?', (kind, key)).fetchone()
+        return row['value'] if row else None
+
+    def set_state(self, kind: str, key: str, value: Optional[str]):
+        self.db.execute('INSERT OR REPLACE INTO state (kind, key, value) VALUES (?,?,?)', (kind, key, value))
+
+    # ---- files ----
+    def _file_from_row(self, row: sqlite3.Row) -> dict:
+        rec = {'size': row['size'], 'mtime': row['mtime'], 'hasHLS': bool(row['has_hls'])}
+        for col, key in _FILE_COLS.items():
+            if row[col] is not None:
+                rec[key] = row[col]
+        meta = _loads(row['meta'])
+        if meta is not None:
+            rec['meta'] = meta
+        return rec
+
+    def _attach_renditions(self, kind: str, recs: Dict[str, dict]):
+        by_safe: Dict[str, List[str]] = {}
+        for r in self.db.execute('SELECT safe, name FROM renditions WHERE kind=? ORDER BY safe, position', (kind,)):
+            by_safe.setdefault(r['safe'], []).append(r['name'])
+        for rec in recs.values():
+            names = by_safe.get(rec.get('safe'))
+            if names:
+                rec['renditions'] = names
+
+    def file(self, kind: str, rel: str) -> Optional[dict]:
+        row = self.db.execute('SELECT * FROM files WHERE kind=? AND rel=?', (kind, rel)).fetchone()
+        if row is None:
+            return None
+        rec = self._file_from_row(row)
+        names = [r['name'] for r in self.db.execute(
+            'SELECT name FROM renditions WHERE kind=? AND safe=? ORDER BY position', (kind, rec['safe']))]
+        if names:
+            rec['renditions'] = names
+        return rec
+
+    def files(self, kind: str) -> Dict[str, dict]:
+        recs = {r['rel']: self._file_from_row(r) for r in self.db.execute('SELECT * FROM files WHERE kind=?', (kind,))}
+        self._attach_renditions(kind, recs)
+        return recs
+
+    def rels_for_safe(self, kind: str, safe: str) -> List[str]:
+        return self.rels_where(kind, 'safe', safe)
+
+    def rels_where(self, kind: str, key: str, value) -> List[str]:
+        """Upload paths whose record has ``key`` (``safe`` / ``size`` / ``hash``) equal to ``value``."""
+        if key not in ('safe', 'size', 'hash'):
+            raise ValueError(f'no index on {key!r}')
+        return [r['rel'] for r in self.db.execute(f'SELECT rel FROM files WHERE kind=? AND {key}=?', (kind, value))]
+
+    def put_files(self, kind: str, recs: Dict[str, dict]):
+        now = time.time()
+        with self.transaction() as db:
+            db.executemany(
+                'INSERT OR REPLACE INTO files (kind, rel, size, mtime, hash, safe, has_hls, strategy, packaging, meta, dup_of, updated_at) '
+                'VALUES (?,?,?,?,?,?,?,?,?,?,?,?)',
+                [(kind, rel, r['size'], r['mtime'], r.get('hash'), r['safe'], int(bool(r.get('hasHLS'))),
+                  r.get('strategy'), r.get('packaging'), _dumps(r.get('meta')), r.get('dupOf'), now) for rel, r in recs.items()])
+            for r in recs.values():
+                db.execute('DELETE FROM renditions WHERE kind=? AND safe=?', (kind, r['safe']))
+                db.executemany('INSERT INTO renditions (kind, safe, name, position) VALUES (?,?,?,?)',
+                               [(kind, r['safe'], name, i) for i, name in enumerate(r.get('renditions') or [])])
+
+    def delete_files(self, kind: str, rels: Iterable[str]):
+        with self.transaction() as db:
+            db.executemany('DELETE FROM files WHERE kind=? AND rel=?', [(kind, rel) for rel in rels])
+
+    # ---- orphans ----
+    def orphans(self, kind: str) -> Dict[str, dict]:
+        return {r['safe']: {'mtime': r['mtime'], 'meta': _loads(r['meta'])}
+                for r in self.db.execute('SELECT * FROM orphans WHERE kind=?', (kind,))}
+
+    def put_orphans(self, kind: str, entries: Dict[str, dict]):
+        with self.transaction() as db:
+            db.executemany('INSERT OR REPLACE INTO orphans (kind, safe, mtime, meta) VALUES (?,?,?,?)',
+                           [(kind, safe, e['mtime'], _dumps(e.get('meta'))) for safe, e in entries.items()])
+
+    def delete_orphans(self, kind: str, safes: Iterable[str]):
+        with self.transaction() as db:
+            db.executemany('DELETE FROM orphans WHERE kind=? AND safe=?', [(kind, s) for s in safes])
+
+    # ---- tracks ----
+    def track(self, kind: str, track_id: str) -> Optional[dict]:
+        row = self.db.execute('SELECT data FROM tracks WHERE kind=? AND id=?', (kind, track_id)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def track_by_safe(self, kind: str, safe: str) -> Optional[dict]:
+        row = self.db.execute('SELECT data FROM tracks WHERE kind=? AND safe=? LIMIT 1', (kind, safe)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def put_tracks(self, kind: str, tracks: Iterable[Tuple[Optional[str], dict]]):
+        """Insert or replace ``(safe, track)`` pairs."""
+        now = time.time()
+        with self.transaction() as db:
+            db.executemany(
+                'INSERT OR REPLACE INTO tracks (kind, id, safe, artist, title, format, has_hls, duration, data, updated_at) '
+                'VALUES (?,?,?,?,?,?,?,?,?,?)',
+                [(kind, t['id'], safe, t.get('artist'), t.get('title'), t.get('format'), int(bool(t.get('hasHLS'))),
+                  t.get('duration'), _dumps(t), now) for safe, t in tracks])
+
+    def delete_tracks(self, kind: str, track_ids: Iterable[str]):
+        with self.transaction() as db:
+            db.executemany('DELETE FROM tracks WHERE kind=? AND id=?', [(kind, i) for i in track_ids])
+
+    def replace_tracks(self, kind: str, tracks: List[Tuple[Optional[str], dict]]):
+        with self.transaction() as db:
+            keep = {t['id'] for _, t in tracks}
+            stale = [r['id'] for r in db.execute('SELECT id FROM tracks WHERE kind=?', (kind,)) if r['id'] not in keep]
+            self.delete_tracks(kind, stale)
+            self.put_tracks(kind, tracks)
+
+    def find_tracks(self, kind: str, artist: Optional[str] = None, title: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """Tracks whose artist / title start with the given prefixes (index range scans)."""
+        where, args = ['kind=?'], [kind]
+        for col, val in (('artist', artist), ('title', title)):
+            if val:
+                where.append(f'{col} >= ? AND {col} < ?')
+                args += [val, val + '\U0010ffff']
+        sql = f"SELECT data FROM tracks WHERE {' AND '.join(where)} ORDER BY title LIMIT ?"
+        return [json.loads(r['data']) for r in self.db.execute(sql, (*args, limit))]
+
+    def counts(self) -> Dict[str, dict]:
+        out: Dict[str, dict] = {}
+        for table in ('files', 'tracks', 'orphans'):
+            for r in self.db.execute(f'SELECT kind, COUNT(*) AS n FROM {table} GROUP BY kind'):
+                out.setdefault(r['kind'], {})[table] = r['n']
+        return out
+
+    # ---- probes ----
+    def probe(self, path: str, size: int, mtime: int) -> Optional[dict]:
+        row = self.db.execute('SELECT size, mtime, data FROM probes WHERE path=?', (path,)).fetchone()
+        if row and row['size'] == size and row['mtime'] == mtime:
+            return json.loads(row['data'])
+        return None
+
+    def put_probes(self, entries: Dict[str, dict]):
+        with self.transaction() as db:
+            db.executemany('INSERT OR REPLACE INTO probes (path, size, mtime, data) VALUES (?,?,?,?)',
+                           [(p, e['size'], e['mtime'], _dumps(e['probe'])) for p, e in entries.items()])
+
+    def probe_paths(self, root: Path) -> List[str]:
+        prefix = str(root).rstrip(os.sep) + os.sep
+        return [r['path'] for r in self.db.execute(
+            'SELECT path FROM probes WHERE path >= ? AND path < ?', (prefix, prefix + '\U0010ffff'))]
+
+    def delete_probes(self, paths: Iterable[str]):
+        with self.transaction() as db:
+            db.executemany('DELETE FROM probes WHERE path=?', [(p,) for p in paths])
+
+    # ---- scan history ----
+    def record_scan(self, kind: str, mode: str, started_at: float, result: dict):
+        self.db.execute(
+            'INSERT INTO scans (kind, mode, started_at, finished_at, discovered, removed, tracks, version) VALUES (?,?,?,?,?,?,?,?)',
+            (kind, mode, started_at, time.time(), result.get('updated') or 0, result.get('removed') or 0,
+             result.get('count') or 0, result.get('version')))
+
+    def scans(self, kind: Optional[str] = None, limit: int = 20) -> List[dict]:
+        sql = 'SELECT * FROM scans' + (' WHERE kind=?' if kind else '') + ' ORDER BY id DESC LIMIT ?'
+        args = (kind, limit) if kind else (limit,)
+        return [{'id': r['id'], 'kind': r['kind'], 'mode': r['mode'], 'startedAt': r['started_at'],
+                 'finishedAt': r['finished_at'], 'updated': r['discovered'], 'removed': r['removed'],
+                 'count': r['tracks'], 'version': r['version']} for r in self.db.execute(sql, args)]
+
+    # ---- meta.json export / import ----
+    def export_meta(self, kind: str, hls_dir: Path) -> int:
+        """Write ``meta.json`` into every HLS dir the catalog knows; returns the number written."""
+        n = 0
+        metas: Dict[str, dict] = {s: e['meta'] for s, e in self.orphans(kind).items() if e.get('meta') is not None}
+        metas.update({r['safe']: r['meta'] for r in self.files(kind).values() if r.get('meta')})
+        for safe, meta in sorted(metas.items()):
+            outdir = hls_dir / safe
+            if not outdir.is_dir():
+                continue
+            (outdir / 'meta.json').write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding='utf-8')
+            n += 1
+        return n
+
+    def import_meta(self, kind: str, hls_dir: Path) -> int:
+        """Read ``meta.json`` from every HLS dir into the back-fill cache; returns the number read."""
+        entries: Dict[str, dict] = {}
+        for p in sorted(hls_dir.glob('*/meta.json')):
+            try:
+                meta = json.loads(p.read_text(encoding='utf-8'))
+                mtime = p.parent.stat().st_mtime_ns
+            except (OSError, ValueError):
+                continue
+            entries[p.parent.name] = {'mtime': mtime, 'meta': meta}
+        self.put_orphans(kind, entries)
+        return len(entries)
+
+    def import_legacy(self, kind: str, manifest_file: Optional[Path], probe_file: Optional[Path]):
+        """One-time import of the JSON scan manifest / probe cache used before the catalog."""
+        if self.get_state(kind, 'legacy_imported'):
+            return
+        with self.transaction():
+            try:
+                data = json.loads(manifest_file.read_text(encoding='utf-8')) if manifest_file else None
+            except (OSError, ValueError):
+                data = None
+            if isinstance(data, dict):
+                self.put_files(kind, {rel: r for rel, r in (data.get('files') or {}).items() if r.get('safe')})
+                self.put_orphans(kind, {s: e for s, e in (data.get('orphans') or {}).items() if 'mtime' in e})
+            try:
+                probes = json.loads(probe_file.read_text(encoding='utf-8')) if probe_file else None
+            except (OSError, ValueError):
+                probes = None
+            if isinstance(probes, dict):
+                self.put_probes({p: e for p, e in probes.items() if {'size', 'mtime', 'probe'} <= e.keys()})
+            self.set_state(kind, 'legacy_imported', '1')
+
+
+_catalogs: Dict[Path, Catalog] = {}
+
+
+def catalog_for(cfg) -> Catalog:
+    """Process-wide catalog for ``cfg.CATALOG_DB_FILE``; imports the old JSON manifests on first use."""
+    c = _catalogs.get(cfg.CATALOG_DB_FILE)
+    if c is None:
+        c = _catalogs[cfg.CATALOG_DB_FILE] = Catalog(cfg.CATALOG_DB_FILE)
+        c.import_legacy('video', cfg.VIDEO_MANIFEST_FILE, cfg.PROBE_CACHE_FILE)
+        c.import_legacy('music', cfg.MUSIC_MANIFEST_FILE, cfg.PROBE_CACHE_FILE)
+    return c
+
+
+def close_catalogs():
+    for c in _catalogs.values():
+        c.close()
+    _catalogs.clear()
@@ -2,10 +2,70 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Tuple
 from pathlib import Path
 
 
+def default_transcode_concurrency(threads_per_job: int = 0) -> int:
+    """CPU-aware default for parallel ffmpeg jobs.
+
+    libx264 already spreads one encode over several cores, so without an
+    explicit per-job thread count we assume ~4 cores per job.
+    """
+    cpus = os.cpu_count() or 1
+    per_job = threads_per_job if threads_per_job > 0 else 4
+    return max(1, cpus // per_job)
+
+
+# 默认 ABR 阶梯：(高度, 最高码率 kbps)
+DEFAULT_VIDEO_LADDER: Tuple[Tuple[int, int], ...] = ((1080, 5000), (720, 2800), (480, 1400), (360, 800))
+
+
+def parse_ladder(spec: str) -> Tuple[Tuple[int, int], ...]:
+    """Parse ``"1080:5000,720:2800,480"`` into (height, maxrate kbps) pairs, highest first.
+
+    A rung without a rate gets a rough estimate (16:9, 30 fps, ~0.08 bits/pixel).
+    """
+    rungs = {}
+    for part in spec.split(','):
+        part = part.strip().lower().rstrip('p')
+        if not part:
+            continue
+        height, _, rate = part.partition(':')
+        h = int(height.rstrip('p'))
+        if h <= 0:
+            raise ValueError(f'invalid ladder height: {part!r}')
+        rungs[h] = int(rate.rstrip('k')) if rate else round(h * h * 16 / 9 * 30 * 0.08 / 1000)
+    return tuple(sorted(rungs.items(), reverse=True))
+
+
+# 音频 ABR 阶梯：(编码, 码率 kbps)；he-aac 需要 libfdk_aac（没有时按 AAC-LC 编码），opus 需要 libopus 且只能用 fMP4
+DEFAULT_MUSIC_LADDER: Tuple[Tuple[str, int], ...] = (('aac', 256), ('aac', 128), ('he-aac', 64))
+AUDIO_LADDER_CODECS = ('aac', 'he-aac', 'opus')
+
+# 会被扫描/监听的上传文件扩展名；放在这里，上传监听不必为此导入扫描服务
+VIDEO_EXTS = {'.mp4', '.mkv', '.avi', '.mov', '.flv', '.webm', '.m4v', '.mpg', '.mpeg', '.ts'}
+MUSIC_EXTS = {'.mp3', '.m4a', '.aac', '.wav', '.flac', '.ogg', '.opus'}
+
+
+def parse_audio_ladder(spec: str) -> Tuple[Tuple[str, int], ...]:
+    """Parse ``"aac:256,aac:128,he-aac:64,opus:96"`` into (codec, kbps) pairs, highest bitrate first."""
+    rungs = {}
+    for part in spec.split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+        codec, _, rate = part.partition(':')
+        codec = codec.strip()
+        if codec not in AUDIO_LADDER_CODECS or not rate:
+            raise ValueError(f'invalid audio ladder rung: {part!r} (expected codec:kbps, codec in {AUDIO_LADDER_CODECS})')
+        kbps = int(rate.strip().rstrip('k'))
+        if kbps <= 0:
+            raise ValueError(f'invalid audio ladder bitrate: {part!r}')
+        rungs[(codec, kbps)] = None
+    return tuple(sorted(rungs, key=lambda r: r[1], reverse=True))
+
+
 @dataclass
 class Config:
     # Root and directories
@@ -18,6 +78,16 @@ class Config:
     MUSIC_HLS_DIR: Path
     MUSIC_PLAYLIST_FILE: Path
 
+    # 旧版 JSON 扫描清单（默认在 playlist.json 旁），仅用于首次导入目录数据库
+    VIDEO_MANIFEST_FILE: Optional[Path] = None
+    MUSIC_MANIFEST_FILE: Optional[Path] = None
+    # 旧版 ffprobe 结果缓存（JSON），同样仅用于首次导入
+    PROBE_CACHE_FILE: Optional[Path] = None
+    # 后台任务队列（SQLite）
+    JOBS_DB_FILE: Optional[Path] = None
+    # 媒体目录（SQLite）：文件、探测结果、曲目、扫描记录
+    CATALOG_DB_FILE: Optional[Path] = None
+
     # Public URL prefixes
     VIDEO_HLS_PUBLIC_PREFIX: str = "/video-hls"
     VIDEO_ORIG_PUBLIC_PREFIX: str = "/video-upload"
@@ -30,6 +100,48 @@ class Config:
     STRATEGY: str = "auto"  # auto|copy|transcode
     FORCE_REENCODE: bool = False
     VERBOSE: bool = True
+    TRANSCODE_CONCURRENCY: int = 0  # 同时运行的 ffmpeg 数，0 = 按 CPU 核数自动推算
+    FFMPEG_THREADS: int = 0  # 每个 ffmpeg 的 -threads，0 = 交给 ffmpeg 自行决定
+    SCAN_CONTENT_HASH: bool = False  # mtime 变化时按内容哈希确认文件是否真的改变
+    UPLOAD_DEDUP: bool = True  # 内容相同的上传共用同一份 HLS 输出（仅对同大小文件计算哈希）
+    JOB_MAX_ATTEMPTS: int = 3  # 转码任务失败后的最大尝试次数
+    JOB_RETRY_BACKOFF_SECONDS: float = 30.0  # 重试退避基数（指数增长）
+    VIDEO_X264_PRESET: str = "veryfast"  # libx264 -preset（纯软件编码，与硬件无关）
+    VIDEO_CRF: int = 23
+    VIDEO_ABR: bool = False  # 是否按阶梯输出多码率 HLS（master playlist）
+    VIDEO_LADDER: Tuple[Tuple[int, int], ...] = DEFAULT_VIDEO_LADDER
+    # 封面与拖动预览雪碧图（WebP，无 libwebp 时为 JPEG），写在 HLS 输出目录内
+    VIDEO_THUMBNAILS: bool = True
+    VIDEO_POSTER_WIDTH: int = 640
+    VIDEO_SPRITE_WIDTH: int = 160  # 单张缩略图宽度，高度按源画面比例
+    VIDEO_SPRITE_INTERVAL: float = 10.0  # 缩略图间隔（秒）；长视频按 VIDEO_SPRITE_MAX_TILES 放大间隔
+    VIDEO_SPRITE_MAX_TILES: int = 100
+    # HLS 分片封装：ts（MPEG-TS）| fmp4（init.mp4 + .m4s），按库分别设置
+    VIDEO_SEGMENT_TYPE: str = "ts"
+    MUSIC_SEGMENT_TYPE: str = "ts"
+    # 音乐多码率：同一次解码输出多档，主播放列表 playlist.m3u8 指向 <编码><码率>k/ 子目录
+    MUSIC_ABR: bool = False
+    MUSIC_LADDER: Tuple[Tuple[str, int], ...] = DEFAULT_MUSIC_LADDER
+    # 响度：转码时顺带测 EBU R128 积分响度 / 真峰值，写 loudness.json，播放列表给出 ReplayGain 增益
+    MUSIC_LOUDNESS: bool = True
+    MUSIC_LOUDNORM: bool = False  # 另出一份 loudnorm 归一化后的 HLS（normalized/playlist.m3u8）
+    MUSIC_LOUDNORM_TARGET: float = -16.0  # 归一化目标响度（LUFS）
+
+    # Media serving: ''|x-accel-redirect|x-sendfile（交给前置 nginx/Apache 用 sendfile 发送）
+    MEDIA_OFFLOAD: str = ""
+    MEDIA_OFFLOAD_PREFIX: str = "/_media"  # X-Accel-Redirect 的 internal location 前缀
+
+    # 上传目录监听：文件落盘后自动入队（inotify，不可用时轮询）
+    WATCH_UPLOADS: bool = False
+    WATCH_INTERVAL_SECONDS: float = 2.0  # 轮询间隔，同时也是防抖检查的节拍
+    WATCH_SETTLE_SECONDS: float = 3.0  # 文件大小/mtime 保持不变多久才视为写完
+
+    # /ws/scan/* 订阅：新连接先回放的最近事件条数；单个订阅者最多积压的事件数（超出即断开）
+    SCAN_REPLAY_EVENTS: int = 500
+    SCAN_SUBSCRIBER_QUEUE: int = 1000
+
+    # Prometheus 指标：GET /metrics；关闭时埋点几乎零开销
+    METRICS_ENABLE: bool = False
 
     # Frontend (static export) settings
     FRONTEND_ENABLE: bool = True
@@ -37,6 +149,9 @@ class Config:
     FRONTEND_PORT: int = 3000  # unused in static mode
     FRONTEND_NODE: str = "node"  # unused in static mode
     FRONTEND_SITE_DIR: Optional[Path] = None
+    # 站点小文件常驻内存（单个文件上限 / 总量上限，字节），超出的按文件流式发送
+    FRONTEND_INLINE_MAX_BYTES: int = 256 * 1024
+    FRONTEND_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
 
     @staticmethod
     def from_env() -> "Config":
@@ -57,6 +172,11 @@ class Config:
             MUSIC_HLS_DIR=getenv_path("MUSIC_HLS_DIR", root / "music-hls"),
             MUSIC_PLAYLIST_FILE=getenv_path("MUSIC_PLAYLIST_FILE", root / "music-playlist" / "playlist.json"),
         )
+        cfg.VIDEO_MANIFEST_FILE = getenv_path("VIDEO_MANIFEST_FILE", cfg.VIDEO_PLAYLIST_FILE.with_name("manifest.json"))
+        cfg.MUSIC_MANIFEST_FILE = getenv_path("MUSIC_MANIFEST_FILE", cfg.MUSIC_PLAYLIST_FILE.with_name("manifest.json"))
+        cfg.PROBE_CACHE_FILE = getenv_path("PROBE_CACHE_FILE", root / "cache" / "probe.json")
+        cfg.JOBS_DB_FILE = getenv_path("JOBS_DB_FILE", root / "cache" / "jobs.sqlite3")
+        cfg.CATALOG_DB_FILE = getenv_path("CATALOG_DB_FILE", root / "cache" / "catalog.sqlite3")
 
         # Prefixes
         cfg.VIDEO_HLS_PUBLIC_PREFIX = os.getenv("HLS_PUBLIC_PREFIX", os.getenv("VIDEO_HLS_PUBLIC_PREFIX", cfg.VIDEO_HLS_PUBLIC_PREFIX)).rstrip("/")
@@ -70,6 +190,45 @@ class Config:
         cfg.STRATEGY = os.getenv("STRATEGY", cfg.STRATEGY).lower()
         cfg.FORCE_REENCODE = os.getenv("FORCE_REENCODE", "0") in ("1", "true", "True")
         cfg.VERBOSE = os.getenv("VERBOSE", "1") not in ("0", "false", "False")
+        cfg.FFMPEG_THREADS = max(0, int(os.getenv("FFMPEG_THREADS", str(cfg.FFMPEG_THREADS))))
+        cfg.TRANSCODE_CONCURRENCY = int(os.getenv("TRANSCODE_CONCURRENCY", str(cfg.TRANSCODE_CONCURRENCY)))
+        if cfg.TRANSCODE_CONCURRENCY <= 0:
+            cfg.TRANSCODE_CONCURRENCY = default_transcode_concurrency(cfg.FFMPEG_THREADS)
+        cfg.SCAN_CONTENT_HASH = os.getenv("SCAN_CONTENT_HASH", "0") in ("1", "true", "True")
+        cfg.UPLOAD_DEDUP = os.getenv("UPLOAD_DEDUP", "1") in ("1", "true", "True")
+        cfg.JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", str(cfg.JOB_MAX_ATTEMPTS)))
+        cfg.JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", str(cfg.JOB_RETRY_BACKOFF_SECONDS)))
+        cfg.VIDEO_X264_PRESET = os.getenv("VIDEO_X264_PRESET", cfg.VIDEO_X264_PRESET)
+        cfg.VIDEO_CRF = int(os.getenv("VIDEO_CRF", str(cfg.VIDEO_CRF)))
+        cfg.VIDEO_ABR = os.getenv("VIDEO_ABR", "0") in ("1", "true", "True")
+        if os.getenv("VIDEO_LADDER"):
+            cfg.VIDEO_LADDER = parse_ladder(os.environ["VIDEO_LADDER"])
+        cfg.VIDEO_THUMBNAILS = os.getenv("VIDEO_THUMBNAILS", "1") not in ("0", "false", "False")
+        cfg.VIDEO_POSTER_WIDTH = max(16, int(os.getenv("VIDEO_POSTER_WIDTH", str(cfg.VIDEO_POSTER_WIDTH))))
+        cfg.VIDEO_SPRITE_WIDTH = max(16, int(os.getenv("VIDEO_SPRITE_WIDTH", str(cfg.VIDEO_SPRITE_WIDTH))))
+        cfg.VIDEO_SPRITE_INTERVAL = max(1.0, float(os.getenv("VIDEO_SPRITE_INTERVAL", str(cfg.VIDEO_SPRITE_INTERVAL))))
+        cfg.VIDEO_SPRITE_MAX_TILES = max(1, int(os.getenv("VIDEO_SPRITE_MAX_TILES", str(cfg.VIDEO_SPRITE_MAX_TILES))))
+        for key in ("VIDEO_SEGMENT_TYPE", "MUSIC_SEGMENT_TYPE"):
+            val = os.getenv(key, getattr(cfg, key)).lower()
+            if val not in ("ts", "fmp4"):
+                raise ValueError(f"{key} must be ts or fmp4, got {val!r}")
+            setattr(cfg, key, val)
+        cfg.MUSIC_ABR = os.getenv("MUSIC_ABR", "0") in ("1", "true", "True")
+        if os.getenv("MUSIC_LADDER"):
+            cfg.MUSIC_LADDER = parse_audio_ladder(os.environ["MUSIC_LADDER"])
+        cfg.MUSIC_LOUDNESS = os.getenv("MUSIC_LOUDNESS", "1") not in ("0", "false", "False")
+        cfg.MUSIC_LOUDNORM = os.getenv("MUSIC_LOUDNORM", "0") in ("1", "true", "True")
+        cfg.MUSIC_LOUDNORM_TARGET = min(-5.0, max(-70.0, float(os.getenv("MUSIC_LOUDNORM_TARGET", str(cfg.MUSIC_LOUDNORM_TARGET)))))
+        cfg.MEDIA_OFFLOAD = os.getenv("MEDIA_OFFLOAD", cfg.MEDIA_OFFLOAD).lower()
+        if cfg.MEDIA_OFFLOAD not in ("", "x-accel-redirect", "x-sendfile"):
+            raise ValueError(f"MEDIA_OFFLOAD must be x-accel-redirect or x-sendfile, got {cfg.MEDIA_OFFLOAD!r}")
+        cfg.MEDIA_OFFLOAD_PREFIX = os.getenv("MEDIA_OFFLOAD_PREFIX", cfg.MEDIA_OFFLOAD_PREFIX).rstrip("/")
+        cfg.WATCH_UPLOADS = os.getenv("WATCH_UPLOADS", "0") in ("1", "true", "True")
+        cfg.WATCH_INTERVAL_SECONDS = max(0.1, float(os.getenv("WATCH_INTERVAL_SECONDS", str(cfg.WATCH_INTERVAL_SECONDS))))
+        cfg.WATCH_SETTLE_SECONDS = max(0.0, float(os.getenv("WATCH_SETTLE_SECONDS", str(cfg.WATCH_SETTLE_SECONDS))))
+        cfg.SCAN_REPLAY_EVENTS = max(0, int(os.getenv("SCAN_REPLAY_EVENTS", str(cfg.SCAN_REPLAY_EVENTS))))
+        cfg.SCAN_SUBSCRIBER_QUEUE = max(1, int(os.getenv("SCAN_SUBSCRIBER_QUEUE", str(cfg.SCAN_SUBSCRIBER_QUEUE))))
+        cfg.METRICS_ENABLE = os.getenv("METRICS_ENABLE", "0") in ("1", "true", "True")
 
         # Frontend settings (static site)
         cfg.FRONTEND_ENABLE = os.getenv("FRONTEND_ENABLE", "1") not in ("0", "false", "False")
@@ -77,14 +236,14 @@ class Config:
         cfg.FRONTEND_PORT = int(os.getenv("FRONTEND_PORT", str(cfg.FRONTEND_PORT)))
         cfg.FRONTEND_NODE = os.getenv("FRONTEND_NODE", cfg.FRONTEND_NODE)
         cfg.FRONTEND_SITE_DIR = getenv_path("FRONTEND_SITE_DIR", root / "assets")
+        cfg.FRONTEND_INLINE_MAX_BYTES = max(0, int(os.getenv("FRONTEND_INLINE_MAX_BYTES", str(cfg.FRONTEND_INLINE_MAX_BYTES))))
+        cfg.FRONTEND_CACHE_MAX_BYTES = max(0, int(os.getenv("FRONTEND_CACHE_MAX_BYTES", str(cfg.FRONTEND_CACHE_MAX_BYTES))))
 
-        # Ensure directories exist
-        cfg.VIDEO_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-        cfg.VIDEO_HLS_DIR.mkdir(parents=True, exist_ok=True)
-        cfg.VIDEO_PLAYLIST_FILE.parent.mkdir(parents=True, exist_ok=True)
-
-        cfg.MUSIC_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-        cfg.MUSIC_HLS_DIR.mkdir(parents=True, exist_ok=True)
-        cfg.MUSIC_PLAYLIST_FILE.parent.mkdir(parents=True, exist_ok=True)
-
+        # 目录不在这里创建（启动路径不碰文件系统），由 ensure_dirs() 在首次扫描时创建
         return cfg
+
+    def ensure_dirs(self):
+        """Create the upload, HLS and playlist directories of both libraries (idempotent)."""
+        for d in (self.VIDEO_UPLOAD_DIR, self.VIDEO_HLS_DIR, self.VIDEO_PLAYLIST_FILE.parent,
+                  self.MUSIC_UPLOAD_DIR, self.MUSIC_HLS_DIR, self.MUSIC_PLAYLIST_FILE.parent):
+            d.mkdir(parents=True, exist_ok=True)
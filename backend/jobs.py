@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+STATES = ('queued', 'running', 'done', 'failed')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    type TEXT NOT NULL,
+    src TEXT,
+    outdir TEXT,
+    state TEXT NOT NULL DEFAULT 'queued',
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    not_before REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    result TEXT,
+    progress TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_pick ON jobs(state, priority DESC, id);
+CREATE INDEX IF NOT EXISTS jobs_kind ON jobs(kind, type, state);
+'''
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    type: str
+    src: Optional[str]
+    outdir: Optional[str]
+    state: str
+    priority: int
+    attempts: int
+    max_attempts: int
+    not_before: float
+    error: Optional[str]
+    result: Optional[dict]
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    progress: Optional[dict] = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        d = dict(row)
+        d['result'] = json.loads(d['result']) if d.get('result') else None
+        d['progress'] = json.loads(d['progress']) if d.get('progress') else None
+        return cls(**d)
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id, 'kind': self.kind, 'type': self.type, 'src': self.src,
+            'state': self.state, 'priority': self.priority,
+            'attempts': self.attempts, 'maxAttempts': self.max_attempts,
+            'notBefore': self.not_before or None, 'error': self.error, 'result': self.result, 'progress': self.progress,
+            'createdAt': self.created_at, 'startedAt': self.started_at, 'finishedAt': self.finished_at,
+        }
+
+
+# handler(job) -> result dict；抛异常或返回 {'ok': False} 视为失败并按退避重试
+Handler = Callable[[Job], Awaitable[dict]]
+
+
+class JobQueue:
+    """Durable job queue stored in a local SQLite file.
+
+    Jobs are claimed highest priority first, failed jobs are retried with
+    exponential backoff up to ``max_attempts``, and jobs left ``running`` by a
+    previous process are re-queued on start so progress survives restarts.
+    """
+
+    def __init__(self, path: Path, workers: int = 1, max_attempts: int = 3, backoff_seconds: float = 30.0, logger=None):
+        self.path = path
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_seconds = backoff_seconds
+        self.logger = logger
+        self._handlers: Dict[str, Handler] = {}
+        self._after: Dict[str, Callable[[Job], None]] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._db: Optional[sqlite3.Connection] = None
+
+    # ---- storage ----
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(self.path), isolation_level=None, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(_SCHEMA)
+            cols = {r['name'] for r in db.execute('PRAGMA table_info(jobs)')}
+            if 'progress' not in cols:  # 旧库升级
+                db.execute('ALTER TABLE jobs ADD COLUMN progress TEXT')
+            self._db = db
+        return self._db
+
+    def enqueue(self, kind: str, type: str, src: Optional[str] = None, outdir: Optional[str] = None, priority: int = 0) -> int:
+        """Add a job, or return the id of an identical queued/running one."""
+        row = self.db.execute(
+            "SELECT id FROM jobs WHERE kind=? AND type=? AND src IS ? AND state IN ('queued','running') ORDER BY id LIMIT 1",
+            (kind, type, src),
+        ).fetchone()
+        if row:
+            return row['id']
+        cur = self.db.execute(
+            'INSERT INTO jobs (kind, type, src, outdir, priority, max_attempts, created_at) VALUES (?,?,?,?,?,?,?)',
+            (kind, type, src, outdir, priority, self.max_attempts, time.time()),
+        )
+        self.notify()
+        return cur.lastrowid
+
+    def get(self, job_id: int) -> Optional[Job]:
+        row = self.db.execute('SELECT * FROM jobs WHERE id=?', (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def list(self, state: Optional[str] = None, kind: Optional[str] = None, type: Optional[str] = None, limit: int = 100) -> List[Job]:
+        where, args = [], []
+        for col, val in (('state', state), ('kind', kind), ('type', type)):
+            if val:
+                where.append(f'{col}=?')
+                args.append(val)
+        sql = 'SELECT * FROM jobs' + (' WHERE ' + ' AND '.join(where) if where else '') + ' ORDER BY id DESC LIMIT ?'
+        return [Job.from_row(r) for r in self.db.execute(sql, (*args, limit))]
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        out: Dict[str, Dict[str, int]] = {}
+        for r in self.db.execute('SELECT kind, state, COUNT(*) AS n FROM jobs GROUP BY kind, state'):
+            out.setdefault(r['kind'], {})[r['state']] = r['n']
+        return out
+
+    def pending_outdirs(self, kind: str) -> set[str]:
+        """Output dirs of transcode jobs that are queued or running for ``kind``."""
+        rows = self.db.execute(
+            "SELECT outdir FROM jobs WHERE kind=? AND type='transcode' AND state IN ('queued','running')", (kind,))
+        return {r['outdir'] for r in rows if r['outdir']}
+
+    def find_pending(self, kind: str, type: str, src: Optional[str] = None) -> Optional[Job]:
+        """The queued or running job for (kind, type, src), running ones first; ``src=None`` means a full scan."""
+        row = self.db.execute(
+            "SELECT * FROM jobs WHERE kind=? AND type=? AND src IS ? AND state IN ('queued','running') "
+            "ORDER BY state='running' DESC, id LIMIT 1", (kind, type, src)
+        ).fetchone()
+        return Job.from_row(row) if row else None
+
+    def set_progress(self, job_id: int, progress: dict):
+        """Store the latest progress snapshot of a running job (callers rate-limit)."""
+        self.db.execute('UPDATE jobs SET progress=? WHERE id=?', (json.dumps(progress, ensure_ascii=False), job_id))
+
+    def _claim(self) -> Optional[Job]:
+        now = time.time()
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                "SELECT * FROM jobs WHERE state='queued' AND not_before<=? ORDER BY priority DESC, id LIMIT 1", (now,)
+            ).fetchone()
+            if row is None:
+                db.execute('COMMIT')
+                return None
+            db.execute("UPDATE jobs SET state='running', attempts=attempts+1, started_at=?, progress=NULL WHERE id=?", (now, row['id']))
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        return self.get(row['id'])
+
+    def _finish(self, job: Job, ok: bool, result: Optional[dict], error: Optional[str]) -> str:
+        """Persist the outcome of a run; returns the new state ('done', 'queued' for a retry, or 'failed')."""
+        now = time.time()
+        payload = json.dumps(result, ensure_ascii=False) if result is not None else None
+        if ok:
+            self.db.execute("UPDATE jobs SET state='done', result=?, error=NULL, finished_at=? WHERE id=?", (payload, now, job.id))
+            return 'done'
+        if job.attempts < job.max_attempts:
+            delay = self.backoff_seconds * (2 ** (job.attempts - 1))
+            self.db.execute("UPDATE jobs SET state='queued', result=?, error=?, not_before=? WHERE id=?", (payload, error, now + delay, job.id))
+            return 'queued'
+        self.db.execute("UPDATE jobs SET state='failed', result=?, error=?, finished_at=? WHERE id=?", (payload, error, now, job.id))
+        return 'failed'
+
+    def _next_due(self) -> Optional[float]:
+        row = self.db.execute("SELECT MIN(not_before) AS t FROM jobs WHERE state='queued'").fetchone()
+        return row['t'] if row and row['t'] is not None else None
+
+    # ---- workers ----
+    def register(self, type: str, handler: Handler, after: Optional[Callable[[Job], None]] = None):
+        """Set the handler for ``type``; ``after(job)`` runs once the job is done or has failed for good."""
+        self._handlers[type] = handler
+        if after is not None:
+            self._after[type] = after
+
+    def notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _worker(self):
+        while True:
+            self._wake.clear()
+            job = self._claim()
+            if job is None:
+                due = self._next_due()
+                timeout = 5.0 if due is None else min(5.0, max(0.05, due - time.time()))
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            handler = self._handlers.get(job.type)
+            try:
+                if handler is None:
+                    raise RuntimeError(f'no handler for job type {job.type!r}')
+                result = await handler(job)
+                ok = bool((result or {}).get('ok', True))
+                state = self._finish(job, ok, result, None if ok else (result or {}).get('error') or 'failed')
+            except asyncio.CancelledError:
+                # 进程退出：保持可恢复，下次启动重新排队
+                self.db.execute("UPDATE jobs SET state='queued', attempts=attempts-1 WHERE id=?", (job.id,))
+                raise
+            except Exception as e:
+                if self.logger:
+                    self.logger.exception('job #%s (%s) failed: %s', job.id, job.type, e)
+                state = self._finish(job, False, None, str(e))
+            after = self._after.get(job.type)
+            # 等待退避重试的任务还没结束，不触发后续动作
+            if after is not None and state in ('done', 'failed'):
+                try:
+                    after(job)
+                except Exception as e:  # pragma: no cover
+                    if self.logger:
+                        self.logger.exception('job #%s after-hook failed: %s', job.id, e)
+            self.notify()
+
+    async def start(self):
+        # 上次进程中断时仍在运行的任务重新排队
+        self.db.execute("UPDATE jobs SET state='queued', attempts=MAX(attempts-1, 0) WHERE state='running'")
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import mimetypes
+import os
+import stat
+from pathlib import Path
+from typing import Optional
+
+from quart import abort, current_app, request
+from quart.wrappers.response import ResponseBody
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.http import http_date
+from werkzeug.security import safe_join
+
+
+# HLS 相关类型（mimetypes 默认表里没有或不准确）
+MEDIA_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t',
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4',
+    '.m4a': 'audio/mp4',
+    '.aac': 'audio/aac',
+    '.vtt': 'text/vtt',
+    '.webp': 'image/webp',
+}
+# 音乐库的 fMP4 init / 分片按音频类型返回
+AUDIO_MEDIA_TYPES = {'.mp4': 'audio/mp4', '.m4s': 'audio/mp4'}
+# 分片写完后内容不再变化；同名文件只会在 FORCE_REENCODE 时被覆盖
+SEGMENT_SUFFIXES = {'.ts', '.m4s', '.mp4', '.m4a', '.aac'}
+SEGMENT_CACHE = 'public, max-age=31536000, immutable'
+PLAYLIST_CACHE = 'public, max-age=30'  # 已完成（含 ENDLIST）的播放列表与 master
+LIVE_PLAYLIST_CACHE = 'public, max-age=1'  # 仍在转码、会继续追加分片的播放列表
+UPLOAD_CACHE = 'public, max-age=3600'
+OTHER_CACHE = 'no-cache'
+
+# 每次读取的块大小；不超过 INLINE_READ_BYTES 的块直接在事件循环里读（页缓存命中时比切线程便宜）
+CHUNK_BYTES = 256 * 1024
+INLINE_READ_BYTES = 64 * 1024
+
+
+class MediaBody(ResponseBody):
+    """File body read with ``os.pread`` in large chunks.
+
+    Quart's ``FileBody`` reads 8 KiB at a time through aiofiles, paying two
+    thread hops per chunk; a 4 MB segment becomes ~1000 round trips. This
+    reads up to :data:`CHUNK_BYTES` per hop and supports byte ranges through
+    ``Response.make_conditional`` just like ``FileBody``.
+    """
+
+    def __init__(self, path: Path, size: int):
+        self.path = path
+        self.size = size
+        self.begin = 0
+        self.end = size
+        self._fd: Optional[int] = None
+        self._pos = 0
+
+    async def __aenter__(self) -> "MediaBody":
+        self._fd = os.open(self.path, os.O_RDONLY)
+        self._pos = self.begin
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __aiter__(self) -> "MediaBody":
+        return self
+
+    async def __anext__(self) -> bytes:
+        n = min(CHUNK_BYTES, self.end - self._pos)
+        if n <= 0:
+            raise StopAsyncIteration()
+        if n <= INLINE_READ_BYTES:
+            chunk = os.pread(self._fd, n, self._pos)
+        else:
+            chunk = await asyncio.to_thread(os.pread, self._fd, n, self._pos)
+        if not chunk:
+            raise StopAsyncIteration()
+        self._pos += len(chunk)
+        return chunk
+
+    async def make_conditional(self, begin: int, end: Optional[int]) -> int:
+        # Quart 原样传入后缀范围（bytes=-N 时 begin 为负数），这里换算成绝对偏移
+        if begin < 0:
+            begin, end = max(0, self.size + begin), None
+        self.begin = begin
+        self.end = self.size if end is None else min(self.size, end)
+        if not 0 <= self.begin < self.end <= self.size:
+            raise RequestedRangeNotSatisfiable(length=self.size)
+        return self.size
+
+
+def media_etag(st: os.stat_result) -> str:
+    return f"{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def content_type(name: str, audio: bool = False) -> str:
+    suffix = os.path.splitext(name)[1].lower()
+    if audio and suffix in AUDIO_MEDIA_TYPES:
+        return AUDIO_MEDIA_TYPES[suffix]
+    return MEDIA_TYPES.get(suffix) or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def file_cache_control(suffix: str, hls: bool) -> str:
+    if not hls:
+        return UPLOAD_CACHE
+    return SEGMENT_CACHE if suffix in SEGMENT_SUFFIXES else OTHER_CACHE
+
+
+def playlist_cache_control(body: bytes) -> str:
+    # master playlist 不含 ENDLIST，但写出后不再变化
+    if b'#EXT-X-ENDLIST' in body or b'#EXT-X-STREAM-INF' in body:
+        return PLAYLIST_CACHE
+    return LIVE_PLAYLIST_CACHE
+
+
+async def serve_media(root: Path, filename: str, public_prefix: str, hls: bool = True, audio: bool = False):
+    """Serve ``filename`` under ``root`` with validators, ranges and cache headers.
+
+    - ETag from inode + mtime + size (one ``stat`` per request), Last-Modified,
+      304 / 206 / 416 handled by ``Response.make_conditional``.
+    - Segments are ``immutable``; playlists get a short TTL (1s while ffmpeg is
+      still appending, 30s once complete); uploads an hour.
+    - With ``MEDIA_OFFLOAD`` set, everything but playlists is handed to the
+      front proxy (``X-Accel-Redirect`` / ``X-Sendfile``) so the file goes out
+      via the kernel's sendfile instead of through Python.
+    """
+    cfg = current_app.config['APP_CONFIG']
+    raw = safe_join(str(root), filename)
+    if raw is None:
+        abort(404)
+    path = Path(raw)
+    try:
+        st = path.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        abort(404)
+    if not stat.S_ISREG(st.st_mode):
+        abort(404)
+
+    mimetype = content_type(path.name, audio)
+    suffix = path.suffix.lower()
+    is_playlist = suffix == '.m3u8'
+    resp_cls = current_app.response_class
+
+    if is_playlist:
+        # 播放列表很小，直接读入内存，顺便判断是否仍在转码中
+        body = await asyncio.to_thread(path.read_bytes)
+        resp = resp_cls(body, mimetype=mimetype)
+        resp.headers['Cache-Control'] = playlist_cache_control(body)
+    elif cfg.MEDIA_OFFLOAD:
+        resp = resp_cls(b'', mimetype=mimetype)
+        if cfg.MEDIA_OFFLOAD == 'x-sendfile':
+            resp.headers['X-Sendfile'] = str(path)
+        else:
+            rel = path.relative_to(Path(root)).as_posix()
+            resp.headers['X-Accel-Redirect'] = f"{cfg.MEDIA_OFFLOAD_PREFIX}{public_prefix}/{rel}"
+        resp.headers['Cache-Control'] = file_cache_control(suffix, hls)
+        return resp
+    else:
+        resp = resp_cls(MediaBody(path, st.st_size), mimetype=mimetype)
+        resp.content_length = st.st_size
+        resp.headers['Cache-Control'] = file_cache_control(suffix, hls)
+
+    resp.set_etag(media_etag(st))
+    resp.headers['Accept-Ranges'] = 'bytes'
+    resp.headers['Last-Modified'] = http_date(st.st_mtime)
+    await resp.make_conditional(request, accept_ranges=True, complete_length=st.st_size)
+    return resp
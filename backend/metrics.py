@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 全局开关：关闭时（默认）各埋点只做一次布尔判断就返回；由 create_app 按 METRICS_ENABLE 打开
+enabled = False
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 子进程 / 扫描阶段：从毫秒级的 ffprobe 到小时级的长视频转码
+PROCESS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(v: str) -> str:
+    return v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _fmt_labels(names: Sequence[str], values: Labels, extra: str = '') -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class Metric:
+    type = ''
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+
+    def samples(self) -> Iterable[str]:
+        return ()
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}', *self.samples()]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, value: float = 1.0):
+        if enabled:
+            self.values[labels] = self.values.get(labels, 0.0) + value
+
+    def samples(self):
+        for labels, v in sorted(self.values.items()):
+            yield f'{self.name}{_fmt_labels(self.labelnames, labels)} {_num(v)}'
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [每个桶的计数（非累计）..., +Inf 桶, sum]
+        self.values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        if not enabled:
+            return
+        row = self.values.get(labels)
+        if row is None:
+            row = self.values[labels] = [0.0] * (len(self.buckets) + 2)
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def samples(self):
+        for labels, row in sorted(self.values.items()):
+            acc = 0.0
+            for le, n in zip((*map(_num, self.buckets), '+Inf'), row):
+                acc += n
+                bucket = _fmt_labels(self.labelnames, labels, 'le="%s"' % le)
+                yield f'{self.name}_bucket{bucket} {_num(acc)}'
+            yield f'{self.name}_sum{_fmt_labels(self.labelnames, labels)} {_num(row[-1])}'
+            yield f'{self.name}_count{_fmt_labels(self.labelnames, labels)} {_num(acc)}'
+
+
+class Gauge(Metric):
+    """Value read at scrape time from ``collect()``, which yields (labels, value) pairs."""
+    type = 'gauge'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 collect: Optional[Callable[[], Iterable[Tuple[Labels, float]]]] = None):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def samples(self):
+        if self.collect is None:
+            return
+        for labels, v in self.collect():
+            yield f'{self.name}{_fmt_labels(self.labelnames, labels)} {_num(v)}'
+
+
+REGISTRY: List[Metric] = []
+
+
+def _register(m):
+    REGISTRY.append(m)
+    return m
+
+
+# ---- HTTP ----
+REQUEST_SECONDS = _register(Histogram(
+    'hls_http_request_duration_seconds', 'Time until response headers, by route template.', ('route', 'method')))
+REQUESTS = _register(Counter('hls_http_requests_total', 'Responses by route template and status.', ('route', 'status')))
+RESPONSE_BYTES = _register(Counter(
+    'hls_http_response_bytes_total', 'Response body bytes (Content-Length) by route template.', ('route',)))
+PLAYLIST_RESPONSES = _register(Counter(
+    'hls_playlist_responses_total', 'Playlist API answers: full, page or not_modified.', ('kind', 'result')))
+PLAYLIST_CACHE_LOADS = _register(Counter(
+    'hls_playlist_cache_loads_total', 'playlist.json (re)loads into the in-memory cache.'))
+
+# ---- 扫描 / 转码 ----
+SCANS = _register(Counter('hls_scans_total', 'Completed scans.', ('kind', 'mode')))
+SCAN_PHASE_SECONDS = _register(Histogram(
+    'hls_scan_phase_seconds', 'Wall time per scan phase.', ('kind', 'phase'), buckets=PROCESS_BUCKETS))
+SCAN_LOCK_WAIT_SECONDS = _register(Histogram(
+    'hls_scan_lock_wait_seconds', 'Time scan jobs waited for the per-library scan lock.', ('kind',)))
+TRANSCODE_WAIT_SECONDS = _register(Histogram(
+    'hls_transcode_wait_seconds', 'Time spent waiting for another task already transcoding the same output dir.',
+    buckets=PROCESS_BUCKETS))
+FFMPEG_SECONDS = _register(Histogram(
+    'hls_ffmpeg_seconds', 'ffmpeg wall time by outcome (ok, failed, timeout, error).', ('result',), buckets=PROCESS_BUCKETS))
+FFPROBE_SECONDS = _register(Histogram(
+    'hls_ffprobe_seconds', 'ffprobe wall time by outcome (ok, failed, timeout, error).', ('result',)))
+PROBE_CACHE = _register(Counter('hls_probe_cache_requests_total', 'Probe cache lookups (hit, miss).', ('result',)))
+
+# ---- 任务队列（抓取时由 app 注入读取函数） ----
+JOBS = _register(Gauge('hls_jobs', 'Jobs in the queue database by kind and state.', ('kind', 'state')))
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    lines: List[str] = []
+    for m in REGISTRY:
+        lines.extend(m.render())
+    return '\n'.join(lines) + '\n'
+
+
+def observe_scan(kind: str, mode: str, phases: Dict[str, float]):
+    if not enabled:
+        return
+    SCANS.inc(kind, mode)
+    for phase, seconds in phases.items():
+        SCAN_PHASE_SECONDS.observe(seconds, kind, phase)
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from . import metrics
+from .playlist_index import PlaylistIndex
+
+try:  # optional: pip install brotli
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+# 小于该大小的响应不值得压缩
+COMPRESS_MIN_BYTES = 1024
+
+
+@dataclass
+class CachedPlaylist:
+    """One playlist.json as served: compact JSON bytes plus validators."""
+    tracks: list
+    body: bytes
+    etag: str
+    mtime: float
+    stat_key: Tuple[int, int, int]
+    version: Optional[int] = None  # 写入方递增的版本号；旧文件或版本文件不匹配时为 None
+    encoded: Dict[str, bytes] = field(default_factory=dict)
+    _index: Optional[PlaylistIndex] = None
+
+    @property
+    def index(self) -> PlaylistIndex:
+        """Query index over this version's tracks, built on first use."""
+        if self._index is None:
+            self._index = PlaylistIndex(self.tracks if isinstance(self.tracks, list) else [], self.etag)
+        return self._index
+
+    def variant(self, encoding: str) -> Optional[bytes]:
+        """Pre-compressed body for ``encoding`` ('br' or 'gzip'), computed once per version."""
+        if len(self.body) < COMPRESS_MIN_BYTES:
+            return None
+        if encoding not in self.encoded:
+            if encoding == 'br' and brotli is not None:
+                self.encoded[encoding] = brotli.compress(self.body, quality=9)
+            elif encoding == 'gzip':
+                self.encoded[encoding] = gzip.compress(self.body, compresslevel=6, mtime=0)
+            else:
+                return None
+        return self.encoded[encoding]
+
+
+def _stat_key(st: os.stat_result) -> Tuple[int, int, int]:
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def playlist_etag(body: bytes) -> str:
+    return hashlib.sha1(body).hexdigest()[:20]
+
+
+def version_path(path: Path) -> Path:
+    """Sidecar holding ``{"version", "etag"}`` of the last write of ``path``."""
+    return path.with_name(path.name + '.version')
+
+
+def read_version(path: Path) -> Tuple[int, Optional[str]]:
+    try:
+        data = json.loads(version_path(path).read_bytes())
+        return int(data['version']), data.get('etag')
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0, None
+
+
+class PlaylistCache:
+    """Process-level cache of playlist files.
+
+    Entries are re-validated with a single ``stat`` per lookup and dropped
+    explicitly by :func:`invalidate_playlist` after a scan writes the file.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Path, CachedPlaylist] = {}
+
+    def invalidate(self, path: Optional[Path] = None):
+        if path is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(Path(path), None)
+
+    async def get(self, path: Path) -> Optional[CachedPlaylist]:
+        """Return the cached playlist, reloading it if the file changed; None if missing."""
+        path = Path(path)
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            self._entries.pop(path, None)
+            return None
+        entry = self._entries.get(path)
+        if entry is not None and entry.stat_key == _stat_key(st):
+            return entry
+        entry = await asyncio.to_thread(self._load, path, st)
+        self._entries[path] = entry
+        return entry
+
+    async def encoded(self, entry: CachedPlaylist, encoding: str) -> Optional[bytes]:
+        if encoding in entry.encoded:
+            return entry.encoded[encoding]
+        return await asyncio.to_thread(entry.variant, encoding)
+
+    @staticmethod
+    def _load(path: Path, st: os.stat_result) -> CachedPlaylist:
+        # Validate JSON to avoid propagating corrupt files
+        metrics.PLAYLIST_CACHE_LOADS.inc()
+        raw = path.read_bytes()
+        tracks = json.loads(raw)
+        # 扫描服务写出的已是紧凑格式，直接复用；旧的缩进格式才重新序列化
+        body = raw if b'\n' not in raw else json.dumps(tracks, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        etag = playlist_etag(body)
+        version, version_etag = read_version(path)
+        return CachedPlaylist(tracks=tracks, body=body, etag=etag, mtime=st.st_mtime, stat_key=_stat_key(st),
+                              version=version if version_etag == etag else None)
+
+
+playlist_cache = PlaylistCache()
+
+
+def invalidate_playlist(path: Optional[Path] = None):
+    playlist_cache.invalidate(path)
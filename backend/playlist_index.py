@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+from .utils import fold_text
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+SORT_KEYS: Dict[str, Callable[[dict], object]] = {
+    # 与扫描服务写入 playlist.json 时的排序一致
+    'title': lambda t: t.get('title') or '',
+    'artist': lambda t: (fold_text(t.get('artist') or ''), t.get('title') or ''),
+    'format': lambda t: (t.get('format') or '', t.get('title') or ''),
+    'duration': lambda t: t.get('duration') or 0,
+}
+
+
+class StaleCursor(ValueError):
+    """The cursor was issued for another version of the playlist."""
+
+
+def _tag(value) -> str:
+    return hashlib.sha1(repr(value).encode('utf-8')).hexdigest()[:10]
+
+
+def encode_cursor(version: str, q: "PlaylistQuery", offset: int) -> str:
+    """Opaque cursor for ``offset`` in the view of ``q`` over playlist ``version`` (its ETag)."""
+    raw = f'{_tag(version)}.{_tag(q.view_key)}:{offset}'.encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, version: str, q: "PlaylistQuery") -> int:
+    """Offset stored in ``cursor``.
+
+    Raises :class:`StaleCursor` if the playlist was rewritten since it was
+    issued, and ValueError if it is malformed or from another sort/filter.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        tags, _, offset = raw.partition(':')
+        vtag, _, qtag = tags.partition('.')
+        offset = int(offset)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('malformed cursor')
+    if offset < 0 or not vtag or not qtag:
+        raise ValueError('malformed cursor')
+    # 翻页期间播放列表被重写（全量扫描或单文件更新）：偏移已不可信
+    if vtag != _tag(version):
+        raise StaleCursor('playlist changed since this cursor was issued; restart from the first page')
+    if qtag != _tag(q.view_key):
+        raise ValueError('cursor was issued for a different sort/filter')
+    return offset
+
+
+def _parse_bool(v: str) -> bool:
+    v = v.strip().lower()
+    if v in ('1', 'true', 'yes', 'on'):
+        return True
+    if v in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError(f'invalid boolean: {v!r}')
+
+
+@dataclass(frozen=True)
+class PlaylistQuery:
+    cursor: Optional[str] = None
+    limit: int = DEFAULT_LIMIT
+    artist: Optional[str] = None
+    title: Optional[str] = None
+    format: Optional[str] = None
+    has_hls: Optional[bool] = None
+    sort: str = 'title'
+    desc: bool = False
+
+    PARAMS = ('cursor', 'limit', 'artist', 'title', 'format', 'hasHLS', 'sort')
+
+    @classmethod
+    def from_args(cls, args: Mapping[str, str]) -> Optional["PlaylistQuery"]:
+        """Parse query-string args; None if none of the paging/filter params is present.
+
+        Raises ValueError for malformed values.
+        """
+        if not any(k in args for k in cls.PARAMS):
+            return None
+        try:
+            limit = int(args.get('limit') or DEFAULT_LIMIT)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if limit <= 0:
+            raise ValueError('limit must be > 0')
+        sort = (args.get('sort') or 'title').strip()
+        desc = sort.startswith('-')
+        sort = sort.lstrip('-')
+        if sort not in SORT_KEYS:
+            raise ValueError(f"unknown sort key {sort!r}, expected one of: {', '.join(SORT_KEYS)}")
+        has_hls = args.get('hasHLS')
+        return cls(
+            cursor=args.get('cursor') or None, limit=min(limit, MAX_LIMIT),
+            artist=fold_text(args['artist']) if args.get('artist') else None,
+            title=fold_text(args['title']) if args.get('title') else None,
+            format=args['format'].strip().lower().lstrip('.') if args.get('format') else None,
+            has_hls=_parse_bool(has_hls) if has_hls else None,
+            sort=sort, desc=desc,
+        )
+
+    @property
+    def view_key(self) -> Tuple:
+        return (self.sort, self.desc, self.artist, self.title, self.format, self.has_hls)
+
+    @property
+    def filtered(self) -> bool:
+        return any(v is not None for v in (self.artist, self.title, self.format, self.has_hls))
+
+
+class PlaylistIndex:
+    """Query index over one playlist version.
+
+    Sort orders are built once per key; each distinct filter combination is
+    materialized on first use and kept in a small LRU, so paging through a
+    result costs O(page size). ``version`` (the playlist ETag) is bound into
+    every cursor handed out, so a cursor cannot be replayed against a
+    rewritten list.
+    """
+
+    MAX_VIEWS = 64
+
+    def __init__(self, tracks: List[dict], version: str = ''):
+        self.tracks = tracks
+        self.version = version
+        self._artist = [fold_text(t.get('artist') or '') for t in tracks]
+        self._title = [fold_text(t.get('title') or '') for t in tracks]
+        self._orders: Dict[Tuple[str, bool], List[int]] = {}
+        self._views: "OrderedDict[Tuple, List[int]]" = OrderedDict()
+
+    def order(self, sort: str, desc: bool = False) -> List[int]:
+        key = (sort, desc)
+        if key not in self._orders:
+            if desc:
+                self._orders[key] = self.order(sort)[::-1]
+            else:
+                fn = SORT_KEYS[sort]
+                self._orders[key] = sorted(range(len(self.tracks)), key=lambda i: fn(self.tracks[i]))
+        return self._orders[key]
+
+    def _matches(self, i: int, q: PlaylistQuery) -> bool:
+        t = self.tracks[i]
+        if q.format is not None and (t.get('format') or '').lower() != q.format:
+            return False
+        if q.has_hls is not None and bool(t.get('hasHLS')) != q.has_hls:
+            return False
+        if q.artist is not None and q.artist not in self._artist[i]:
+            return False
+        if q.title is not None and q.title not in self._title[i]:
+            return False
+        return True
+
+    def view(self, q: PlaylistQuery) -> List[int]:
+        order = self.order(q.sort, q.desc)
+        if not q.filtered:
+            return order
+        key = q.view_key
+        v = self._views.get(key)
+        if v is None:
+            v = [i for i in order if self._matches(i, q)]
+            self._views[key] = v
+            if len(self._views) > self.MAX_VIEWS:
+                self._views.popitem(last=False)
+        else:
+            self._views.move_to_end(key)
+        return v
+
+    def page(self, q: PlaylistQuery) -> dict:
+        """One page of the view of ``q``; raises ValueError / :class:`StaleCursor` for a bad cursor."""
+        start = decode_cursor(q.cursor, self.version, q) if q.cursor else 0
+        v = self.view(q)
+        end = start + q.limit
+        items = [self.tracks[i] for i in v[start:end]]
+        return {
+            'items': items,
+            'nextCursor': encode_cursor(self.version, q, end) if end < len(v) else None,
+            'total': len(v),
+        }
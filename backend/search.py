@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import heapq
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .utils import fold_text
+
+
+# 中文、日文假名（与 utils.safe_name 一致）以及扩展 A 区汉字与韩文
+_CJK_RANGES = (('\u3040', '\u30ff'), ('\u3400', '\u4dbf'), ('\u4e00', '\u9fff'), ('\uac00', '\ud7af'))
+_CJK = ''.join(f'{lo}-{hi}' for lo, hi in _CJK_RANGES)
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# 命中数超过该值时只按标题顺序取前 N 条，不再逐条计算匹配程度
+RANK_MAX_CANDIDATES = 500
+
+
+@lru_cache(maxsize=None)
+def _token_re() -> re.Pattern:
+    # Unicode 字符类编译要几毫秒，推迟到第一次建索引/查询，不占启动时间
+    return re.compile(rf'[{_CJK}]+|[^\W_{_CJK}]+')
+
+
+def _is_cjk(run: str) -> bool:
+    c = run[:1]
+    return any(lo <= c <= hi for lo, hi in _CJK_RANGES) if c else False
+
+
+def tokenize(text: str) -> Set[str]:
+    """Index terms for ``text``: words for Latin script, unigrams + bigrams for CJK runs."""
+    terms: Set[str] = set()
+    for run in _token_re().findall(fold_text(text)):
+        if _is_cjk(run):
+            terms.update(run)
+            terms.update(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.add(run)
+    return terms
+
+
+def parse_query(q: str) -> Tuple[List[str], Optional[str]]:
+    """Split a query into required exact terms and an optional trailing prefix term.
+
+    CJK runs become their bigrams (or the single character); the last Latin
+    word is matched as a prefix unless the query ends with whitespace.
+    """
+    folded = fold_text(q)
+    runs = _token_re().findall(folded)
+    exact: List[str] = []
+    prefix: Optional[str] = None
+    for n, run in enumerate(runs):
+        if _is_cjk(run):
+            exact.extend([run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)])
+        elif n == len(runs) - 1 and not folded[-1:].isspace():
+            prefix = run
+        else:
+            exact.append(run)
+    return exact, prefix
+
+
+class SearchIndex:
+    """Inverted index over artist/title of the video and music libraries.
+
+    Documents are keyed by (kind, track id) and updated by diffing each new
+    track list against the indexed one, so a rescan only touches changed
+    tracks. Terms are also kept sorted for prefix lookups.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = {}
+        self._terms: List[str] = []  # sorted, for prefix expansion
+        self._doc_ids: Dict[Tuple[str, str], int] = {}
+        self._docs: Dict[int, dict] = {}
+        self._doc_terms: Dict[int, Set[str]] = {}
+        self._doc_sig: Dict[int, Tuple] = {}
+        self._doc_title: Dict[int, str] = {}
+        self._kind_docs: Dict[str, Set[int]] = {}
+        self._order: List[int] = []  # 全部文档按标题排序，查询时懒重建
+        self._doc_pos: Dict[int, int] = {}
+        self._pos_dirty = False
+        self._next_id = 0
+        self._versions: Dict[str, Optional[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def version(self, kind: str) -> Optional[str]:
+        return self._versions.get(kind)
+
+    # ---- maintenance ----
+    def _add_terms(self, doc: int, terms: Iterable[str], created: Set[str], dropped: Set[str]):
+        for t in terms:
+            posting = self._postings.get(t)
+            if posting is None:
+                posting = self._postings[t] = set()
+                # 本次更新里先删后加的词仍在 _terms 中
+                if t in dropped:
+                    dropped.discard(t)
+                else:
+                    created.add(t)
+            posting.add(doc)
+
+    def _remove_terms(self, doc: int, terms: Iterable[str], created: Set[str], dropped: Set[str]):
+        for t in terms:
+            posting = self._postings.get(t)
+            if posting is None:
+                continue
+            posting.discard(doc)
+            if not posting:
+                del self._postings[t]
+                if t in created:
+                    created.discard(t)
+                else:
+                    dropped.add(t)
+
+    def _merge_terms(self, created: Set[str], dropped: Set[str]):
+        # 每次 update 只整体合并一次有序词表，避免逐个 insort/del 的 O(n) 搬移
+        terms = [t for t in self._terms if t not in dropped] if dropped else self._terms
+        if created:
+            terms = list(heapq.merge(terms, sorted(created)))
+        self._terms = terms
+
+    def _remove_doc(self, key: Tuple[str, str], created: Set[str], dropped: Set[str]):
+        doc = self._doc_ids.pop(key)
+        self._kind_docs.get(key[0], set()).discard(doc)
+        self._remove_terms(doc, self._doc_terms.pop(doc, ()), created, dropped)
+        self._docs.pop(doc, None)
+        self._doc_sig.pop(doc, None)
+        self._doc_title.pop(doc, None)
+        self._pos_dirty = True
+
+    def update(self, kind: str, tracks: List[dict], version: Optional[str] = None) -> Tuple[int, int]:
+        """Make the ``kind`` library match ``tracks``; returns (changed, removed) doc counts."""
+        live: Set[Tuple[str, str]] = set()
+        created: Set[str] = set()
+        dropped: Set[str] = set()
+        changed = 0
+        for t in tracks:
+            tid = t.get('id')
+            if not tid:
+                continue
+            key = (kind, tid)
+            live.add(key)
+            sig = (t.get('artist'), t.get('title'))
+            doc = self._doc_ids.get(key)
+            if doc is not None:
+                self._docs[doc] = {**t, 'kind': kind}
+                if self._doc_sig.get(doc) == sig:
+                    continue
+                self._remove_terms(doc, self._doc_terms.get(doc, ()), created, dropped)
+            else:
+                doc = self._doc_ids[key] = self._next_id
+                self._next_id += 1
+                self._kind_docs.setdefault(kind, set()).add(doc)
+                self._docs[doc] = {**t, 'kind': kind}
+            terms = tokenize(f"{t.get('artist') or ''} {t.get('title') or ''}")
+            self._doc_terms[doc] = terms
+            self._doc_sig[doc] = sig
+            self._doc_title[doc] = fold_text(t.get('title') or '')
+            self._add_terms(doc, terms, created, dropped)
+            self._pos_dirty = True
+            changed += 1
+        stale = [k for k in self._doc_ids if k[0] == kind and k not in live]
+        for key in stale:
+            self._remove_doc(key, created, dropped)
+        self._merge_terms(created, dropped)
+        self._versions[kind] = version
+        return changed, len(stale)
+
+    # ---- query ----
+    def _ordering(self) -> Tuple[List[int], Dict[int, int]]:
+        if self._pos_dirty:
+            self._order = sorted(self._doc_title, key=self._doc_title.__getitem__)
+            self._doc_pos = {d: i for i, d in enumerate(self._order)}
+            self._pos_dirty = False
+        return self._order, self._doc_pos
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        i = bisect.bisect_left(self._terms, prefix)
+        out = []
+        while i < len(self._terms) and self._terms[i].startswith(prefix):
+            out.append(self._terms[i])
+            i += 1
+        return out
+
+    def search(self, q: str, kind: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> dict:
+        exact, prefix = parse_query(q)
+        if not exact and not prefix:
+            return {'items': [], 'total': 0}
+
+        cand: Optional[Set[int]] = None
+        # 由短到长求交集，先用最稀有的词缩小候选集
+        for t in sorted(exact, key=lambda t: len(self._postings.get(t, ()))):
+            posting = self._postings.get(t)
+            if not posting:
+                return {'items': [], 'total': 0}
+            cand = posting if cand is None else cand & posting
+            if not cand:
+                return {'items': [], 'total': 0}
+
+        if prefix:
+            expanded = self._prefix_terms(prefix)
+            if cand is not None and len(cand) < len(expanded):
+                # 候选集已很小：逐个检查文档自身的词，避免展开大量前缀词
+                cand = {d for d in cand if any(t.startswith(prefix) for t in self._doc_terms[d])}
+            else:
+                matched: Set[int] = self._postings[expanded[0]] if len(expanded) == 1 else set()
+                if len(expanded) > 1:
+                    for t in expanded:
+                        matched |= self._postings[t]
+                cand = matched if cand is None else cand & matched
+
+        if kind:
+            cand = cand & self._kind_docs.get(kind, set())
+        order, pos = self._ordering()
+        if len(cand) * len(cand) > limit * len(order):
+            # 命中很密集：沿全局标题顺序走，约 limit * N / m 步就能凑满一页
+            top = []
+            for d in order:
+                if d in cand:
+                    top.append(d)
+                    if len(top) >= limit:
+                        break
+        elif len(cand) > RANK_MAX_CANDIDATES:
+            top = heapq.nsmallest(limit, cand, key=pos.__getitem__)
+        else:
+            folded = fold_text(q).strip()
+
+            def rank(d: int):
+                title = self._doc_title[d]
+                # 标题前缀 > 标题包含 > 其他（仅歌手命中）
+                return (0 if title.startswith(folded) else 1 if folded in title else 2, pos[d])
+
+            top = heapq.nsmallest(limit, cand, key=rank)
+        return {'items': [self._docs[d] for d in top], 'total': len(cand)}
+
+
+search_index = SearchIndex()
+# 索引更新在工作线程里进行（冷启动建 10 万条要数秒），期间查询在此锁上等待而不是读到一半的索引
+_index_lock = asyncio.Lock()
+
+
+async def index_tracks(kind: str, tracks: List[dict], version: Optional[str] = None) -> Tuple[int, int]:
+    """Apply :meth:`SearchIndex.update` off the event loop; a no-op if ``version`` is already indexed."""
+    async with _index_lock:
+        if version is not None and search_index.version(kind) == version:
+            return 0, 0
+        return await asyncio.to_thread(search_index.update, kind, tracks, version)
+
+
+async def search_tracks(q: str, kind: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> dict:
+    async with _index_lock:
+        return search_index.search(q, kind, limit)
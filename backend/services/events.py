@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+# 扫描流水线产生的事件类型；人类可读日志由 render() 从事件生成
+EVENT_TYPES = (
+    'scan_started',        # root, exts
+    'discovered',          # file, rel, safe, size, dupOf?
+    'removed',             # file
+    'skipped',             # reason=unchanged: count；reason=hls_exists: file, m3u8
+    'probed',              # file, duration, seconds
+    'transcode_queued',    # file, jobId
+    'transcode_started',   # file, m3u8, strategy, cmd, force, media
+    'transcode_progress',  # job, file, percent, speed, ... (ffmpeg -progress 快照)
+    'transcode_finished',  # file, m3u8, seconds, bytes
+    'transcode_failed',    # file, reason (no_ffmpeg/error/timeout/exit/exception), error?, label?
+    'loudness',            # file, integrated (LUFS), truePeak (dBTP), peak, lra
+    'playlist_written',    # path, count, changed, version?, bytes?
+    'log',                 # line：不属于以上任何一类的自由文本
+)
+
+
+def _failed(d: dict) -> str:
+    label, reason = d.get('label', ''), d.get('reason')
+    name = os.path.basename(d.get('file', ''))
+    if reason == 'no_ffmpeg':
+        return 'WARN: 未找到 ffmpeg 可执行文件（请安装并加入 PATH），跳过转码'
+    if reason == 'timeout':
+        return f"WARN: ffmpeg {label}转码超时：{name}"
+    if reason == 'exit':
+        return f"WARN: ffmpeg {label}转码失败：{name}\n{(d.get('error') or '')[-1000:]}"
+    if reason == 'exception':
+        return f"WARN: 转码任务异常：{name} -> {d.get('error')}"
+    return f"WARN: ffmpeg {label}异常：{name} -> {d.get('error')}"
+
+
+def _skipped(d: dict) -> Optional[str]:
+    if d.get('reason') == 'unchanged':
+        return f"[SCAN] {d['count']} 个文件未变化，跳过"
+    if d.get('reason') == 'hls_exists':
+        return f"[SKIP] 已存在 HLS：{d['m3u8']}"
+    return None
+
+
+def _started(d: dict) -> str:
+    verb = '音频转码' if d.get('media') == 'audio' else '开始转码'
+    return (f"[FFMPEG] {verb} → {d['m3u8']}\n         源: {d['file']}\n"
+            f"         策略: {d.get('strategy')} (FORCE={d.get('force')})\n         命令: {d.get('cmd')}")
+
+
+def _playlist(d: dict) -> str:
+    if not d.get('changed'):
+        return f"[DONE] 播放列表无变化（{d['count']} 条）：{d['path']}"
+    return f"[DONE] 写入 {d['count']} 条到 {d['path']}（版本 {d.get('version')}）"
+
+
+_RENDER: Dict[str, Callable[[dict], Optional[str]]] = {
+    'scan_started': lambda d: f"[SCAN] 扫描上传目录：{d['root']}（扩展名：{', '.join(d['exts'])}）",
+    'discovered': lambda d: (f"[DEDUP] 内容与 {d['dupOf']} 相同，共用输出：{d['file']} -> safe={d['safe']}" if d.get('dupOf')
+                             else f"[FILE] 发现：{d['file']} -> safe={d['safe']}"),
+    'removed': lambda d: f"[FILE] 已删除：{d['file']}",
+    'skipped': _skipped,
+    'transcode_queued': lambda d: f"[QUEUE] 已加入转码队列 #{d['jobId']}：{d['file']}",
+    'transcode_started': _started,
+    'transcode_finished': lambda d: f"[OK] 生成完成：{d['m3u8']}",
+    'transcode_failed': _failed,
+    'loudness': lambda d: (f"[R128] {d['integrated']} LUFS，真峰值 {d.get('truePeak')} dBTP，"
+                           f"LRA {d.get('lra')} LU：{os.path.basename(d['file'])}"),
+    'playlist_written': _playlist,
+    'log': lambda d: d.get('line'),
+}
+
+
+@dataclass
+class ScanEvent:
+    type: str
+    data: dict
+    ts: float = field(default_factory=time.time)
+
+    @property
+    def line(self) -> Optional[str]:
+        """The human-readable log line for this event, or None for machine-only events (probes, progress)."""
+        fn = _RENDER.get(self.type)
+        line = fn(self.data) if fn else None
+        # 转码池内的事件带 job（"i/n"），日志行前加上同样的标记
+        if line is not None and self.data.get('job'):
+            line = f"[{self.data['job']}] {line}"
+        return line
+
+    def to_dict(self) -> dict:
+        return {'event': self.type, 'ts': round(self.ts, 3), **self.data}
+
+
+class ScanReporter:
+    """Where the scan services send their events.
+
+    ``emit(type, **data)`` builds a :class:`ScanEvent`, hands it to
+    ``on_event`` (if any) and writes its rendered line to ``log`` (if any).
+    A reporter is also callable with a plain string, so it can be passed
+    wherever a ``log`` callback is expected; such lines become ``log``
+    events. :meth:`child` adds fields (e.g. the pool's ``job``) to every
+    event emitted through it.
+    """
+
+    def __init__(self, log: Optional[Callable[[str], None]] = print,
+                 on_event: Optional[Callable[[ScanEvent], None]] = None, **context):
+        self.log = log
+        self.on_event = on_event
+        self.context = context
+
+    @classmethod
+    def wrap(cls, log) -> "ScanReporter":
+        return log if isinstance(log, cls) else cls(log)
+
+    @property
+    def listening(self) -> bool:
+        return self.on_event is not None
+
+    def emit(self, type: str, **data) -> ScanEvent:
+        ev = ScanEvent(type, {**self.context, **data} if self.context else data)
+        if self.on_event is not None:
+            self.on_event(ev)
+        if self.log is not None:
+            line = ev.line
+            if line is not None:
+                self.log(line)
+        return ev
+
+    def __call__(self, line: str):
+        self.emit('log', line=line)
+
+    def child(self, **context) -> "ScanReporter":
+        return ScanReporter(self.log, self.on_event, **{**self.context, **context})
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from .. import metrics
+from ..config import Config
+from ..utils import run_streamed
+from .events import ScanReporter
+
+
+# 进度回调的最小间隔（秒）；结束时总会再发一次
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+ProgressCallback = Callable[[dict], None]
+
+SEGMENT_TYPES = ('ts', 'fmp4')
+
+
+def segment_args(segment_type: str, seg_dir: Path) -> List[str]:
+    """HLS muxer args for MPEG-TS (``segment_%03d.ts``) or fMP4/CMAF (``init.mp4`` + ``segment_%03d.m4s``)."""
+    if segment_type == 'fmp4':
+        return [
+            '-hls_segment_type', 'fmp4',
+            '-hls_fmp4_init_filename', 'init.mp4',
+            '-hls_segment_filename', str(seg_dir / 'segment_%03d.m4s'),
+        ]
+    return ['-hls_segment_filename', str(seg_dir / 'segment_%03d.ts')]
+
+
+_encoders: Optional[frozenset] = None
+
+
+async def ffmpeg_encoders() -> frozenset:
+    """Encoder names of the ffmpeg on PATH, asked once per process without blocking the event loop."""
+    global _encoders
+    if _encoders is None:
+        out = b''
+        try:
+            proc = await asyncio.create_subprocess_exec('ffmpeg', '-hide_banner', '-encoders', stdout=asyncio.subprocess.PIPE,
+                                                        stderr=asyncio.subprocess.DEVNULL, stdin=asyncio.subprocess.DEVNULL)
+            try:
+                out, _ = await asyncio.wait_for(proc.communicate(), timeout=10)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        except OSError:
+            pass
+        # 形如 " V....D libx264  ..." 的行，第二列是编码器名
+        _encoders = frozenset(f[1] for f in (line.split() for line in out.decode('utf-8', 'ignore').splitlines()) if len(f) > 1)
+    return _encoders
+
+
+def hls_packaging(outdir: Path) -> Optional[str]:
+    """'fmp4' or 'ts' judged from the written playlist (first variant of a master), None if missing."""
+    try:
+        text = (outdir / 'playlist.m3u8').read_text(encoding='utf-8', errors='ignore')
+        if '#EXT-X-STREAM-INF' in text:
+            uri = next(l.strip() for l in text.splitlines() if l.strip() and not l.startswith('#'))
+            text = (outdir / uri).read_text(encoding='utf-8', errors='ignore')
+    except (OSError, StopIteration):
+        return None
+    return 'fmp4' if '#EXT-X-MAP' in text else 'ts'
+
+
+def _num(v: Optional[str]) -> Optional[float]:
+    if v is None:
+        return None
+    v = v.strip().rstrip('x')
+    if not v or v == 'N/A':
+        return None
+    try:
+        return float(v)
+    except ValueError:
+        return None
+
+
+class ProgressParser:
+    """Parse ffmpeg's ``-progress`` key=value stream into rate-limited snapshots.
+
+    ffmpeg writes one block of ``key=value`` lines per update, terminated by
+    ``progress=continue`` (or ``progress=end`` on the last one).
+    """
+
+    def __init__(self, duration: Optional[float], emit: ProgressCallback, interval: float = PROGRESS_INTERVAL_SECONDS):
+        self.duration = duration if duration and duration > 0 else None
+        self.emit = emit
+        self.interval = interval
+        self.fields: dict = {}
+        self.started = time.monotonic()
+        self._last_emit = 0.0
+
+    def feed(self, line: str):
+        key, sep, value = line.partition('=')
+        if not sep:
+            return
+        key, value = key.strip(), value.strip()
+        self.fields[key] = value
+        if key != 'progress':
+            return
+        final = value == 'end'
+        now = time.monotonic()
+        if final or now - self._last_emit >= self.interval:
+            self._last_emit = now
+            self.emit(self.snapshot(final))
+
+    def snapshot(self, final: bool = False) -> dict:
+        f = self.fields
+        # out_time_ms 在 ffmpeg 中实际也是微秒
+        us = _num(f.get('out_time_us')) or _num(f.get('out_time_ms'))
+        out_time = us / 1_000_000 if us is not None else None
+        speed = _num(f.get('speed'))
+        bitrate = f.get('bitrate') or ''
+        percent = None
+        eta = None
+        if self.duration and out_time is not None:
+            percent = 100.0 if final else min(100.0, max(0.0, out_time / self.duration * 100))
+            if speed and speed > 0 and not final:
+                eta = max(0.0, (self.duration - out_time) / speed)
+        size = _num(f.get('total_size'))
+        return {
+            'percent': round(percent, 1) if percent is not None else None,
+            'outTime': round(out_time, 2) if out_time is not None else None,
+            'duration': self.duration,
+            'speed': speed,
+            'fps': _num(f.get('fps')),
+            'bitrateKbps': _num(bitrate.replace('kbits/s', '')) if 'kbits/s' in bitrate else None,
+            'size': int(size) if size is not None else None,
+            'eta': round(eta, 1) if eta is not None else 0.0 if final else None,
+            'elapsed': round(time.monotonic() - self.started, 1),
+            'done': final,
+        }
+
+
+async def run_ffmpeg(cfg: Config, cmd: List[str], src, log, duration: Optional[float] = None,
+                     progress: Optional[ProgressCallback] = None, label: str = '') -> bool:
+    """Run an ffmpeg command with ``-progress pipe:1`` and report progress snapshots.
+
+    ffmpeg's own log (stderr) is echoed to the server's stderr when verbose,
+    and its tail is included in the failure event otherwise.
+    """
+    rep = ScanReporter.wrap(log)
+    stream_logs = cfg.VERBOSE or cfg.FFMPEG_LOGLEVEL.lower() not in ('error', 'fatal', 'panic', 'quiet')
+    cmd = [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
+    tail: deque = deque(maxlen=40)
+    parser = ProgressParser(duration, progress) if progress else None
+
+    def on_stderr(line: str):
+        tail.append(line)
+        if stream_logs:
+            print(line, file=sys.stderr, flush=True)
+
+    t0 = time.perf_counter()
+    try:
+        rc = await run_streamed(cmd, timeout=cfg.FFMPEG_TIMEOUT_SECONDS,
+                                on_stdout=parser.feed if parser else None, on_stderr=on_stderr)
+    except Exception as e:
+        metrics.FFMPEG_SECONDS.observe(time.perf_counter() - t0, 'error')
+        rep.emit('transcode_failed', reason='error', file=str(src), label=label, error=str(e))
+        return False
+    metrics.FFMPEG_SECONDS.observe(time.perf_counter() - t0, 'ok' if rc == 0 else 'timeout' if rc == 124 else 'failed')
+    if rc == 124:
+        rep.emit('transcode_failed', reason='timeout', file=str(src), label=label)
+        return False
+    if rc != 0:
+        rep.emit('transcode_failed', reason='exit', file=str(src), label=label, code=rc, error='\n'.join(tail))
+        return False
+    return True
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .events import ScanEvent, ScanReporter
+
+
+ScanFn = Callable[[ScanReporter], Awaitable[dict]]
+
+
+def event_frame(ev: ScanEvent) -> dict:
+    """JSON-ready form of an event, with its rendered log line when it has one."""
+    d = ev.to_dict()
+    line = ev.line
+    if line is not None:
+        d['line'] = line
+    return d
+
+
+class Subscriber:
+    """One client's view of a scan: queued event frames plus the newest progress per job.
+
+    Progress frames are coalesced, so a slow reader only ever sees the latest
+    snapshot. Other frames are queued up to ``limit``; past that the
+    subscriber is marked ``dropped`` and gets nothing more.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.events: deque = deque()
+        self.latest: Dict[Optional[str], dict] = {}
+        self.wake = asyncio.Event()
+        self.dropped = False
+
+    def push(self, frame: dict):
+        if self.dropped:
+            return
+        if frame['event'] == 'transcode_progress':
+            self.latest[frame.get('job')] = frame
+        elif len(self.events) >= self.limit:
+            # 跟不上的订阅者直接断开（可重连拿回放），绝不让扫描等它
+            self.dropped = True
+            self.events.clear()
+            self.latest.clear()
+        else:
+            self.events.append(frame)
+        self.wake.set()
+
+    def drain(self) -> List[dict]:
+        batch = [*self.events, *self.latest.values()]
+        self.events.clear()
+        self.latest.clear()
+        self.wake.clear()
+        return batch
+
+
+class ScanRun:
+    """One scan of a library, fanned out to any number of subscribers.
+
+    Recent event frames are kept in a ring buffer of ``replay`` entries
+    (plus the latest progress per job), so a client that attaches mid-scan
+    first gets that history and then live updates.
+    """
+
+    def __init__(self, kind: str, replay: int, queue_limit: int):
+        self.kind = kind
+        self.started = time.time()
+        self.history: deque = deque(maxlen=replay)
+        self.progress: Dict[Optional[str], dict] = {}
+        self.queue_limit = queue_limit
+        self.subscribers: set[Subscriber] = set()
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.done = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return not self.done.is_set()
+
+    def publish(self, ev: ScanEvent):
+        frame = event_frame(ev)
+        if ev.type == 'transcode_progress':
+            self.progress[frame.get('job')] = frame
+        else:
+            self.history.append(frame)
+            if ev.type in ('transcode_finished', 'transcode_failed'):
+                self.progress.pop(frame.get('job'), None)
+        for sub in self.subscribers:
+            sub.push(frame)
+
+    def subscribe(self) -> "tuple[Subscriber, List[dict]]":
+        """Register a subscriber; returns it with the replay frames to send first."""
+        sub = Subscriber(self.queue_limit)
+        self.subscribers.add(sub)
+        return sub, [*self.history, *self.progress.values()]
+
+    def unsubscribe(self, sub: Subscriber):
+        self.subscribers.discard(sub)
+
+    def finish(self, result: Optional[dict] = None, error: Optional[str] = None):
+        self.result, self.error = result, error
+        self.progress.clear()
+        self.done.set()
+        for sub in self.subscribers:
+            sub.wake.set()
+
+
+class ScanHub:
+    """The current scan of each library, fanned out to WebSocket subscribers.
+
+    Every scan is published here: those started over the WebSocket run as a
+    background task (:meth:`start`), job-queue scans run inline in their
+    worker (:meth:`run`). A finished run stays in ``runs`` until the next one
+    for its library starts; ``stop()`` cancels background runs still going at
+    shutdown.
+    """
+
+    def __init__(self, replay: int = 500, queue_limit: int = 1000):
+        self.replay = replay
+        self.queue_limit = queue_limit
+        self.runs: Dict[str, ScanRun] = {}
+
+    def current(self, kind: str) -> Optional[ScanRun]:
+        return self.runs.get(kind)
+
+    def _begin(self, kind: str) -> ScanRun:
+        run = self.runs[kind] = ScanRun(kind, self.replay, self.queue_limit)
+        return run
+
+    async def _drive(self, run: ScanRun, scan: ScanFn, log=None,
+                     on_event: Optional[Callable[[ScanEvent], None]] = None) -> dict:
+        def publish(ev: ScanEvent):
+            if on_event is not None:
+                on_event(ev)
+            run.publish(ev)
+
+        try:
+            result = await scan(ScanReporter(log=log, on_event=publish))
+        except asyncio.CancelledError:
+            run.finish(error='scan cancelled')
+            raise
+        except Exception as e:
+            run.finish(error=str(e))
+            raise
+        run.finish(result=result)
+        return result
+
+    def start(self, kind: str, scan: ScanFn, lock: Optional[asyncio.Lock] = None) -> ScanRun:
+        """Run ``scan`` as a background task (under ``lock`` if given); returns the run to subscribe to."""
+        run = self._begin(kind)
+
+        async def main():
+            try:
+                if lock is None:
+                    await self._drive(run, scan)
+                    return
+                async with lock:
+                    # 等锁期间可能有任务扫描成为当前 run，拿到锁后重新登记
+                    self.runs[kind] = run
+                    await self._drive(run, scan)
+            except Exception:
+                pass  # 错误已记录在 run.error 中
+
+        run.task = asyncio.create_task(main())
+        return run
+
+    async def run(self, kind: str, scan: ScanFn, log=None,
+                  on_event: Optional[Callable[[ScanEvent], None]] = None) -> dict:
+        """Run ``scan`` in the calling task as the library's current run and return its result.
+
+        Events also go to ``log`` / ``on_event``; exceptions propagate after
+        the run is marked finished.
+        """
+        return await self._drive(self._begin(kind), scan, log, on_event)
+
+    async def stop(self):
+        tasks = [r.task for r in self.runs.values() if r.task is not None and not r.task.done()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
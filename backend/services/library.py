@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AbstractSet, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .. import metrics
+from ..catalog import catalog_for
+from ..config import Config
+from ..utils import PhaseTimer, safe_name, short_id, parse_artist_title
+from .events import ScanReporter
+from .ffmpeg import ProgressCallback, hls_packaging
+from .manifest import ScanManifest, list_subdirs, upload_track_id
+from .playlist import PlaylistStore
+from .probe import probe_all, probe_cache
+from .scheduler import Transcoder, run_transcode_jobs
+
+
+# (full, rel, stat, safe, outdir)：本次新增/变化、需要转码的上传文件
+Discovered = Tuple[Path, str, os.stat_result, str, Path]
+
+
+@dataclass(frozen=True)
+class Library:
+    """The kind-specific parts of a scan: directories, file types and the transcode/track entry points.
+
+    ``track(cfg, safe, meta, has_hls, probe, renditions, packaging, track_id)``
+    builds a playlist entry; ``extra_meta(outdir)`` and ``renditions(outdir)``
+    read what the transcoder left in an HLS output dir.
+    """
+    kind: str
+    upload_dir: Path
+    hls_dir: Path
+    playlist_file: Path
+    exts: AbstractSet[str]
+    transcode: Transcoder
+    track: Callable[..., dict]
+    extra_meta: Callable[[Path], dict]
+    renditions: Callable[[Path], List[str]]
+
+
+def record_discovered(lib: Library, manifest: ScanManifest, discovered: Iterable[Discovered],
+                      results: Dict[Path, dict]):
+    for full, rel, st, safe, outdir in discovered:
+        info = results.get(outdir, {})
+        artist, title = parse_artist_title(full.stem)
+        meta = {'originalFile': full.name, 'artist': artist, 'title': title, 'format': full.suffix.lower().lstrip('.'),
+                **lib.extra_meta(outdir)}
+        manifest.record(rel, st, safe=safe, hasHLS=info.get('hasHLS', False), strategy=info.get('strategy'), meta=meta,
+                        renditions=lib.renditions(outdir), packaging=hls_packaging(outdir))
+
+
+def upload_track(lib: Library, cfg: Config, manifest: ScanManifest, rel: str, full: Path, st: os.stat_result,
+                 probes) -> dict:
+    rec = manifest.get(rel)
+    return lib.track(cfg, rec['safe'], rec.get('meta') or {}, rec.get('hasHLS', False), probes.get(full, st),
+                     rec.get('renditions'), rec.get('packaging'), upload_track_id(rel, rec))
+
+
+async def claim_upload(lib: Library, cfg: Config, manifest: ScanManifest, rel: str, full: Path,
+                       st: os.stat_result, log) -> str:
+    """Assign ``rel`` an HLS output dir name (shared with an identical upload when deduplicating)."""
+    claim = await manifest.claim(lib.upload_dir, rel, full, st, safe_name(full.name),
+                                 cfg.SCAN_CONTENT_HASH, cfg.UPLOAD_DEDUP)
+    ScanReporter.wrap(log).emit('discovered', file=str(full), rel=rel, safe=claim['safe'], size=claim['size'],
+                                dupOf=claim.get('dupOf'))
+    return claim['safe']
+
+
+async def _transcode_discovered(lib: Library, cfg: Config, manifest: ScanManifest, discovered: List[Discovered],
+                                timer: PhaseTimer, rep: ScanReporter, transcode_jobs, progress):
+    # 先发现后转码：默认按并发上限就地分发 ffmpeg 任务，
+    # 后台任务队列会传入自己的 transcode_jobs 改为入队
+    # 转码前统一探测（含与他人共用输出、不会进转码器的重复文件），转码器内命中缓存
+    timer.switch('probe')
+    await probe_all(cfg, [full for full, _, _, _, _ in discovered], rep)
+    timer.switch('transcode')
+    results = await transcode_jobs(cfg, [(full, outdir) for full, _, _, _, outdir in discovered], lib.transcode, rep,
+                                   progress=progress)
+    timer.switch('meta')
+    record_discovered(lib, manifest, discovered, results)
+
+
+async def _commit(lib: Library, catalog, store: PlaylistStore, manifest: ScanManifest, probes, timer: PhaseTimer,
+                  rep: ScanReporter, mode: str, started: float, result: Dict) -> Dict:
+    # 写入播放列表（内容未变化时不重写），文件记录、曲目与探测结果在同一事务内落库
+    with catalog.transaction():
+        timer.switch('playlist')
+        store.commit(manifest, rep)
+        timer.switch('catalog')
+        manifest.save()
+        probes.save()
+        result['version'] = store.version
+        catalog.record_scan(lib.kind, mode, started, result)
+    timer.switch('search')
+    await store.refresh_search()
+    result['phases'] = timer.stop()
+    metrics.observe_scan(lib.kind, mode, result['phases'])
+    return result
+
+
+async def scan_library(lib: Library, cfg: Config, log=print, transcode_jobs=run_transcode_jobs,
+                       progress: Optional[ProgressCallback] = None) -> Dict:
+    """Walk ``lib.upload_dir``, transcode new/changed uploads and rewrite the playlist."""
+    cfg.ensure_dirs()
+    rep = ScanReporter.wrap(log)
+    tracks: List[dict] = []
+    seen_safe: set[str] = set()
+    seen: List[Tuple[str, Path, os.stat_result]] = []  # 本次发现的上传文件 (rel, full, stat)，按遍历顺序
+    discovered: List[Discovered] = []
+
+    started = time.time()
+    timer = PhaseTimer()
+    timer.switch('walk')
+    catalog = catalog_for(cfg)
+    probes = probe_cache(cfg)
+    manifest = ScanManifest.load(catalog, lib.kind)
+    hls_dirs = list_subdirs(lib.hls_dir)
+    safes: Dict[str, str] = {}  # 曲目 id -> 输出目录名，写入目录数据库
+
+    if lib.upload_dir.exists():
+        rep.emit('scan_started', root=str(lib.upload_dir), exts=sorted(lib.exts))
+        unchanged = 0
+        for dirpath, dirnames, filenames in os.walk(lib.upload_dir):
+            dirnames.sort()
+            for fn in sorted(filenames):
+                ext = Path(fn).suffix.lower()
+                if ext not in lib.exts:
+                    continue
+                full = Path(dirpath) / fn
+                rel = full.relative_to(lib.upload_dir).as_posix()
+                try:
+                    st = full.stat()
+                except FileNotFoundError:
+                    continue
+                seen.append((rel, full, st))
+                rec = await manifest.unchanged(rel, full, st, cfg.SCAN_CONTENT_HASH)
+                # 未变化且 HLS 仍在：不探测、不转码、不重写记录
+                if rec and rec.get('hasHLS') and rec.get('safe') in hls_dirs and not cfg.FORCE_REENCODE:
+                    unchanged += 1
+                    continue
+                safe = await claim_upload(lib, cfg, manifest, rel, full, st, rep)
+                discovered.append((full, rel, st, safe, lib.hls_dir / safe))
+        if not seen:
+            rep(f"[SCAN] 未在 {lib.upload_dir} 内发现可处理的文件。")
+        elif unchanged:
+            rep.emit('skipped', reason='unchanged', count=unchanged)
+
+        await _transcode_discovered(lib, cfg, manifest, discovered, timer, rep, transcode_jobs, progress)
+        hls_dirs.update(safe for _, _, _, safe, _ in discovered)
+
+        for rel, full, st in seen:
+            track = upload_track(lib, cfg, manifest, rel, full, st, probes)
+            safes[track['id']] = manifest.get(rel)['safe']
+            seen_safe.add(safes[track['id']])
+            tracks.append(track)
+        manifest.prune(rel for rel, _, _ in seen)
+        probes.prune(lib.upload_dir, (full for _, full, _ in seen))
+    else:
+        rep(f"[WARN] 上传目录不存在：{lib.upload_dir}")
+
+    # 补扫 HLS 目录（无对应上传文件的已有 HLS）
+    timer.switch('backfill')
+    for safe_dir in sorted(hls_dirs):
+        if safe_dir in seen_safe:
+            continue
+        meta = manifest.orphan_meta(lib.hls_dir / safe_dir)
+        if meta is None:
+            continue
+        tracks.append(lib.track(cfg, safe_dir, meta, True))
+        safes[tracks[-1]['id']] = safe_dir
+    manifest.prune_orphans(hls_dirs)
+
+    store = PlaylistStore.from_tracks(lib.kind, lib.playlist_file, catalog, tracks, safes)
+    result = {'count': len(tracks), 'updated': len(discovered), 'playlist': str(lib.playlist_file)}
+    return await _commit(lib, catalog, store, manifest, probes, timer, rep, 'full', started, result)
+
+
+async def update_library(lib: Library, cfg: Config, paths: Iterable[Path], log=print,
+                         transcode_jobs=run_transcode_jobs, progress: Optional[ProgressCallback] = None) -> Dict:
+    """Incremental counterpart of :func:`scan_library` for a few known upload paths.
+
+    Only these files are stat'ed, probed and transcoded, and only their
+    entries in the existing playlist.json are replaced, added or removed
+    (a deleted upload whose HLS output remains becomes an orphan entry, as
+    in a full scan). Falls back to a full scan when there is no playlist yet.
+    """
+    rep = ScanReporter.wrap(log)
+    catalog = catalog_for(cfg)
+    store = PlaylistStore.load(lib.kind, lib.playlist_file, catalog)
+    if store.tracks is None:
+        return await scan_library(lib, cfg, log=rep, transcode_jobs=transcode_jobs, progress=progress)
+
+    started = time.time()
+    timer = PhaseTimer()
+    timer.switch('walk')
+    probes = probe_cache(cfg)
+    manifest = ScanManifest.load(catalog, lib.kind, preload=False)
+    touched: List[Tuple[str, Path, os.stat_result]] = []
+    discovered: List[Discovered] = []
+    removed: List[Tuple[str, str]] = []  # (safe, 曲目 id)
+    for full in map(Path, paths):
+        if full.suffix.lower() not in lib.exts:
+            continue
+        try:
+            rel = full.relative_to(lib.upload_dir).as_posix()
+        except ValueError:
+            continue
+        try:
+            st = full.stat()
+        except FileNotFoundError:
+            rec = manifest.forget(rel)
+            if rec:
+                removed.append((rec['safe'], upload_track_id(rel, rec)))
+                rep.emit('removed', file=str(full), rel=rel)
+            continue
+        touched.append((rel, full, st))
+        rec = await manifest.unchanged(rel, full, st, cfg.SCAN_CONTENT_HASH)
+        if rec and rec.get('hasHLS') and (lib.hls_dir / rec['safe']).is_dir() and not cfg.FORCE_REENCODE:
+            continue
+        safe = await claim_upload(lib, cfg, manifest, rel, full, st, rep)
+        discovered.append((full, rel, st, safe, lib.hls_dir / safe))
+
+    await _transcode_discovered(lib, cfg, manifest, discovered, timer, rep, transcode_jobs, progress)
+
+    for rel, full, st in touched:
+        store.upsert(upload_track(lib, cfg, manifest, rel, full, st, probes), manifest.get(rel)['safe'])
+    timer.switch('backfill')
+    drop: List[str] = []
+    for safe, track_id in removed:
+        # 另有上传文件（如重复内容）仍对应该输出目录时不转为孤儿条目
+        meta = None if manifest.safe_in_use(safe) else manifest.orphan_meta(lib.hls_dir / safe)
+        if meta is None or track_id != short_id(safe):
+            drop.append(track_id)
+        if meta is not None:
+            store.upsert(lib.track(cfg, safe, meta, True), safe)
+    dropped = store.delete(drop)
+
+    result = {'count': len(store.tracks), 'updated': len(discovered), 'removed': dropped,
+              'playlist': str(lib.playlist_file)}
+    return await _commit(lib, catalog, store, manifest, probes, timer, rep, 'update', started, result)
@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from ..catalog import Catalog
+from ..utils import file_digest, short_id
+
+
+def list_subdirs(root: Path) -> set[str]:
+    """Names of the direct sub-directories of ``root`` (one scandir, no per-entry stat)."""
+    try:
+        with os.scandir(root) as it:
+            return {e.name for e in it if e.is_dir()}
+    except FileNotFoundError:
+        return set()
+
+
+def _meta_from_track(track: dict) -> dict:
+    meta = {k: track[k] for k in ('artist', 'title', 'format') if track.get(k) is not None}
+    for key in ('originalFile', 'poster', 'thumbnails'):
+        if track.get(key):
+            meta[key] = track[key].rsplit('/', 1)[-1]
+    if track.get('loudness'):
+        meta['loudness'] = track['loudness']
+    # normalized/playlist.m3u8：相对于主播放列表所在目录
+    base = (track.get('hlsUrl') or '').rsplit('/', 1)[0] + '/'
+    if (track.get('normalizedHlsUrl') or '').startswith(base):
+        meta['normalized'] = track['normalizedHlsUrl'][len(base):]
+    return meta
+
+
+def upload_track_id(rel: str, rec: dict) -> str:
+    """Playlist id of an upload: the output dir's id, or a per-path id for duplicates sharing it."""
+    if rec.get('dupOf'):
+        return short_id(f"{rec['safe']}:{rel}")
+    return short_id(rec['safe'])
+
+
+def _same_algo(a: str, b: str) -> bool:
+    return a.startswith('xxh3:') == b.startswith('xxh3:')
+
+
+def _same_content(rec: dict, st: os.stat_result, digest: Optional[str]) -> bool:
+    # 有可比的哈希就比哈希，否则退回 size + mtime
+    if digest and rec.get('hash') and _same_algo(rec['hash'], digest):
+        return rec['hash'] == digest
+    return rec.get('size') == st.st_size and rec.get('mtime') == st.st_mtime_ns
+
+
+class ScanManifest:
+    """What previous scans saw for one library, read from and saved to the catalog.
+
+    ``files`` is keyed by the upload path relative to the upload dir and stores
+    the source identity (size + mtime_ns, optionally a content hash) together
+    with the safe name, codec decision, HLS status and metadata. ``orphans``
+    caches the back-fill lookups for HLS directories without an upload, keyed
+    by directory mtime. A rescan only has to touch entries whose identity
+    changed, and :meth:`save` writes just those rows in one transaction.
+
+    A full scan loads every record up front (``preload=True``); single-file
+    updates look records up one by one through the catalog's indexes.
+
+    New or changed uploads get their output dir through :meth:`claim`, which
+    points byte-identical copies at one shared output (``dupOf``) and keeps
+    different files whose names reduce to the same safe name apart.
+    """
+
+    def __init__(self, catalog: Catalog, kind: str):
+        self.catalog = catalog
+        self.kind = kind
+        self.files: Dict[str, dict] = {}
+        self.playlist: Optional[str] = catalog.get_state(kind, 'playlist')
+        self.dirty = False
+        self._all = False
+        self._changed: set[str] = set()
+        self._removed: set[str] = set()
+        self._orphans: Optional[Dict[str, dict]] = None
+        self._orphans_changed: set[str] = set()
+        self._orphans_removed: set[str] = set()
+        self._retired: Dict[str, dict] = {}  # 本次删除的上传记录的 meta，按 safe
+        self._claims: Dict[str, dict] = {}  # 本次发现、尚未 record 的上传：rel -> {size, safe, hash, dupOf}
+        self._by: Optional[Dict[str, Dict[object, set]]] = None  # 预加载时的 size/safe 内存索引
+
+    @classmethod
+    def load(cls, catalog: Catalog, kind: str, preload: bool = True) -> "ScanManifest":
+        m = cls(catalog, kind)
+        if preload:
+            m.files = catalog.files(kind)
+            m._all = True
+        return m
+
+    def get(self, rel: str) -> Optional[dict]:
+        rec = self.files.get(rel)
+        if rec is None and not self._all and rel not in self._removed:
+            rec = self.catalog.file(self.kind, rel)
+            if rec is not None:
+                self.files[rel] = rec
+        return rec
+
+    def save(self):
+        if not (self.dirty or self._changed or self._removed or self._orphans_changed or self._orphans_removed):
+            return
+        with self.catalog.transaction():
+            self.catalog.put_files(self.kind, {rel: self.files[rel] for rel in self._changed})
+            self.catalog.delete_files(self.kind, self._removed)
+            if self._orphans is not None:
+                self.catalog.put_orphans(self.kind, {s: self._orphans[s] for s in self._orphans_changed})
+            self.catalog.delete_orphans(self.kind, self._orphans_removed)
+            self.catalog.set_state(self.kind, 'playlist', self.playlist)
+        self._changed.clear()
+        self._removed.clear()
+        self._orphans_changed.clear()
+        self._orphans_removed.clear()
+        self.dirty = False
+
+    async def unchanged(self, rel: str, src: Path, st: os.stat_result, use_hash: bool = False) -> Optional[dict]:
+        """Return the stored record if ``src`` has not changed since it was recorded."""
+        rec = self.get(rel)
+        if not rec or rec.get('size') != st.st_size:
+            return None
+        if rec.get('mtime') == st.st_mtime_ns:
+            return rec
+        # mtime 变了但内容可能没变（如 touch / 重新拷贝），按内容哈希确认
+        if use_hash and rec.get('hash'):
+            if await asyncio.to_thread(file_digest, src, like=rec['hash']) == rec['hash']:
+                rec['mtime'] = st.st_mtime_ns
+                self._changed.add(rel)
+                return rec
+        return None
+
+    # ---- 去重与命名 ----
+    def _lookup(self, key: str, value, rel: str) -> List[str]:
+        """Other uploads whose current (claimed or stored) ``key`` equals ``value``."""
+        cands = {r for r, c in self._claims.items() if c.get(key) == value}
+        if self._all:
+            if self._by is None:
+                self._by = {'size': {}, 'safe': {}}
+                for r, rec in self.files.items():
+                    self._index(r, rec)
+            cands.update(self._by[key].get(value, ()))
+        else:
+            cands.update(self.catalog.rels_where(self.kind, key, value))
+            cands.update(r for r, rec in self.files.items() if rec.get(key) == value)
+        out = []
+        for r in sorted(cands):
+            cur = self._claims.get(r) or self.get(r)
+            if r != rel and cur is not None and cur.get(key) == value:
+                out.append(r)
+        return out
+
+    def _index(self, rel: str, rec: dict):
+        if self._by is not None:
+            for key in ('size', 'safe'):
+                self._by[key].setdefault(rec.get(key), set()).add(rel)
+
+    def _live(self, root: Path, rel: str) -> bool:
+        # 整库扫描时被删的上传要到 prune 才移除，冲突判断只算仍存在的文件
+        return rel in self._claims or (root / rel).exists()
+
+    async def _peer_digest(self, root: Path, rel: str, like: str) -> Optional[str]:
+        cur = self._claims.get(rel) or self.get(rel)
+        if cur.get('hash') and _same_algo(cur['hash'], like):
+            return cur['hash']
+        src = root / rel
+        try:
+            st = src.stat()
+            digest = await asyncio.to_thread(file_digest, src, like=like)
+        except OSError:
+            return None
+        # 顺带缓存到对方记录里（仅当文件与记录一致）；本次刚发现的则记到 claim，record 时一并落库
+        if rel in self._claims:
+            if cur.get('size') == st.st_size:
+                cur['hash'] = digest
+        elif cur.get('size') == st.st_size and cur.get('mtime') == st.st_mtime_ns:
+            cur['hash'] = digest
+            self._changed.add(rel)
+        return digest
+
+    async def claim(self, root: Path, rel: str, src: Path, st: os.stat_result, safe: str,
+                    use_hash: bool = False, dedup: bool = True) -> dict:
+        """Pick the output dir for a new or changed upload.
+
+        ``safe`` is the name derived from the file name. Other uploads of the
+        same size are compared by content hash (hashes are computed only when
+        such a peer exists, or always with ``use_hash``); with ``dedup`` a
+        byte-identical one lends its output dir. Otherwise the upload keeps
+        its previous dir, or gets ``safe`` unless another existing upload
+        already owns that name, in which case a suffix derived from the upload
+        path is appended. Returns the claim (``safe``, ``hash``, ``dupOf``),
+        which :meth:`record` merges into the upload's record.
+        """
+        prev = self.get(rel)
+        peers = self._lookup('size', st.st_size, rel)
+        digest = None
+        if peers or use_hash:
+            digest = await asyncio.to_thread(file_digest, src)
+        claim = {'size': st.st_size, 'hash': digest}
+        # 内容未变的原主文件保留自己的输出目录，不与指向自己的重复文件比对
+        owner = bool(prev and prev.get('safe') and not prev.get('dupOf') and _same_content(prev, st, digest))
+        if dedup and digest and not owner:
+            for peer in peers:
+                cur = self._claims.get(peer) or self.get(peer)
+                if cur.get('dupOf') == rel:
+                    continue
+                if await self._peer_digest(root, peer, digest) == digest:
+                    claim.update(safe=cur['safe'], dupOf=cur.get('dupOf') or peer)
+                    self._claims[rel] = claim
+                    return claim
+        chosen = None
+        if prev and prev.get('safe') and not prev.get('dupOf'):
+            # 原输出目录仍只归自己（或内容未变）时沿用；已被重复文件共用且内容变了则换名
+            sharing = [r for r in self._lookup('safe', prev['safe'], rel) if self._live(root, r)]
+            if not sharing or owner:
+                chosen = prev['safe']
+        if chosen is None:
+            for name in (safe, f"{safe}-{short_id(rel)[:6]}", f"{safe}-{short_id(rel)}"):
+                chosen = name
+                if not any(self._live(root, r) for r in self._lookup('safe', name, rel)):
+                    break
+        claim['safe'] = chosen
+        self._claims[rel] = claim
+        return claim
+
+    def record(self, rel: str, st: os.stat_result, **fields) -> dict:
+        claim = self._claims.pop(rel, {})
+        fields.setdefault('hash', claim.get('hash'))
+        fields.setdefault('dupOf', claim.get('dupOf'))
+        rec = {'size': st.st_size, 'mtime': st.st_mtime_ns, **{k: v for k, v in fields.items() if v is not None}}
+        self.files[rel] = rec
+        self._changed.add(rel)
+        self._removed.discard(rel)
+        self._index(rel, rec)
+        # 该输出目录有了新的上传记录，back-fill 缓存失效
+        self._drop_orphan(rec.get('safe'))
+        return rec
+
+    def forget(self, rel: str) -> Optional[dict]:
+        """Drop the record of an upload that no longer exists; returns it."""
+        rec = self.get(rel)
+        if rec is None:
+            return None
+        self.files.pop(rel, None)
+        self._changed.discard(rel)
+        self._removed.add(rel)
+        if rec.get('meta'):
+            self._retired[rec['safe']] = rec['meta']
+        return rec
+
+    def prune(self, seen: Iterable[str]):
+        """Forget uploads that no longer exist (needs a preloaded manifest)."""
+        keep = set(seen)
+        for rel in [r for r in self.files if r not in keep]:
+            self.forget(rel)
+
+    def safe_in_use(self, safe: str) -> bool:
+        """Whether some remaining upload still maps to the output dir ``safe``."""
+        if any(r.get('safe') == safe for r in self.files.values()):
+            return True
+        if self._all:
+            return False
+        return any(rel not in self._removed and self.get(rel) is not None
+                   for rel in self.catalog.rels_for_safe(self.kind, safe))
+
+    # ---- back-fill ----
+    @property
+    def orphans(self) -> Dict[str, dict]:
+        if self._orphans is None:
+            self._orphans = self.catalog.orphans(self.kind)
+        return self._orphans
+
+    def _drop_orphan(self, safe: Optional[str]):
+        if safe and self.orphans.pop(safe, None) is not None:
+            self._orphans_changed.discard(safe)
+            self._orphans_removed.add(safe)
+
+    def orphan_meta(self, entry: Path) -> Optional[dict]:
+        """Meta for an HLS dir without an upload, or None if it has no playlist.m3u8.
+
+        Taken from the upload record dropped in this run, else the catalog's
+        track for that dir; ``meta.json`` is only read for dirs the catalog
+        has never seen (restored or imported outputs).
+        """
+        try:
+            mtime = entry.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self.orphans.get(entry.name)
+        if cached and cached.get('mtime') == mtime:
+            return cached.get('meta')
+        meta: Optional[dict] = None
+        if (entry / 'playlist.m3u8').exists():
+            meta = self._retired.get(entry.name)
+            if meta is None:
+                track = self.catalog.track_by_safe(self.kind, entry.name)
+                meta = _meta_from_track(track) if track else None
+            if meta is None:
+                meta = (cached or {}).get('meta') or self._read_meta_json(entry)
+        self.orphans[entry.name] = {'mtime': mtime, 'meta': meta}
+        self._orphans_changed.add(entry.name)
+        self._orphans_removed.discard(entry.name)
+        return meta
+
+    @staticmethod
+    def _read_meta_json(entry: Path) -> dict:
+        try:
+            return json.loads((entry / 'meta.json').read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+
+    def prune_orphans(self, existing: Iterable[str]):
+        keep = set(existing)
+        for name in [n for n in self.orphans if n not in keep]:
+            del self.orphans[name]
+            self._orphans_changed.discard(name)
+            self._orphans_removed.add(name)
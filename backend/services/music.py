@@ -1,33 +1,27 @@
 from __future__ import annotations
 
-import asyncio
 import json
-import os
+import math
+import re
+import time
 import shutil
-import subprocess
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from ..config import Config
-from ..utils import safe_name, short_id, parse_artist_title
+from ..config import MUSIC_EXTS, Config
+from ..utils import dir_size, short_id
+from .events import ScanReporter
+from .ffmpeg import ProgressCallback, ffmpeg_encoders, run_ffmpeg, segment_args
+from .library import Library, scan_library, update_library
+from .playlist import atomic_write
+from .probe import ProbeInfo, probe_media
+from .scheduler import run_transcode_jobs
 
 
-def probe_audio_codec(src: Path) -> str | None:
-    if not shutil.which('ffprobe'):
-        return None
-    try:
-        r = subprocess.run([
-            'ffprobe', '-v', 'error', '-select_streams', 'a:0',
-            '-show_entries', 'stream=codec_name', '-of', 'default=nw=1:nk=1', str(src)
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=20)
-        return r.stdout.decode().strip() if r.returncode == 0 else None
-    except Exception:
-        return None
-
-
-def decide_audio_args(cfg: Config, src: Path) -> tuple[List[str], str]:
+def decide_audio_args(cfg: Config, probe: Optional[ProbeInfo]) -> tuple[List[str], str]:
     """Return audio args and a human-readable note for logs."""
-    ac = probe_audio_codec(src)
+    ac = probe.acodec if probe else None
     if cfg.STRATEGY == 'copy':
         return (['-c:a', 'copy'], 'copy(force)')
     if cfg.STRATEGY == 'transcode':
@@ -37,138 +31,325 @@ def decide_audio_args(cfg: Config, src: Path) -> tuple[List[str], str]:
     return (['-c:a', 'aac', '-b:a', '128k'], f'transcode({ac or "unknown"}->aac)')
 
 
-def write_meta(outdir: Path, meta: dict):
-    outdir.mkdir(parents=True, exist_ok=True)
-    with (outdir / 'meta.json').open('w', encoding='utf-8') as f:
-        json.dump(meta, f, ensure_ascii=False, indent=2)
+# ---- 多码率音频（ABR） ----
+# 每档是同一条 ffmpeg 命令的一路 HLS 输出（共用一次解码）；主播放列表自己写，
+# 这样各档的编码和分片格式可以不同（Opus 只能放 fMP4）
+RFC6381_CODECS = {'aac': 'mp4a.40.2', 'he-aac': 'mp4a.40.5', 'opus': 'opus'}
+LOSSLESS_CODECS = {'flac', 'alac', 'wavpack', 'ape', 'tta', 'mlp', 'truehd'}
+
+
+@dataclass
+class AudioRung:
+    codec: str  # 实际使用的编码：aac | he-aac | opus
+    kbps: int
+    segment_type: str
+    args: List[str]
+
+    @property
+    def name(self) -> str:
+        return f"{self.codec.replace('-', '')}{self.kbps}k"
+
+
+def select_audio_rungs(cfg: Config, probe: Optional[ProbeInfo], encoders: frozenset = frozenset()) -> List[AudioRung]:
+    """Ladder rungs this ffmpeg can encode, without upsizing a lossy source; empty = single rendition.
+
+    ``encoders`` is :func:`ffmpeg_encoders`. A lossy source keeps only the
+    rungs up to about its own bitrate (a 128k MP3 gets no 256k tier);
+    lossless sources keep every rung.
+    """
+    if not cfg.MUSIC_ABR or cfg.STRATEGY == 'copy':
+        return []
+    ac = probe.acodec if probe else None
+    lossy_kbps = None
+    if probe and probe.bitrate and ac and ac not in LOSSLESS_CODECS and not ac.startswith('pcm_'):
+        lossy_kbps = probe.bitrate / 1000
+    rungs: List[AudioRung] = []
+    for codec, kbps in cfg.MUSIC_LADDER:
+        if codec == 'opus':
+            if 'libopus' not in encoders:
+                continue
+            rung = AudioRung('opus', kbps, 'fmp4', ['-c:a', 'libopus', '-b:a', f'{kbps}k', '-ar', '48000'])
+        elif codec == 'he-aac' and 'libfdk_aac' in encoders:
+            rung = AudioRung('he-aac', kbps, cfg.MUSIC_SEGMENT_TYPE,
+                             ['-c:a', 'libfdk_aac', '-profile:a', 'aac_he', '-b:a', f'{kbps}k'])
+        else:
+            rung = AudioRung('aac', kbps, cfg.MUSIC_SEGMENT_TYPE, ['-c:a', 'aac', '-b:a', f'{kbps}k'])
+        if any(r.name == rung.name for r in rungs):
+            continue
+        rungs.append(rung)
+    if lossy_kbps:
+        floor = min(r.kbps for r in rungs) if rungs else 0
+        rungs = [r for r in rungs if r.kbps <= max(lossy_kbps * 1.1, floor)]
+    return rungs if len(rungs) > 1 else []
+
+
+def audio_ladder_outputs(cfg: Config, outdir: Path, rungs: List[AudioRung]) -> List[str]:
+    args: List[str] = []
+    for r in rungs:
+        vdir = outdir / r.name
+        args += [
+            '-map', '0:a:0', '-vn', '-sn', '-dn', *r.args,
+            *(['-threads', str(cfg.FFMPEG_THREADS)] if cfg.FFMPEG_THREADS > 0 else []),
+            '-f', 'hls', '-hls_time', '6', '-hls_list_size', '0', '-hls_flags', 'independent_segments',
+            *segment_args(r.segment_type, vdir),
+            str(vdir / 'playlist.m3u8'),
+        ]
+    return args
+
+
+def _variant_bandwidth(vdir: Path) -> Optional[Tuple[int, int]]:
+    """(peak, average) bits/s of a written media playlist, measured from its segment sizes."""
+    try:
+        lines = (vdir / 'playlist.m3u8').read_text(encoding='utf-8', errors='ignore').splitlines()
+    except OSError:
+        return None
+    peak, bits, seconds, dur = 0.0, 0, 0.0, None
+    for line in lines:
+        line = line.strip()
+        if line.startswith('#EXTINF:'):
+            dur = _float(line[len('#EXTINF:'):].split(',', 1)[0])
+        elif line and not line.startswith('#') and dur:
+            try:
+                size = (vdir / line).stat().st_size * 8
+            except OSError:
+                return None
+            peak, bits, seconds, dur = max(peak, size / dur), bits + size, seconds + dur, None
+    if not seconds:
+        return None
+    return int(peak), int(bits / seconds)
+
+
+def write_audio_master(outdir: Path, rungs: List[AudioRung]):
+    """Write ``playlist.m3u8`` as the master over the rung playlists, highest bitrate first."""
+    version = 7 if any(r.segment_type == 'fmp4' for r in rungs) else 3
+    lines = ['#EXTM3U', f'#EXT-X-VERSION:{version}', '#EXT-X-INDEPENDENT-SEGMENTS']
+    for r in rungs:
+        # 没法测量时按标称码率估（ts 封装约多 10%）
+        peak, avg = _variant_bandwidth(outdir / r.name) or (r.kbps * 1100, r.kbps * 1000)
+        lines += [f'#EXT-X-STREAM-INF:BANDWIDTH={peak},AVERAGE-BANDWIDTH={avg},CODECS="{RFC6381_CODECS[r.codec]}"',
+                  f'{r.name}/playlist.m3u8']
+    atomic_write(outdir / 'playlist.m3u8', ('\n'.join(lines) + '\n').encode('utf-8'))
+
+
+def list_audio_renditions(outdir: Path) -> List[str]:
+    """Variant dir names listed in the master playlist of ``outdir`` (empty for a single rendition)."""
+    try:
+        text = (outdir / 'playlist.m3u8').read_text(encoding='utf-8', errors='ignore')
+    except OSError:
+        return []
+    if '#EXT-X-STREAM-INF' not in text:
+        return []
+    return [l.strip().split('/', 1)[0] for l in text.splitlines() if l.strip() and not l.startswith('#')]
+
+
+# ---- 响度分析（EBU R128）/ 归一化版本 ----
+# 分析是转码命令的另一路输出（共用同一次解码）：ebur128 每帧把累计结果写进帧元数据，
+# ametadata 打印到临时文件，最后一帧即整曲的积分响度 / 真峰值 / 响度范围
+LOUDNESS_FILE = 'loudness.json'
+R128_LOG = '.r128.log'
+NORMALIZED_DIR = 'normalized'
+REPLAYGAIN_REFERENCE_LUFS = -18.0  # ReplayGain 2.0 参考响度
 
 
-async def transcode_to_hls_audio(cfg: Config, src: Path, outdir: Path, log) -> bool:
+def _filter_value(v: str) -> str:
+    """Escape ``v`` for use as a filter option value inside an ``-af`` graph."""
+    v = re.sub(r"([\\':])", r"\\\1", v)  # 选项值层
+    return re.sub(r"([\\'\[\],;])", r"\\\1", v)  # 滤镜图层
+
+
+def loudness_outputs(cfg: Config, outdir: Path) -> list[str]:
+    # 每秒一帧再测量，临时文件只有几百行
+    af = (f"asetnsamples=n=48000:p=0,ebur128=peak=true:metadata=1,"
+          f"ametadata=mode=print:file={_filter_value(str(outdir / R128_LOG))}")
+    return ['-map', '0:a:0', '-vn', '-sn', '-dn', '-af', af, '-f', 'null', '-']
+
+
+def normalized_outputs(cfg: Config, outdir: Path) -> list[str]:
+    """A second HLS rendition under ``normalized/``, run through single-pass loudnorm."""
+    nd = outdir / NORMALIZED_DIR
+    return [
+        '-map', '0:a:0', '-vn', '-sn', '-dn',
+        '-af', f'loudnorm=I={cfg.MUSIC_LOUDNORM_TARGET}:TP=-1.5:LRA=11',
+        '-ar', '48000', '-c:a', 'aac', '-b:a', '128k',
+        '-f', 'hls', '-hls_time', '6', '-hls_list_size', '0', '-hls_flags', 'independent_segments',
+        *segment_args(cfg.MUSIC_SEGMENT_TYPE, nd),
+        str(nd / 'playlist.m3u8'),
+    ]
+
+
+def _float(v: Optional[str]) -> Optional[float]:
+    try:
+        f = float(v)  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        return None
+    return f if math.isfinite(f) else None
+
+
+def parse_r128(text: str) -> Optional[dict]:
+    """Integrated loudness (LUFS), loudness range (LU) and true peak (dBTP + linear) from ametadata output."""
+    vals: Dict[str, str] = {}
+    for line in text.splitlines():
+        key, sep, value = line.partition('=')
+        if sep and key.startswith('lavfi.r128.'):
+            vals[key[len('lavfi.r128.'):]] = value.strip()
+    integrated = _float(vals.get('I'))
+    if integrated is None or integrated <= -70.0:  # 静音或过短，门限以下没有意义
+        return None
+    peak = _float(vals.get('true_peak'))
+    if peak is None:  # 旧版 ffmpeg 只有逐声道的 true_peaks_chN
+        peaks = [p for k, v in vals.items() if k.startswith('true_peaks_ch') for p in [_float(v)] if p is not None]
+        peak = max(peaks) if peaks else None
+    lra = _float(vals.get('LRA'))
+    return {
+        'integrated': round(integrated, 2),
+        'truePeak': round(20 * math.log10(peak), 2) if peak else None,
+        'peak': round(peak, 6) if peak is not None else None,
+        'lra': round(lra, 2) if lra is not None else None,
+    }
+
+
+def read_loudness(outdir: Path) -> Optional[dict]:
+    try:
+        data = json.loads((outdir / LOUDNESS_FILE).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) and data.get('integrated') is not None else None
+
+
+def _store_loudness(src: Path, outdir: Path, rep: ScanReporter) -> Optional[dict]:
+    log_path = outdir / R128_LOG
+    try:
+        loud = parse_r128(log_path.read_text(encoding='utf-8', errors='ignore'))
+    except OSError:
+        return None
+    finally:
+        log_path.unlink(missing_ok=True)
+    if loud is not None:
+        atomic_write(outdir / LOUDNESS_FILE, json.dumps(loud).encode('utf-8'))
+        rep.emit('loudness', file=str(src), **loud)
+    return loud
+
+
+async def measure_loudness(cfg: Config, src: Path, outdir: Path, log) -> Optional[dict]:
+    """Analysis-only pass for an HLS output transcoded before loudness was measured."""
+    rep = ScanReporter.wrap(log)
+    cmd = ['ffmpeg', '-y', '-nostdin', '-i', str(src), *loudness_outputs(cfg, outdir), '-loglevel', cfg.FFMPEG_LOGLEVEL]
+    if not await run_ffmpeg(cfg, cmd, src, rep, label='响度分析'):
+        (outdir / R128_LOG).unlink(missing_ok=True)
+        return None
+    return _store_loudness(src, outdir, rep)
+
+
+async def transcode_to_hls_audio(cfg: Config, src: Path, outdir: Path, log, info: Optional[dict] = None,
+                                 progress: Optional[ProgressCallback] = None) -> bool:
+    rep = ScanReporter.wrap(log)
     outdir.mkdir(parents=True, exist_ok=True)
+    # 单次 ffprobe（带缓存），即使跳过转码也为播放列表提供时长
+    probe = await probe_media(cfg, src)
     m3u8 = outdir / 'playlist.m3u8'
     if m3u8.exists() and not cfg.FORCE_REENCODE:
-        log(f"[SKIP] 已存在 HLS：{m3u8}")
+        rep.emit('skipped', reason='hls_exists', file=str(src), m3u8=str(m3u8))
+        # 旧输出补测响度（只解码、不编码；失败不影响 HLS 本身）
+        if cfg.MUSIC_LOUDNESS and read_loudness(outdir) is None and shutil.which('ffmpeg'):
+            await measure_loudness(cfg, src, outdir, rep)
         return True
     if not shutil.which('ffmpeg'):
-        log('WARN: 未找到 ffmpeg 可执行文件（请安装并加入 PATH），跳过转码')
-        return False
-    a_args, note = decide_audio_args(cfg, src)
-    cmd = [
-        'ffmpeg', '-y', '-nostdin',
-        '-i', str(src),
-        *a_args,
-        '-vn',
-        '-hls_time', '6', '-hls_list_size', '0',
-        '-hls_flags', 'independent_segments',
-        '-hls_segment_filename', str(outdir / 'segment_%03d.ts'),
-        str(m3u8),
-        '-loglevel', cfg.FFMPEG_LOGLEVEL,
-    ]
-    log(f"[FFMPEG] 音频转码 → {m3u8}\n         源: {src}\n         策略: {note} (FORCE={cfg.FORCE_REENCODE})\n         命令: {' '.join(cmd)}")
-    try:
-        stream_logs = cfg.VERBOSE or cfg.FFMPEG_LOGLEVEL.lower() not in ('error', 'fatal', 'panic', 'quiet')
-        if stream_logs:
-            proc = await asyncio.create_subprocess_exec(*cmd)
-            try:
-                await asyncio.wait_for(proc.wait(), timeout=cfg.FFMPEG_TIMEOUT_SECONDS)
-            except asyncio.TimeoutError:
-                proc.kill()
-                log(f"WARN: ffmpeg 音频转码超时：{src.name}")
-                return False
-            rc = proc.returncode
-        else:
-            proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-            try:
-                out, err = await asyncio.wait_for(proc.communicate(), timeout=cfg.FFMPEG_TIMEOUT_SECONDS)
-            except asyncio.TimeoutError:
-                proc.kill()
-                log(f"WARN: ffmpeg 音频转码超时：{src.name}")
-                return False
-            rc = proc.returncode
-            if rc != 0:
-                log(f"WARN: ffmpeg 音频转码失败：{src.name}\n{(err or b'')[:800].decode(errors='ignore')}")
-        if rc != 0:
-            return False
-        log(f"[OK] 生成完成：{m3u8}")
-        return True
-    except Exception as e:
-        log(f"WARN: ffmpeg 音频异常：{src.name} -> {e}")
+        rep.emit('transcode_failed', reason='no_ffmpeg', file=str(src))
         return False
+    rungs = select_audio_rungs(cfg, probe, await ffmpeg_encoders())
+    if rungs:
+        a_args, note = [], f"abr({','.join(r.name for r in rungs)})"
+        for r in rungs:
+            (outdir / r.name).mkdir(exist_ok=True)
+    else:
+        a_args, note = decide_audio_args(cfg, probe)
+    if info is not None:
+        info['strategy'] = note
+    extra: List[str] = []
+    if cfg.MUSIC_LOUDNESS:
+        extra += loudness_outputs(cfg, outdir)
+    if cfg.MUSIC_LOUDNORM:
+        (outdir / NORMALIZED_DIR).mkdir(exist_ok=True)
+        extra += normalized_outputs(cfg, outdir)
+    if rungs:
+        # 主播放列表在所有档位写完后才生成，"已存在 HLS" 的判断因此只认完整的输出
+        cmd = ['ffmpeg', '-y', '-nostdin', '-i', str(src), *audio_ladder_outputs(cfg, outdir, rungs),
+               *extra, '-loglevel', cfg.FFMPEG_LOGLEVEL]
+    else:
+        cmd = [
+            'ffmpeg', '-y', '-nostdin',
+            '-i', str(src),
+            *a_args,
+            '-vn',
+            *(['-threads', str(cfg.FFMPEG_THREADS)] if cfg.FFMPEG_THREADS > 0 else []),
+            '-hls_time', '6', '-hls_list_size', '0',
+            '-hls_flags', 'independent_segments',
+            *segment_args(cfg.MUSIC_SEGMENT_TYPE, outdir),
+            str(m3u8),
+            *extra,
+            '-loglevel', cfg.FFMPEG_LOGLEVEL,
+        ]
+    rep.emit('transcode_started', file=str(src), m3u8=str(m3u8), strategy=note, force=cfg.FORCE_REENCODE,
+             cmd=' '.join(cmd), media='audio')
+    t0 = time.perf_counter()
+    ok = await run_ffmpeg(cfg, cmd, src, rep, duration=probe.duration if probe else None, progress=progress, label='音频')
+    if ok and rungs:
+        write_audio_master(outdir, rungs)
+    if ok and cfg.MUSIC_LOUDNESS:
+        _store_loudness(src, outdir, rep)
+    if ok:
+        rep.emit('transcode_finished', file=str(src), m3u8=str(m3u8), seconds=round(time.perf_counter() - t0, 3),
+                 bytes=dir_size(outdir))
+    return ok
 
 
-async def scan_and_convert_music(cfg: Config, log=print) -> Dict:
-    tracks: List[dict] = []
-    seen_safe: set[str] = set()
-    exts = {'.mp3', '.m4a', '.aac', '.wav', '.flac', '.ogg', '.opus'}
-
-    if cfg.MUSIC_UPLOAD_DIR.exists():
-        log(f"[SCAN] 扫描上传目录：{cfg.MUSIC_UPLOAD_DIR}（扩展名：{', '.join(sorted(exts))}）")
-        found = 0
-        for dirpath, dirnames, filenames in os.walk(cfg.MUSIC_UPLOAD_DIR):
-            for fn in filenames:
-                ext = Path(fn).suffix.lower()
-                if ext not in exts:
-                    continue
-                found += 1
-                full = Path(dirpath) / fn
-                safe = safe_name(fn)
-                outdir = cfg.MUSIC_HLS_DIR / safe
-                log(f"[FILE] 发现：{full} -> safe={safe}")
-                has_hls = await transcode_to_hls_audio(cfg, full, outdir, log)
-
-                name_no_ext = Path(fn).stem
-                artist, title = parse_artist_title(name_no_ext)
-                fmt = ext.lstrip('.')
-
-                meta = {'originalFile': fn, 'artist': artist, 'title': title, 'format': fmt}
-                write_meta(outdir, meta)
-
-                id_ = short_id(safe)
-                seen_safe.add(safe)
-                track = {
-                    'id': id_, 'artist': artist, 'title': title,
-                    'originalFile': f"{cfg.MUSIC_ORIG_PUBLIC_PREFIX}/{fn}",
-                    'hlsUrl': f"{cfg.MUSIC_HLS_PUBLIC_PREFIX}/{safe}/playlist.m3u8" if has_hls else None,
-                    'hasHLS': bool(has_hls), 'format': fmt,
-                }
-                tracks.append(track)
-        if found == 0:
-            log(f"[SCAN] 未在 {cfg.MUSIC_UPLOAD_DIR} 内发现可处理的文件。")
-    else:
-        log(f"[WARN] 上传目录不存在：{cfg.MUSIC_UPLOAD_DIR}")
+def _track(cfg: Config, safe: str, meta: dict, has_hls: bool, probe: Optional[ProbeInfo] = None,
+           renditions: Optional[List[str]] = None, packaging: Optional[str] = None, track_id: Optional[str] = None) -> dict:
+    original_file_name = meta.get('originalFile')
+    track = {
+        'id': track_id or short_id(safe), 'artist': meta.get('artist', '未知艺术家'), 'title': meta.get('title', safe),
+        'originalFile': f"{cfg.MUSIC_ORIG_PUBLIC_PREFIX}/{original_file_name}" if original_file_name else None,
+        'hlsUrl': f"{cfg.MUSIC_HLS_PUBLIC_PREFIX}/{safe}/playlist.m3u8" if has_hls else None,
+        'hasHLS': bool(has_hls), 'format': meta.get('format'),
+    }
+    if probe:
+        track['duration'] = round(probe.duration, 3) if probe.duration else None
+    if renditions:
+        track['renditions'] = renditions
+    if has_hls and packaging:
+        track['packaging'] = packaging
+    loud = meta.get('loudness')
+    if loud:
+        track['loudness'] = loud
+        track['replayGain'] = {'trackGain': round(REPLAYGAIN_REFERENCE_LUFS - loud['integrated'], 2),
+                               'trackPeak': loud.get('peak')}
+    if has_hls and meta.get('normalized'):
+        track['normalizedHlsUrl'] = f"{cfg.MUSIC_HLS_PUBLIC_PREFIX}/{safe}/{meta['normalized']}"
+    return track
 
-    # 补扫 HLS 目录
-    for entry in sorted(cfg.MUSIC_HLS_DIR.glob('*/')):
-        if not entry.is_dir():
-            continue
-        safe_dir = entry.name
-        if safe_dir in seen_safe:
-            continue
-        if not (entry / 'playlist.m3u8').exists():
-            continue
-        meta = {}
-        p = entry / 'meta.json'
-        if p.exists():
-            try:
-                meta = json.loads(p.read_text(encoding='utf-8'))
-            except Exception:
-                meta = {}
-        artist = meta.get('artist', '未知艺术家')
-        title = meta.get('title', safe_dir)
-        original_file_name = meta.get('originalFile')
-        fmt = meta.get('format')
-
-        id_ = short_id(safe_dir)
-        track = {
-            'id': id_, 'artist': artist, 'title': title,
-            'originalFile': f"{cfg.MUSIC_ORIG_PUBLIC_PREFIX}/{original_file_name}" if original_file_name else None,
-            'hlsUrl': f"{cfg.MUSIC_HLS_PUBLIC_PREFIX}/{safe_dir}/playlist.m3u8",
-            'hasHLS': True, 'format': fmt,
-        }
-        tracks.append(track)
-
-    # 写入播放列表
-    tracks.sort(key=lambda x: (x.get('title') or ''))
-    cfg.MUSIC_PLAYLIST_FILE.write_text(json.dumps(tracks, ensure_ascii=False, indent=2), encoding='utf-8')
-    log(f"[DONE] 写入 {len(tracks)} 条到 {cfg.MUSIC_PLAYLIST_FILE}")
-    return {'count': len(tracks), 'playlist': str(cfg.MUSIC_PLAYLIST_FILE)}
+
+def _analysis_meta(outdir: Path) -> dict:
+    meta = {}
+    loud = read_loudness(outdir)
+    if loud:
+        meta['loudness'] = loud
+    if (outdir / NORMALIZED_DIR / 'playlist.m3u8').exists():
+        meta['normalized'] = f'{NORMALIZED_DIR}/playlist.m3u8'
+    return meta
+
+
+def _library(cfg: Config) -> Library:
+    return Library(kind='music', upload_dir=cfg.MUSIC_UPLOAD_DIR, hls_dir=cfg.MUSIC_HLS_DIR,
+                   playlist_file=cfg.MUSIC_PLAYLIST_FILE, exts=MUSIC_EXTS, transcode=transcode_to_hls_audio,
+                   track=_track, extra_meta=_analysis_meta, renditions=list_audio_renditions)
+
+
+async def scan_and_convert_music(cfg: Config, log=print, transcode_jobs=run_transcode_jobs,
+                                 progress: Optional[ProgressCallback] = None) -> Dict:
+    return await scan_library(_library(cfg), cfg, log=log, transcode_jobs=transcode_jobs, progress=progress)
+
+
+async def update_music(cfg: Config, paths: Iterable[Path], log=print, transcode_jobs=run_transcode_jobs,
+                       progress: Optional[ProgressCallback] = None) -> Dict:
+    """Music-library version of :func:`backend.services.video.update_videos`."""
+    return await update_library(_library(cfg), cfg, paths, log=log, transcode_jobs=transcode_jobs, progress=progress)
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from ..catalog import Catalog
+from ..playlist_cache import invalidate_playlist, playlist_etag, read_version, version_path
+from ..search import index_tracks
+from .events import ScanReporter
+from .manifest import ScanManifest
+
+
+def atomic_write(path: Path, data: bytes):
+    """Replace ``path`` with ``data`` so readers see either the old or the new file, never a mix.
+
+    Writes a temp file in the same directory, fsyncs it, renames it over
+    ``path`` and fsyncs the directory so the rename survives a crash.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        raise
+    try:
+        dfd = os.open(path.parent, os.O_RDONLY)
+    except OSError:  # pragma: no cover - 个别平台不能打开目录
+        return
+    try:
+        os.fsync(dfd)
+    finally:
+        os.close(dfd)
+
+
+class PlaylistStore:
+    """playlist.json of one library, edited in memory and written atomically.
+
+    Tracks can be replaced wholesale (full scan) or upserted / deleted one
+    at a time (incremental updates) without rebuilding the list. On
+    :meth:`commit` the list is sorted by title, serialized as compact JSON
+    and written only if the content changed; each write bumps a version
+    number kept in ``<playlist>.version`` next to the file, which the
+    playlist cache and the API expose to readers. The same edits are applied
+    to the catalog's ``tracks`` table (with the output dir name when known).
+    """
+
+    def __init__(self, kind: str, path: Path, catalog: Catalog, tracks: Optional[List[dict]] = None, version: int = 0):
+        self.kind = kind
+        self.path = path
+        self.catalog = catalog
+        self.tracks = tracks
+        self.version = version
+        self._pos: Optional[Dict[str, int]] = None
+        self._safes: Dict[str, Optional[str]] = {}  # id -> safe，本次新增或替换的曲目
+        self._deleted: set[str] = set()
+        self._replaced = False
+        self._search: Optional[tuple] = None  # commit 后待写入搜索索引的 (tracks, etag)
+
+    @classmethod
+    def load(cls, kind: str, path: Path, catalog: Catalog) -> "PlaylistStore":
+        """Current contents; ``tracks`` is None if the file is missing or unreadable."""
+        try:
+            data = json.loads(path.read_bytes())
+        except (OSError, ValueError):
+            data = None
+        return cls(kind, path, catalog, data if isinstance(data, list) else None, read_version(path)[0])
+
+    @classmethod
+    def from_tracks(cls, kind: str, path: Path, catalog: Catalog, tracks: List[dict],
+                    safes: Optional[Dict[str, str]] = None) -> "PlaylistStore":
+        """Store for a freshly built list (full scan); only the version is read from disk."""
+        store = cls(kind, path, catalog, None, read_version(path)[0])
+        store.replace(tracks, safes)
+        return store
+
+    def _index(self) -> Dict[str, int]:
+        if self._pos is None:
+            self._pos = {t.get('id'): i for i, t in enumerate(self.tracks or [])}
+        return self._pos
+
+    def replace(self, tracks: List[dict], safes: Optional[Dict[str, str]] = None):
+        self.tracks = tracks
+        self._pos = None
+        self._safes = dict(safes or {})
+        self._deleted.clear()
+        self._replaced = True
+
+    def upsert(self, track: dict, safe: Optional[str] = None):
+        if self.tracks is None:
+            self.tracks = []
+        self._safes[track['id']] = safe
+        self._deleted.discard(track['id'])
+        pos = self._index()
+        i = pos.get(track['id'])
+        if i is None:
+            pos[track['id']] = len(self.tracks)
+            self.tracks.append(track)
+        else:
+            self.tracks[i] = track
+
+    def delete(self, track_ids: Iterable[str]) -> int:
+        drop = set(track_ids) & self._index().keys()
+        if drop:
+            self.tracks = [t for t in self.tracks if t.get('id') not in drop]
+            self._pos = None
+            self._deleted |= drop
+            for i in drop:
+                self._safes.pop(i, None)
+        return len(drop)
+
+    def _sync_catalog(self, tracks: List[dict]):
+        if self._replaced:
+            self.catalog.replace_tracks(self.kind, [(self._safes.get(t['id']), t) for t in tracks])
+        else:
+            self.catalog.put_tracks(self.kind, [(self._safes[t['id']], t) for t in tracks if t['id'] in self._safes])
+            self.catalog.delete_tracks(self.kind, self._deleted)
+        self._safes.clear()
+        self._deleted.clear()
+        self._replaced = False
+
+    def commit(self, manifest: ScanManifest, log) -> bool:
+        """Write the playlist if it changed; returns True if a new version was written."""
+        rep = ScanReporter.wrap(log)
+        tracks = self.tracks or []
+        tracks.sort(key=lambda x: (x.get('title') or ''))
+        self._pos = None
+        body = json.dumps(tracks, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.md5(body).hexdigest()
+        if digest == manifest.playlist and self.path.exists():
+            rep.emit('playlist_written', path=str(self.path), count=len(tracks), changed=False)
+            return False
+        etag = playlist_etag(body)
+        self.version += 1
+        # 先写版本文件：读者只在其 etag 与播放列表内容一致时才采用该版本号
+        atomic_write(version_path(self.path), json.dumps({'version': self.version, 'etag': etag}).encode('utf-8'))
+        atomic_write(self.path, body)
+        self._sync_catalog(tracks)
+        invalidate_playlist(self.path)
+        self._search = (tracks, etag)
+        manifest.playlist = digest
+        manifest.dirty = True
+        rep.emit('playlist_written', path=str(self.path), count=len(tracks), changed=True,
+                 version=self.version, bytes=len(body))
+        return True
+
+    async def refresh_search(self):
+        """Bring the search index up to date with the last written version (off the event loop)."""
+        if self._search is not None:
+            tracks, etag = self._search
+            self._search = None
+            await index_tracks(self.kind, tracks, etag)
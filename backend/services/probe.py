@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass, asdict, fields
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from .. import metrics
+from ..catalog import Catalog, catalog_for
+from ..config import Config
+from .events import ScanReporter
+
+
+PROBE_TIMEOUT_SECONDS = 30
+
+
+def _int(v) -> Optional[int]:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(v) -> Optional[float]:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class ProbeInfo:
+    """What one ``ffprobe -show_streams -show_format`` run tells us about a file."""
+    vcodec: Optional[str] = None
+    acodec: Optional[str] = None
+    duration: Optional[float] = None  # seconds
+    bitrate: Optional[int] = None  # bits/s, whole container
+    width: Optional[int] = None
+    height: Optional[int] = None
+    pix_fmt: Optional[str] = None
+    channels: Optional[int] = None
+    sample_rate: Optional[int] = None
+
+    @property
+    def resolution(self) -> Optional[str]:
+        if self.width and self.height:
+            return f"{self.width}x{self.height}"
+        return None
+
+    @classmethod
+    def from_ffprobe(cls, data: dict) -> "ProbeInfo":
+        streams = data.get('streams') or []
+        fmt = data.get('format') or {}
+        # 封面图（如 mp3 内嵌专辑图）也是 video 流，跳过
+        v = next((s for s in streams if s.get('codec_type') == 'video'
+                  and not (s.get('disposition') or {}).get('attached_pic')), None) or {}
+        a = next((s for s in streams if s.get('codec_type') == 'audio'), None) or {}
+        duration = _float(fmt.get('duration')) or _float(v.get('duration')) or _float(a.get('duration'))
+        return cls(
+            vcodec=v.get('codec_name'), acodec=a.get('codec_name'),
+            duration=duration, bitrate=_int(fmt.get('bit_rate')),
+            width=_int(v.get('width')), height=_int(v.get('height')), pix_fmt=v.get('pix_fmt'),
+            channels=_int(a.get('channels')), sample_rate=_int(a.get('sample_rate')),
+        )
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "ProbeInfo":
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in d.items() if k in names})
+
+
+class ProbeCache:
+    """Probe results keyed by file identity (path + size + mtime_ns), stored in the catalog.
+
+    Lookups go to the catalog once per path and are then served from memory;
+    new results are buffered until :meth:`save`.
+    """
+
+    def __init__(self, catalog: Catalog):
+        self.catalog = catalog
+        self.entries: Dict[str, dict] = {}
+        self._pending: set[str] = set()
+
+    def get(self, src: Path, st: os.stat_result) -> Optional[ProbeInfo]:
+        key = str(src)
+        e = self.entries.get(key)
+        if e is None or e.get('size') != st.st_size or e.get('mtime') != st.st_mtime_ns:
+            data = self.catalog.probe(key, st.st_size, st.st_mtime_ns)
+            if data is None:
+                return None
+            e = self.entries[key] = {'size': st.st_size, 'mtime': st.st_mtime_ns, 'probe': data}
+        return ProbeInfo.from_dict(e.get('probe') or {})
+
+    def put(self, src: Path, st: os.stat_result, info: ProbeInfo):
+        self.entries[str(src)] = {'size': st.st_size, 'mtime': st.st_mtime_ns, 'probe': asdict(info)}
+        self._pending.add(str(src))
+
+    def prune(self, root: Path, keep: Iterable[Path]):
+        """Drop entries under ``root`` whose file was not seen by the last scan."""
+        keep_s = {str(p) for p in keep}
+        stale = [k for k in self.catalog.probe_paths(root) if k not in keep_s]
+        for k in stale:
+            self.entries.pop(k, None)
+            self._pending.discard(k)
+        self.catalog.delete_probes(stale)
+
+    def save(self):
+        if not self._pending:
+            return
+        self.catalog.put_probes({k: self.entries[k] for k in self._pending if k in self.entries})
+        self._pending.clear()
+
+
+_caches: Dict[Path, ProbeCache] = {}
+
+
+def probe_cache(cfg: Config) -> ProbeCache:
+    """Process-wide cache instance for ``cfg.CATALOG_DB_FILE``."""
+    c = _caches.get(cfg.CATALOG_DB_FILE)
+    if c is None:
+        c = _caches[cfg.CATALOG_DB_FILE] = ProbeCache(catalog_for(cfg))
+    return c
+
+
+async def run_ffprobe(src: Path) -> Optional[dict]:
+    if not shutil.which('ffprobe'):
+        return None
+    t0 = time.perf_counter()
+    result = 'error'
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            'ffprobe', '-v', 'error', '-show_streams', '-show_format', '-of', 'json', str(src),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            out, _ = await asyncio.wait_for(proc.communicate(), timeout=PROBE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            # 杀掉后回收，避免留下僵尸进程和未关闭的管道
+            proc.kill()
+            await proc.wait()
+            result = 'timeout'
+            return None
+        except asyncio.CancelledError:
+            if proc.returncode is None:
+                proc.kill()
+            raise
+        if proc.returncode != 0:
+            result = 'failed'
+            return None
+        data = json.loads(out.decode(errors='ignore') or '{}')
+        result = 'ok'
+        return data
+    except Exception:
+        return None
+    finally:
+        metrics.FFPROBE_SECONDS.observe(time.perf_counter() - t0, result)
+
+
+async def probe_media(cfg: Config, src: Path) -> Optional[ProbeInfo]:
+    """Probe ``src`` once per file identity; later calls are served from the cache."""
+    try:
+        st = src.stat()
+    except FileNotFoundError:
+        return None
+    cache = probe_cache(cfg)
+    info = cache.get(src, st)
+    metrics.PROBE_CACHE.inc('miss' if info is None else 'hit')
+    if info is not None:
+        return info
+    data = await run_ffprobe(src)
+    if data is None:
+        return None
+    info = ProbeInfo.from_ffprobe(data)
+    cache.put(src, st, info)
+    return info
+
+
+async def probe_all(cfg: Config, paths: Iterable[Path], log=None):
+    """Probe ``paths`` with at most ``TRANSCODE_CONCURRENCY`` ffprobe processes at once.
+
+    With ``log`` given, each file is reported as a ``probed`` event.
+    """
+    it = iter(paths)
+    rep = ScanReporter.wrap(log) if log is not None else None
+
+    async def worker():
+        for src in it:
+            t0 = time.perf_counter()
+            info = await probe_media(cfg, src)
+            if rep is not None:
+                rep.emit('probed', file=str(src), duration=info.duration if info else None,
+                         seconds=round(time.perf_counter() - t0, 4))
+
+    await asyncio.gather(*(worker() for _ in range(max(1, cfg.TRANSCODE_CONCURRENCY))))
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .. import metrics
+from ..config import Config
+from .events import ScanReporter
+
+
+# transcode(cfg, src, outdir, log, info, progress=None) -> ok
+Transcoder = Callable[..., Awaitable[bool]]
+
+# 正在转码的输出目录 -> 结果；扫描内的并发池与后台任务队列共用，
+# 保证同一 HLS 目录任何时刻只有一个 ffmpeg 在写
+_inflight: Dict[Path, asyncio.Future] = {}
+
+
+def is_transcoding(outdir: Path) -> bool:
+    return outdir in _inflight
+
+
+async def transcode_once(cfg: Config, src: Path, outdir: Path, transcode: Transcoder, log, info: dict,
+                         progress: Optional[Callable[[dict], None]] = None) -> bool:
+    """Run ``transcode`` unless another task is already writing ``outdir``; then wait for its result."""
+    fut = _inflight.get(outdir)
+    if fut is not None:
+        log(f"[WAIT] 该输出目录正在转码，等待完成：{outdir}")
+        with metrics.TRANSCODE_WAIT_SECONDS.time():
+            return await asyncio.shield(fut)
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[outdir] = fut
+    ok = False
+    try:
+        ok = await transcode(cfg, src, outdir, log, info, progress=progress)
+        return ok
+    finally:
+        fut.set_result(bool(ok))
+        _inflight.pop(outdir, None)
+
+
+async def run_transcode_jobs(cfg: Config, jobs: List[Tuple[Path, Path]], transcode: Transcoder, log,
+                             progress: Optional[Callable[[dict], None]] = None) -> Dict[Path, dict]:
+    """Run ``transcode(cfg, src, outdir, log, info)`` for every (src, outdir) pair.
+
+    At most ``cfg.TRANSCODE_CONCURRENCY`` jobs run at once. Jobs sharing an
+    output directory are transcoded only once (the first one discovered wins),
+    so two ffmpeg processes never write into the same HLS folder.
+    Returns a mapping outdir -> info, where info holds ``hasHLS`` plus whatever
+    the transcoder recorded (e.g. the codec ``strategy``).
+    ``progress`` receives ffmpeg progress snapshots tagged with ``job``
+    (``"i/n"``) and ``file``; a listening reporter passed as ``log`` gets them
+    as ``transcode_progress`` events as well.
+    """
+    rep = ScanReporter.wrap(log)
+    unique: Dict[Path, Path] = {}
+    for src, outdir in jobs:
+        unique.setdefault(outdir, src)
+    pending = list(unique.items())
+    total = len(pending)
+    results: Dict[Path, dict] = {}
+    if total == 0:
+        return results
+
+    limit = max(1, min(cfg.TRANSCODE_CONCURRENCY, total))
+    threads = f"，每任务线程 {cfg.FFMPEG_THREADS}" if cfg.FFMPEG_THREADS > 0 else ''
+    rep(f"[POOL] 共 {total} 个转码任务，并发上限 {limit}{threads}")
+
+    queue = iter(enumerate(pending, 1))
+
+    async def worker():
+        for idx, (outdir, src) in queue:
+            job = f"{idx}/{total}"
+            job_rep = rep.child(job=job)
+
+            def job_progress(p: dict, job=job, job_rep=job_rep, file=src.name):
+                if progress:
+                    progress({'job': job, 'file': file, **p})
+                if job_rep.listening:
+                    job_rep.emit('transcode_progress', file=file, **p)
+
+            info: dict = {}
+            try:
+                ok = await transcode_once(cfg, src, outdir, transcode, job_rep, info,
+                                          job_progress if progress or rep.listening else None)
+            except Exception as e:
+                job_rep.emit('transcode_failed', reason='exception', file=str(src), error=str(e))
+                ok = False
+            info['hasHLS'] = bool(ok)
+            results[outdir] = info
+
+    await asyncio.gather(*(worker() for _ in range(limit)))
+    return results
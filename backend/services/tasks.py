@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import importlib
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional
+
+from .. import metrics
+from ..config import MUSIC_EXTS, VIDEO_EXTS, Config
+from ..jobs import Job, JobQueue
+from ..watcher import UploadWatcher
+from .events import ScanReporter
+from .hub import ScanHub
+
+
+# 各库的服务入口（模块.函数），首次用到时才导入：启动时不加载 video/music 及其依赖
+ENTRY_POINTS = {
+    'video': {'scan': 'video.scan_and_convert_videos', 'update': 'video.update_videos',
+              'transcode': 'video.transcode_to_hls'},
+    'music': {'scan': 'music.scan_and_convert_music', 'update': 'music.update_music',
+              'transcode': 'music.transcode_to_hls_audio'},
+}
+
+
+def entry_point(kind: str, role: str):
+    """The ``role`` (scan/update/transcode) of the ``kind`` library service, imported on first use."""
+    module, _, name = ENTRY_POINTS[kind][role].partition('.')
+    return getattr(importlib.import_module(f'.{module}', __package__), name)
+
+# 优先级：扫描（发现文件）> 转码 > 播放列表刷新（等转码基本跑完再刷新）
+PRIORITY_SCAN = 10
+PRIORITY_TRANSCODE = 0
+PRIORITY_PLAYLIST = -10
+
+
+def register_handlers(queue: JobQueue, cfg: Config, locks: Dict[str, asyncio.Lock], logger,
+                      hub: Optional[ScanHub] = None):
+    """Wire the scan / transcode / playlist job types to the media services.
+
+    - ``scan``: walk the upload dir and enqueue one ``transcode`` job per new or
+      changed file instead of transcoding inline, then write the playlist.
+      With ``src`` set (from the upload watcher) only that file is looked at
+      and its playlist entry updated in place.
+    - ``transcode``: run ffmpeg for a single file; once it is done (or has
+      failed for good, not while waiting for a retry) a ``playlist`` job for
+      that file is (re-)queued.
+    - ``playlist``: re-run the scan without transcoding so finished outputs
+      show up in playlist.json (cheap thanks to the scan manifest); with
+      ``src`` set, only that file's entry is refreshed.
+
+    With ``hub`` set, scan and playlist jobs are published to it as the
+    library's current run, so WebSocket clients can follow them.
+    """
+
+    def make_log(lines: list, tag: str):
+        def log(line: str):
+            lines.append(line)
+            logger.info("%s %s", tag, line)
+        return log
+
+    def enqueue_transcodes(kind: str):
+        async def transcode_jobs(cfg: Config, jobs, transcode, log, progress=None):
+            pending = queue.pending_outdirs(kind)
+            results: Dict[Path, dict] = {}
+            for src, outdir in jobs:
+                if outdir in results:
+                    continue
+                ready = (outdir / 'playlist.m3u8').exists() and str(outdir) not in pending
+                if ready and not cfg.FORCE_REENCODE:
+                    results[outdir] = {'hasHLS': True}
+                    continue
+                jid = queue.enqueue(kind, 'transcode', src=str(src), outdir=str(outdir), priority=PRIORITY_TRANSCODE)
+                ScanReporter.wrap(log).emit('transcode_queued', file=str(src), jobId=jid, outdir=str(outdir))
+                results[outdir] = {'hasHLS': False, 'job': jid}
+            return results
+        return transcode_jobs
+
+    def collect_outputs(kind: str):
+        async def transcode_jobs(cfg: Config, jobs, transcode, log, progress=None):
+            from .scheduler import is_transcoding
+            pending = queue.pending_outdirs(kind)
+            return {
+                outdir: {'hasHLS': (outdir / 'playlist.m3u8').exists() and str(outdir) not in pending and not is_transcoding(outdir)}
+                for _, outdir in jobs
+            }
+        return transcode_jobs
+
+    async def run_scan(job: Job) -> dict:
+        lines: list[str] = []
+        mode = enqueue_transcodes(job.kind) if job.type == 'scan' else collect_outputs(job.kind)
+        counts: Counter = Counter()
+        log = make_log(lines, f"[JOB #{job.id}]")
+
+        def count(ev):
+            counts.update((ev.type,))
+
+        async def scan(rep: ScanReporter) -> dict:
+            if job.src:
+                return await entry_point(job.kind, 'update')(cfg, [Path(job.src)], log=rep, transcode_jobs=mode)
+            return await entry_point(job.kind, 'scan')(cfg, log=rep, transcode_jobs=mode)
+
+        t0 = time.perf_counter()
+        async with locks[job.kind]:
+            metrics.SCAN_LOCK_WAIT_SECONDS.observe(time.perf_counter() - t0, job.kind)
+            if hub is not None:
+                result = await hub.run(job.kind, scan, log=log, on_event=count)
+            else:
+                result = await scan(ScanReporter(log, on_event=count))
+        return {'ok': True, **result, 'events': dict(counts), 'logs': lines[-200:]}
+
+    async def run_transcode(job: Job) -> dict:
+        from .probe import probe_cache
+        from .scheduler import transcode_once
+        lines: list[str] = []
+        info: dict = {}
+        src, outdir = Path(job.src), Path(job.outdir)
+        if not src.exists():
+            return {'ok': True, 'skipped': 'source removed'}
+        ok = await transcode_once(cfg, src, outdir, entry_point(job.kind, 'transcode'), make_log(lines, f"[JOB #{job.id}]"), info,
+                                  progress=lambda p: queue.set_progress(job.id, p))
+        probe_cache(cfg).save()
+        return {'ok': ok, **info, 'error': None if ok else 'ffmpeg failed', 'logs': lines[-50:]}
+
+    def refresh_playlist(job: Job):
+        queue.enqueue(job.kind, 'playlist', src=job.src, priority=PRIORITY_PLAYLIST)
+
+    queue.register('scan', run_scan)
+    queue.register('playlist', run_scan)
+    queue.register('transcode', run_transcode, after=refresh_playlist)
+
+
+def make_upload_watcher(queue: JobQueue, cfg: Config, logger) -> UploadWatcher:
+    """Upload watcher that feeds settled files into the job queue as single-file scans."""
+
+    def on_files(kind: str, paths):
+        for p in paths:
+            queue.enqueue(kind, 'scan', src=str(p), priority=PRIORITY_SCAN)
+
+    def on_rescan(kind: str):
+        queue.enqueue(kind, 'scan', priority=PRIORITY_SCAN)
+
+    roots = {'video': (cfg.VIDEO_UPLOAD_DIR, VIDEO_EXTS), 'music': (cfg.MUSIC_UPLOAD_DIR, MUSIC_EXTS)}
+    return UploadWatcher(roots, on_files, on_rescan, interval=cfg.WATCH_INTERVAL_SECONDS,
+                         settle=cfg.WATCH_SETTLE_SECONDS, logger=logger)
@@ -1,181 +1,321 @@
 from __future__ import annotations
 
-import asyncio
-import json
+import math
+import time
 import shutil
-import subprocess
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 import os
 
-from ..config import Config
-from ..utils import safe_name, short_id, parse_artist_title
+from ..config import VIDEO_EXTS, Config
+from ..utils import dir_size, short_id
+from .events import ScanReporter
+from .ffmpeg import ProgressCallback, ffmpeg_encoders, run_ffmpeg, segment_args
+from .library import Library, scan_library, update_library
+from .playlist import atomic_write
+from .probe import ProbeInfo, probe_media
+from .scheduler import run_transcode_jobs
 
 
-def probe_codecs(src: Path) -> Tuple[str | None, str | None]:
-    if not shutil.which('ffprobe'):
-        return None, None
-    try:
-        v = subprocess.run([
-            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-            '-show_entries', 'stream=codec_name', '-of', 'default=nw=1:nk=1', str(src)
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=30)
-        vcodec = v.stdout.decode().strip() if v.returncode == 0 else None
-        a = subprocess.run([
-            'ffprobe', '-v', 'error', '-select_streams', 'a:0',
-            '-show_entries', 'stream=codec_name', '-of', 'default=nw=1:nk=1', str(src)
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=30)
-        acodec = a.stdout.decode().strip() if a.returncode == 0 else None
-        return vcodec, acodec
-    except Exception:
-        return None, None
-
-
-def decide_codecs(cfg: Config, src: Path) -> Tuple[list[str], list[str], str]:
+def x264_args(cfg: Config) -> list[str]:
+    return ['-c:v', 'libx264', '-preset', cfg.VIDEO_X264_PRESET, '-crf', str(cfg.VIDEO_CRF)]
+
+
+def decide_codecs(cfg: Config, probe: Optional[ProbeInfo]) -> Tuple[list[str], list[str], str]:
     s = cfg.STRATEGY
-    vcodec, acodec = probe_codecs(src) if s in ('auto',) else (None, None)
+    vcodec, acodec = (probe.vcodec, probe.acodec) if probe and s == 'auto' else (None, None)
     if s == 'copy':
         return (['-c:v', 'copy'], ['-c:a', 'copy'], 'copy(force)')
     if s == 'transcode':
-        return (['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23'], ['-c:a', 'aac', '-b:a', '128k'], 'transcode(force)')
+        return (x264_args(cfg), ['-c:a', 'aac', '-b:a', '128k'], 'transcode(force)')
     if vcodec == 'h264' and acodec == 'aac':
         return (['-c:v', 'copy'], ['-c:a', 'copy'], 'copy(h264+aac)')
     if vcodec == 'h264' and acodec and acodec != 'aac':
         return (['-c:v', 'copy'], ['-c:a', 'aac', '-b:a', '128k'], f'vcopy+atrans({acodec}->aac)')
-    return (['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23'], ['-c:a', 'aac', '-b:a', '128k'], 'transcode(fallback)')
+    return (x264_args(cfg), ['-c:a', 'aac', '-b:a', '128k'], 'transcode(fallback)')
 
 
-def write_meta(outdir: Path, meta: dict):
-    outdir.mkdir(parents=True, exist_ok=True)
-    with (outdir / 'meta.json').open('w', encoding='utf-8') as f:
-        json.dump(meta, f, ensure_ascii=False, indent=2)
+def select_renditions(cfg: Config, probe: Optional[ProbeInfo]) -> List[Tuple[int, int]]:
+    """Ladder rungs (height, maxrate kbps) that fit the source; empty = single rendition.
 
+    The source "level" is its short side, or the 16:9 equivalent of its long
+    side for letterboxed sources (1920x800 still counts as 1080p), so rungs
+    above the source are skipped instead of upscaled.
+    """
+    if not cfg.VIDEO_ABR or cfg.STRATEGY == 'copy' or not probe or not probe.width or not probe.height:
+        return []
+    short, long_ = sorted((probe.width, probe.height))
+    level = max(short, long_ * 9 // 16)
+    return [(h, rate) for h, rate in cfg.VIDEO_LADDER if h <= level]
 
-async def transcode_to_hls(cfg: Config, src: Path, outdir: Path, log) -> bool:
-    outdir.mkdir(parents=True, exist_ok=True)
+
+def ladder_cmd(cfg: Config, src: Path, outdir: Path, probe: ProbeInfo, rungs: List[Tuple[int, int]],
+               extra: Sequence[str] = ()) -> list[str]:
+    """One ffmpeg run: decode once, split/scale per rung, write ``<h>p/`` variants plus a master playlist.
+
+    The master playlist is ``playlist.m3u8`` in ``outdir`` so existing
+    ``hlsUrl`` values and "already transcoded" checks keep working.
+    """
+    n = len(rungs)
+    portrait = probe.height > probe.width
+    scales = []
+    for i, (h, _) in enumerate(rungs):
+        box_w, box_h = (h * 16 // 9 + 1) // 2 * 2, h
+        if portrait:
+            box_w, box_h = box_h, box_w
+        scales.append(f"[s{i}]scale=w={box_w}:h={box_h}:force_original_aspect_ratio=decrease:force_divisible_by=2[v{i}]")
+    split = f"[0:v:0]split={n}" + ''.join(f"[s{i}]" for i in range(n))
+    has_audio = bool(probe.acodec)
+
+    cmd = ['ffmpeg', '-y', '-nostdin', '-i', str(src), '-filter_complex', ';'.join([split, *scales])]
+    for i in range(n):
+        cmd += ['-map', f'[v{i}]']
+        if has_audio:
+            cmd += ['-map', '0:a:0']
+    # 各档关键帧对齐到分片边界，hls.js 才能无缝切换
+    cmd += [*x264_args(cfg), '-pix_fmt', 'yuv420p', '-sc_threshold', '0', '-force_key_frames', 'expr:gte(t,n_forced*6)']
+    for i, (_, rate) in enumerate(rungs):
+        cmd += [f'-maxrate:v:{i}', f'{rate}k', f'-bufsize:v:{i}', f'{rate * 2}k']
+    if has_audio:
+        cmd += ['-c:a', 'copy'] if probe.acodec == 'aac' and cfg.STRATEGY == 'auto' else ['-c:a', 'aac', '-b:a', '128k']
+    stream_map = [f"v:{i}" + (f",a:{i}" if has_audio else '') + f",name:{h}p" for i, (h, _) in enumerate(rungs)]
+    cmd += [
+        *(['-threads', str(cfg.FFMPEG_THREADS)] if cfg.FFMPEG_THREADS > 0 else []),
+        '-f', 'hls', '-hls_time', '6', '-hls_list_size', '0',
+        '-hls_flags', 'independent_segments',
+        '-master_pl_name', 'playlist.m3u8',
+        *segment_args(cfg.VIDEO_SEGMENT_TYPE, outdir / '%v'),
+        '-var_stream_map', ' '.join(stream_map),
+        str(outdir / '%v' / 'playlist.m3u8'),
+        *extra,
+        '-loglevel', cfg.FFMPEG_LOGLEVEL,
+    ]
+    return cmd
+
+
+def single_cmd(cfg: Config, src: Path, outdir: Path, v_args: list[str], a_args: list[str],
+               extra: Sequence[str] = ()) -> list[str]:
     m3u8 = outdir / 'playlist.m3u8'
-    if m3u8.exists() and not cfg.FORCE_REENCODE:
-        log(f"[SKIP] 已存在 HLS：{m3u8}")
-        return True
-    if not shutil.which('ffmpeg'):
-        log('WARN: 未找到 ffmpeg 可执行文件（请安装并加入 PATH），跳过转码')
-        return False
-    v_args, a_args, note = decide_codecs(cfg, src)
-    cmd = [
+    return [
         'ffmpeg', '-y', '-nostdin',
+        # 视频流复制时只为缩略图解码关键帧（复制本身不受解码选项影响）
+        *(KEYFRAMES_ONLY if extra and v_args[:2] == ['-c:v', 'copy'] else []),
         '-i', str(src),
         *v_args, *a_args,
+        *(['-threads', str(cfg.FFMPEG_THREADS)] if cfg.FFMPEG_THREADS > 0 else []),
         '-hls_time', '6', '-hls_list_size', '0',
         '-hls_flags', 'independent_segments',
-        '-hls_segment_filename', str(outdir / 'segment_%03d.ts'),
+        *segment_args(cfg.VIDEO_SEGMENT_TYPE, outdir),
         str(m3u8),
+        *extra,
         '-loglevel', cfg.FFMPEG_LOGLEVEL,
     ]
-    log(f"[FFMPEG] 开始转码 → {m3u8}\n         源: {src}\n         策略: {note} (FORCE={cfg.FORCE_REENCODE})\n         命令: {' '.join(cmd)}")
+
+
+def list_renditions(outdir: Path) -> List[str]:
+    """Names of the ABR variants (``1080p`` ...) found under ``outdir``, highest first."""
     try:
-        stream_logs = cfg.VERBOSE or cfg.FFMPEG_LOGLEVEL.lower() not in ('error', 'fatal', 'panic', 'quiet')
-        if stream_logs:
-            proc = await asyncio.create_subprocess_exec(*cmd)
-            try:
-                await asyncio.wait_for(proc.wait(), timeout=cfg.FFMPEG_TIMEOUT_SECONDS)
-            except asyncio.TimeoutError:
-                proc.kill()
-                log(f"WARN: ffmpeg 转码超时：{src.name}")
-                return False
-            rc = proc.returncode
-        else:
-            proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-            try:
-                out, err = await asyncio.wait_for(proc.communicate(), timeout=cfg.FFMPEG_TIMEOUT_SECONDS)
-            except asyncio.TimeoutError:
-                proc.kill()
-                log(f"WARN: ffmpeg 转码超时：{src.name}")
-                return False
-            rc = proc.returncode
-            if rc != 0:
-                log(f"WARN: ffmpeg 转码失败：{src.name}\n{(err or b'')[:1000].decode(errors='ignore')}")
-        if rc != 0:
-            return False
-        log(f"[OK] 生成完成：{m3u8}")
-        return True
-    except Exception as e:
-        log(f"WARN: ffmpeg 异常：{src.name} -> {e}")
+        names = [e.name for e in os.scandir(outdir) if e.is_dir() and e.name[:-1].isdigit() and e.name.endswith('p')]
+    except FileNotFoundError:
+        return []
+    names = [n for n in names if (outdir / n / 'playlist.m3u8').exists()]
+    return sorted(names, key=lambda n: int(n[:-1]), reverse=True)
+
+
+# ---- 封面 / 拖动预览雪碧图 ----
+# 与转码同一条 ffmpeg 命令输出（共用一次解码）；已有 HLS 的补生成只解码关键帧
+THUMBS_VTT = 'thumbnails.vtt'
+SPRITE_COLUMNS = 10
+KEYFRAMES_ONLY = ['-skip_frame:v', 'nokey']
+
+
+@dataclass
+class ThumbPlan:
+    ext: str  # webp | jpg
+    poster_at: float
+    tile_w: int
+    tile_h: int
+    interval: float = 0.0
+    tiles: int = 0  # 0 = 时长未知，只出封面
+
+    @property
+    def poster(self) -> str:
+        return f'poster.{self.ext}'
+
+    @property
+    def sprite(self) -> str:
+        return f'sprite.{self.ext}'
+
+
+def _even(v: float) -> int:
+    return max(2, int(round(v / 2)) * 2)
+
+
+def thumb_plan(cfg: Config, probe: Optional[ProbeInfo], encoders: frozenset = frozenset()) -> Optional[ThumbPlan]:
+    """Poster position and sprite layout for a source, or None when thumbnails are off or there is no video.
+
+    ``encoders`` is :func:`ffmpeg_encoders`; WebP is used when libwebp is among them, JPEG otherwise.
+    """
+    if not cfg.VIDEO_THUMBNAILS or not probe or not probe.width or not probe.height:
+        return None
+    duration = probe.duration or 0.0
+    plan = ThumbPlan(
+        ext='webp' if 'libwebp' in encoders else 'jpg',
+        # 封面取 10% 处（最多 30 秒），避开片头黑场
+        poster_at=round(min(duration * 0.1, 30.0), 3),
+        tile_w=_even(cfg.VIDEO_SPRITE_WIDTH),
+        tile_h=_even(cfg.VIDEO_SPRITE_WIDTH * probe.height / probe.width),
+    )
+    if duration > 0:
+        plan.interval = round(max(cfg.VIDEO_SPRITE_INTERVAL, duration / cfg.VIDEO_SPRITE_MAX_TILES), 3)
+        plan.tiles = max(1, math.ceil(duration / plan.interval))
+    return plan
+
+
+def _image_args(plan: ThumbPlan) -> list[str]:
+    if plan.ext == 'webp':
+        return ['-c:v', 'libwebp', '-quality', '75', '-f', 'webp']
+    return ['-c:v', 'mjpeg', '-q:v', '4', '-f', 'image2', '-update', '1']
+
+
+def thumb_outputs(cfg: Config, outdir: Path, plan: ThumbPlan) -> list[str]:
+    """Extra ffmpeg outputs (poster, sprite sheet) fed from the same decoded video stream."""
+    common = ['-map', '0:v:0', '-an', '-sn', '-dn', '-frames:v', '1']
+    args = [*common, '-vf', f'trim=start={plan.poster_at},scale={_even(cfg.VIDEO_POSTER_WIDTH)}:-2',
+            *_image_args(plan), str(outdir / plan.poster)]
+    if plan.tiles:
+        rows = math.ceil(plan.tiles / SPRITE_COLUMNS)
+        cols = min(plan.tiles, SPRITE_COLUMNS)
+        w, h = plan.tile_w, plan.tile_h
+        vf = (f'fps=1/{plan.interval},scale={w}:{h}:force_original_aspect_ratio=decrease,'
+              f'pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,tile={cols}x{rows}')
+        args += [*common, '-vf', vf, *_image_args(plan), str(outdir / plan.sprite)]
+    return args
+
+
+def _vtt_time(t: float) -> str:
+    ms = int(round(t * 1000))
+    return f'{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}.{ms % 1000:03d}'
+
+
+def write_thumb_vtt(outdir: Path, plan: ThumbPlan, duration: float):
+    """WebVTT cues mapping each sprite tile (``#xywh=``) to its time range."""
+    lines = ['WEBVTT', '']
+    for i in range(plan.tiles):
+        start, end = i * plan.interval, min((i + 1) * plan.interval, duration)
+        x, y = i % SPRITE_COLUMNS * plan.tile_w, i // SPRITE_COLUMNS * plan.tile_h
+        lines += [f'{_vtt_time(start)} --> {_vtt_time(end)}',
+                  f'{plan.sprite}#xywh={x},{y},{plan.tile_w},{plan.tile_h}', '']
+    atomic_write(outdir / THUMBS_VTT, '\n'.join(lines).encode('utf-8'))
+
+
+def find_thumbnails(outdir: Path) -> dict:
+    """Poster / sprite VTT file names present in an HLS output dir (for the playlist entry)."""
+    found = {}
+    for ext in ('webp', 'jpg'):
+        if (outdir / f'poster.{ext}').is_file():
+            found['poster'] = f'poster.{ext}'
+            break
+    if (outdir / THUMBS_VTT).is_file():
+        found['thumbnails'] = THUMBS_VTT
+    return found
+
+
+def _finish_thumbs(outdir: Path, plan: ThumbPlan, probe: ProbeInfo):
+    if plan.tiles and (outdir / plan.sprite).is_file():
+        write_thumb_vtt(outdir, plan, probe.duration or 0.0)
+
+
+async def make_thumbnails(cfg: Config, src: Path, outdir: Path, probe: Optional[ProbeInfo], log) -> bool:
+    """Poster + sprite for an existing HLS output, decoding keyframes only."""
+    plan = thumb_plan(cfg, probe, await ffmpeg_encoders())
+    if plan is None:
         return False
+    cmd = ['ffmpeg', '-y', '-nostdin', *KEYFRAMES_ONLY, '-i', str(src), *thumb_outputs(cfg, outdir, plan),
+           '-loglevel', cfg.FFMPEG_LOGLEVEL]
+    ok = await run_ffmpeg(cfg, cmd, src, log, label='缩略图')
+    if ok:
+        _finish_thumbs(outdir, plan, probe)
+    return ok
 
 
-async def scan_and_convert_videos(cfg: Config, log=print) -> Dict:
-    tracks: List[dict] = []
-    seen_safe: set[str] = set()
-    exts = {'.mp4', '.mkv', '.avi', '.mov', '.flv', '.webm', '.m4v', '.mpg', '.mpeg', '.ts'}
-
-    if cfg.VIDEO_UPLOAD_DIR.exists():
-        log(f"[SCAN] 扫描上传目录：{cfg.VIDEO_UPLOAD_DIR}（扩展名：{', '.join(sorted(exts))}）")
-        found = 0
-        for dirpath, dirnames, filenames in os.walk(cfg.VIDEO_UPLOAD_DIR):
-            for fn in filenames:
-                ext = Path(fn).suffix.lower()
-                if ext not in exts:
-                    continue
-                found += 1
-                full = Path(dirpath) / fn
-                safe = safe_name(fn)
-                outdir = cfg.VIDEO_HLS_DIR / safe
-                log(f"[FILE] 发现：{full} -> safe={safe}")
-                has_hls = await transcode_to_hls(cfg, full, outdir, log)
-
-                name_no_ext = Path(fn).stem
-                artist, title = parse_artist_title(name_no_ext)
-                fmt = ext.lstrip('.')
-
-                meta = {'originalFile': fn, 'artist': artist, 'title': title, 'format': fmt}
-                write_meta(outdir, meta)
-
-                id_ = short_id(safe)
-                seen_safe.add(safe)
-                track = {
-                    'id': id_, 'artist': artist, 'title': title,
-                    'originalFile': f"{cfg.VIDEO_ORIG_PUBLIC_PREFIX}/{fn}",
-                    'hlsUrl': f"{cfg.VIDEO_HLS_PUBLIC_PREFIX}/{safe}/playlist.m3u8" if has_hls else None,
-                    'hasHLS': bool(has_hls), 'format': fmt,
-                }
-                tracks.append(track)
-        if found == 0:
-            log(f"[SCAN] 未在 {cfg.VIDEO_UPLOAD_DIR} 内发现可处理的文件。")
+async def transcode_to_hls(cfg: Config, src: Path, outdir: Path, log, info: Optional[dict] = None,
+                           progress: Optional[ProgressCallback] = None) -> bool:
+    rep = ScanReporter.wrap(log)
+    outdir.mkdir(parents=True, exist_ok=True)
+    # 单次 ffprobe（带缓存），即使跳过转码也为播放列表提供时长/分辨率
+    probe = await probe_media(cfg, src)
+    m3u8 = outdir / 'playlist.m3u8'
+    if m3u8.exists() and not cfg.FORCE_REENCODE:
+        rep.emit('skipped', reason='hls_exists', file=str(src), m3u8=str(m3u8))
+        # 旧输出补生成封面/雪碧图（失败不影响 HLS 本身）
+        if cfg.VIDEO_THUMBNAILS and 'poster' not in find_thumbnails(outdir) and shutil.which('ffmpeg'):
+            await make_thumbnails(cfg, src, outdir, probe, rep)
+        return True
+    if not shutil.which('ffmpeg'):
+        rep.emit('transcode_failed', reason='no_ffmpeg', file=str(src))
+        return False
+    plan = thumb_plan(cfg, probe, await ffmpeg_encoders())
+    extra = thumb_outputs(cfg, outdir, plan) if plan else []
+    rungs = select_renditions(cfg, probe)
+    if rungs:
+        note = f"abr({','.join(f'{h}p' for h, _ in rungs)})"
+        for h, _ in rungs:
+            (outdir / f'{h}p').mkdir(exist_ok=True)
+        cmd = ladder_cmd(cfg, src, outdir, probe, rungs, extra)
     else:
-        log(f"[WARN] 上传目录不存在：{cfg.VIDEO_UPLOAD_DIR}")
-
-    # 补扫 HLS 目录
-    for entry in sorted(cfg.VIDEO_HLS_DIR.glob('*/')):
-        if not entry.is_dir():
-            continue
-        safe_dir = entry.name
-        if safe_dir in seen_safe:
-            continue
-        if not (entry / 'playlist.m3u8').exists():
-            continue
-        meta = {}
-        p = entry / 'meta.json'
-        if p.exists():
-            try:
-                meta = json.loads(p.read_text(encoding='utf-8'))
-            except Exception:
-                meta = {}
-        artist = meta.get('artist', '未知艺术家')
-        title = meta.get('title', safe_dir)
-        original_file_name = meta.get('originalFile')
-        fmt = meta.get('format')
-
-        id_ = short_id(safe_dir)
-        track = {
-            'id': id_, 'artist': artist, 'title': title,
-            'originalFile': f"{cfg.VIDEO_ORIG_PUBLIC_PREFIX}/{original_file_name}" if original_file_name else None,
-            'hlsUrl': f"{cfg.VIDEO_HLS_PUBLIC_PREFIX}/{safe_dir}/playlist.m3u8",
-            'hasHLS': True, 'format': fmt,
-        }
-        tracks.append(track)
-
-    # 写入播放列表
-    tracks.sort(key=lambda x: (x.get('title') or ''))
-    cfg.VIDEO_PLAYLIST_FILE.write_text(json.dumps(tracks, ensure_ascii=False, indent=2), encoding='utf-8')
-    log(f"[DONE] 写入 {len(tracks)} 条到 {cfg.VIDEO_PLAYLIST_FILE}")
-    return {'count': len(tracks), 'playlist': str(cfg.VIDEO_PLAYLIST_FILE)}
+        v_args, a_args, note = decide_codecs(cfg, probe)
+        cmd = single_cmd(cfg, src, outdir, v_args, a_args, extra)
+    if info is not None:
+        info['strategy'] = note
+    rep.emit('transcode_started', file=str(src), m3u8=str(m3u8), strategy=note, force=cfg.FORCE_REENCODE,
+             cmd=' '.join(cmd), media='video')
+    t0 = time.perf_counter()
+    ok = await run_ffmpeg(cfg, cmd, src, rep, duration=probe.duration if probe else None, progress=progress)
+    if ok and plan:
+        _finish_thumbs(outdir, plan, probe)
+    if ok:
+        rep.emit('transcode_finished', file=str(src), m3u8=str(m3u8), seconds=round(time.perf_counter() - t0, 3),
+                 bytes=dir_size(outdir))
+    return ok
+
+
+def _track(cfg: Config, safe: str, meta: dict, has_hls: bool, probe: Optional[ProbeInfo] = None,
+           renditions: Optional[List[str]] = None, packaging: Optional[str] = None, track_id: Optional[str] = None) -> dict:
+    original_file_name = meta.get('originalFile')
+    track = {
+        'id': track_id or short_id(safe), 'artist': meta.get('artist', '未知艺术家'), 'title': meta.get('title', safe),
+        'originalFile': f"{cfg.VIDEO_ORIG_PUBLIC_PREFIX}/{original_file_name}" if original_file_name else None,
+        'hlsUrl': f"{cfg.VIDEO_HLS_PUBLIC_PREFIX}/{safe}/playlist.m3u8" if has_hls else None,
+        'hasHLS': bool(has_hls), 'format': meta.get('format'),
+    }
+    if probe:
+        track['duration'] = round(probe.duration, 3) if probe.duration else None
+        track['resolution'] = probe.resolution
+    if renditions:
+        track['renditions'] = renditions
+    if has_hls and packaging:
+        track['packaging'] = packaging
+    if has_hls:
+        for key in ('poster', 'thumbnails'):
+            if meta.get(key):
+                track[key] = f"{cfg.VIDEO_HLS_PUBLIC_PREFIX}/{safe}/{meta[key]}"
+    return track
+
+
+def _library(cfg: Config) -> Library:
+    return Library(kind='video', upload_dir=cfg.VIDEO_UPLOAD_DIR, hls_dir=cfg.VIDEO_HLS_DIR,
+                   playlist_file=cfg.VIDEO_PLAYLIST_FILE, exts=VIDEO_EXTS, transcode=transcode_to_hls,
+                   track=_track, extra_meta=find_thumbnails, renditions=list_renditions)
+
+
+async def scan_and_convert_videos(cfg: Config, log=print, transcode_jobs=run_transcode_jobs,
+                                  progress: Optional[ProgressCallback] = None) -> Dict:
+    return await scan_library(_library(cfg), cfg, log=log, transcode_jobs=transcode_jobs, progress=progress)
+
+
+async def update_videos(cfg: Config, paths: Iterable[Path], log=print, transcode_jobs=run_transcode_jobs,
+                        progress: Optional[ProgressCallback] = None) -> Dict:
+    """Incremental counterpart of :func:`scan_and_convert_videos`; see :func:`.library.update_library`."""
+    return await update_library(_library(cfg), cfg, paths, log=log, transcode_jobs=transcode_jobs, progress=progress)
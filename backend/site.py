@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from quart import current_app, request
+from werkzeug.http import http_date
+
+from .media import SEGMENT_CACHE, MediaBody, content_type, media_etag
+from .playlist_cache import COMPRESS_MIN_BYTES, brotli, playlist_etag
+
+# 带内容哈希的构建产物，文件名变了才会变
+IMMUTABLE_PREFIX = '/_next/static/'
+PAGE_CACHE = 'no-cache'  # 页面与 RSC 数据（.html/.txt/.json）每次部署都可能变，靠 ETag 重新验证
+ASSET_CACHE = 'public, max-age=3600'  # public/ 下未带哈希的图标、图片等
+PAGE_SUFFIXES = {'.html', '.txt', '.json'}
+COMPRESSIBLE_SUFFIXES = {'.html', '.txt', '.json', '.js', '.mjs', '.css', '.svg', '.xml', '.map', '.webmanifest', '.ico'}
+# 两次检查站点是否重新部署之间的最短间隔（秒）
+SITE_RECHECK_SECONDS = 2.0
+
+
+@dataclass
+class SiteFile:
+    """One file of the exported site with its precomputed response headers.
+
+    Files up to the inline limit keep their bytes in ``body`` (ETag is a
+    content hash); larger ones are streamed from disk like media files.
+    """
+    path: Path
+    size: int
+    mtime: float
+    etag: str
+    mimetype: str
+    cache_control: str
+    body: Optional[bytes] = None
+    encoded: Dict[str, Optional[bytes]] = field(default_factory=dict)
+
+    @property
+    def compressible(self) -> bool:
+        return self.body is not None and self.size >= COMPRESS_MIN_BYTES and self.path.suffix.lower() in COMPRESSIBLE_SUFFIXES
+
+    def variant(self, encoding: str) -> Optional[bytes]:
+        """Compressed body for ``encoding`` ('br' or 'gzip'), computed once; None if it would not be smaller."""
+        if encoding not in self.encoded:
+            data = None
+            # 每个文件每次部署只压缩一次，用最高压缩级别
+            if encoding == 'br' and brotli is not None:
+                data = brotli.compress(self.body, quality=11)
+            elif encoding == 'gzip':
+                data = gzip.compress(self.body, compresslevel=9, mtime=0)
+            self.encoded[encoding] = data if data is not None and len(data) < self.size else None
+        return self.encoded[encoding]
+
+
+def _cache_control(url: str) -> str:
+    if url.startswith(IMMUTABLE_PREFIX):
+        return SEGMENT_CACHE
+    if os.path.splitext(url)[1].lower() in PAGE_SUFFIXES:
+        return PAGE_CACHE
+    return ASSET_CACHE
+
+
+class SiteRoutes:
+    """URL path -> :class:`SiteFile` map of the exported frontend under ``FRONTEND_SITE_DIR``.
+
+    Built by one walk of the site dir on first use, so startup does not touch
+    the filesystem and a request never probes candidate paths with ``stat``.
+    Lookups follow the order the static export expects: the file itself,
+    then ``<path>/index.html``, then ``<path>.html``. Small files are read
+    into memory up to ``cache_max`` bytes in total. At most every
+    :data:`SITE_RECHECK_SECONDS` the site dir, ``index.html`` and
+    ``_next/static`` are stat'ed; a change (a new export copied in) rebuilds
+    the table. A missing site dir gives an empty table.
+    """
+
+    def __init__(self, root: Optional[Path], inline_max: int = 256 * 1024, cache_max: int = 64 * 1024 * 1024):
+        self.root = root
+        self.inline_max = inline_max
+        self.cache_max = cache_max
+        self._table: Optional[Dict[str, SiteFile]] = None
+        self._signature: Optional[Tuple] = None
+        self._checked = 0.0
+        self._lock = asyncio.Lock()
+
+    def signature(self) -> Optional[Tuple]:
+        if self.root is None:
+            return None
+        sig = []
+        for p in (self.root, self.root / 'index.html', self.root / '_next' / 'static'):
+            try:
+                st = p.stat()
+                sig.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def build(self) -> Dict[str, SiteFile]:
+        files: Dict[str, SiteFile] = {}
+        budget = self.cache_max
+        stack = [(self.root, '')] if self.root is not None else []
+        while stack:
+            base, prefix = stack.pop()
+            try:
+                entries = list(os.scandir(base))
+            except OSError:
+                continue
+            for e in entries:
+                try:
+                    if e.is_dir():
+                        stack.append((Path(e.path), f'{prefix}/{e.name}'))
+                        continue
+                    if not e.is_file():
+                        continue
+                    st = e.stat()
+                    url = f'{prefix}/{e.name}'
+                    body = None
+                    if st.st_size <= min(self.inline_max, budget):
+                        with open(e.path, 'rb') as fh:
+                            body = fh.read()
+                        budget -= len(body)
+                except OSError:
+                    continue
+                etag = playlist_etag(body) if body is not None else media_etag(st)
+                files[url] = SiteFile(Path(e.path), st.st_size, st.st_mtime, etag, content_type(e.name),
+                                      _cache_control(url), body)
+        table = dict(files)
+        # 目录首页优先于同名 .html：/about -> about/index.html，其次 about.html
+        for url, f in files.items():
+            if url.endswith('/index.html'):
+                table.setdefault(url[:-len('/index.html')] or '/', f)
+        for url, f in files.items():
+            if url.endswith('.html') and not url.endswith('/index.html'):
+                table.setdefault(url[:-len('.html')], f)
+        return table
+
+    async def table(self) -> Dict[str, SiteFile]:
+        now = time.monotonic()
+        if self._table is not None and now - self._checked < SITE_RECHECK_SECONDS:
+            return self._table
+        self._checked = now
+        sig = self.signature()
+        if self._table is None or sig != self._signature:
+            async with self._lock:
+                if self._table is None or sig != self._signature:
+                    self._table = await asyncio.to_thread(self.build)
+                    self._signature = sig
+        return self._table
+
+    def reload(self):
+        """Forget the table; the next lookup walks the site dir again."""
+        self._table = None
+
+    async def resolve(self, path: str) -> Optional[SiteFile]:
+        table = await self.table()
+        return table.get('/' + path.strip('/'))
+
+    async def fallback(self) -> Optional[SiteFile]:
+        """The page served for unknown paths: 404.html, else index.html."""
+        table = await self.table()
+        return table.get('/404.html') or table.get('/index.html')
+
+
+async def serve_site_file(f: SiteFile):
+    """Answer with ``f``: in-memory body (gzip/br when accepted) or a streamed file, with 304 handling."""
+    resp_cls = current_app.response_class
+    if f.body is None:
+        resp = resp_cls(MediaBody(f.path, f.size), mimetype=f.mimetype)
+        resp.content_length = f.size
+        resp.set_etag(f.etag)
+        resp.headers['Accept-Ranges'] = 'bytes'
+        ranges = True
+    else:
+        body, encoding = f.body, None
+        if f.compressible:
+            accept = request.accept_encodings
+            for enc in (('br',) if brotli is not None and accept['br'] else ()) + (('gzip',) if accept['gzip'] else ()):
+                data = f.encoded[enc] if enc in f.encoded else await asyncio.to_thread(f.variant, enc)
+                if data is not None:
+                    body, encoding = data, enc
+                    break
+        resp = resp_cls(body, mimetype=f.mimetype)
+        resp.set_etag(f"{f.etag}-{encoding}" if encoding else f.etag)
+        if encoding:
+            resp.headers['Content-Encoding'] = encoding
+        if f.compressible:
+            resp.vary.add('Accept-Encoding')
+        ranges = encoding is None
+    resp.headers['Cache-Control'] = f.cache_control
+    resp.headers['Last-Modified'] = http_date(f.mtime)
+    await resp.make_conditional(request, accept_ranges=ranges, complete_length=f.size if ranges else None)
+    return resp
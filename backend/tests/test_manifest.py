@@ -0,0 +1,40 @@
+import asyncio
+import json
+
+from backend.config import Config
+from backend.services.video import scan_and_convert_videos
+
+
+def _config(tmp_path, monkeypatch) -> Config:
+    for key in ('VIDEO_UPLOAD_DIR', 'VIDEO_HLS_DIR', 'MUSIC_UPLOAD_DIR', 'MUSIC_HLS_DIR'):
+        monkeypatch.setenv(key, str(tmp_path / key.lower()))
+    monkeypatch.setenv('VIDEO_PLAYLIST_FILE', str(tmp_path / 'video-playlist' / 'playlist.json'))
+    monkeypatch.setenv('MUSIC_PLAYLIST_FILE', str(tmp_path / 'music-playlist' / 'playlist.json'))
+    monkeypatch.setenv('PROBE_CACHE_FILE', str(tmp_path / 'cache' / 'probe.json'))
+    monkeypatch.setenv('JOBS_DB_FILE', str(tmp_path / 'cache' / 'jobs.sqlite3'))
+    monkeypatch.setenv('CATALOG_DB_FILE', str(tmp_path / 'cache' / 'catalog.sqlite3'))
+    # 每次扫描都重新认领输出目录（与未装 ffmpeg、转码失败时的重扫路径相同）
+    monkeypatch.setenv('FORCE_REENCODE', '1')
+    monkeypatch.setenv('WATCH_UPLOADS', '0')
+    cfg = Config.from_env()
+    cfg.ensure_dirs()
+    return cfg
+
+
+def test_rescan_with_duplicate_keeps_ids(tmp_path, monkeypatch):
+    cfg = _config(tmp_path, monkeypatch)
+    up = cfg.VIDEO_UPLOAD_DIR
+    (up / 'sub').mkdir()
+    (up / 'A - One.mp4').write_bytes(b'X' * 100)
+    (up / 'copy.mp4').write_bytes(b'X' * 100)  # 与 A - One.mp4 内容相同
+    (up / 'sub' / 'A - One.mp4').write_bytes(b'Y' * 100)  # 同名不同内容
+
+    def scan():
+        result = asyncio.run(scan_and_convert_videos(cfg, log=lambda msg: None))
+        tracks = json.loads(cfg.VIDEO_PLAYLIST_FILE.read_text(encoding='utf-8'))
+        return result['version'], sorted(t['id'] for t in tracks)
+
+    version, ids = scan()
+    assert len(set(ids)) == 3
+    for _ in range(2):
+        assert scan() == (version, ids)
@@ -2,10 +2,17 @@ from __future__ import annotations
 
 import asyncio
 import hashlib
+import os
 import re
+import time
 import unicodedata
 from pathlib import Path
-from typing import Tuple, Optional, List
+from typing import Dict, Tuple, Optional, List
+
+try:  # optional: pip install xxhash
+    import xxhash  # type: ignore
+except ImportError:  # pragma: no cover
+    xxhash = None
 
 
 def safe_name(filename: str) -> str:
@@ -18,6 +25,11 @@ def safe_name(filename: str) -> str:
     return safe
 
 
+def fold_text(s: str) -> str:
+    """Normalize text for matching: NFKC (as safe_name does) plus case folding."""
+    return unicodedata.normalize('NFKC', s).casefold()
+
+
 def short_id(s: str) -> str:
     return hashlib.md5(s.encode('utf-8')).hexdigest()[:8]
 
@@ -29,6 +41,72 @@ def parse_artist_title(name_no_ext: str) -> Tuple[str, str]:
     return '未知艺术家', name_no_ext
 
 
+def file_digest(path: Path, chunk_size: int = 1 << 20, like: Optional[str] = None) -> str:
+    """Content hash of a file, read in chunks into one reused buffer.
+
+    Uses XXH3-128 (``xxh3:`` prefix) when the optional ``xxhash`` package is
+    installed, otherwise BLAKE2b-128. ``like`` is a previously stored digest;
+    the new one is computed with the same algorithm so the two compare.
+    """
+    if xxhash is not None and (like is None or like.startswith('xxh3:')):
+        h, prefix = xxhash.xxh3_128(), 'xxh3:'
+    else:
+        h, prefix = hashlib.blake2b(digest_size=16), ''
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(view[:n])
+    return prefix + h.hexdigest()
+
+
+def dir_size(path: Path) -> int:
+    """Total size in bytes of the regular files under ``path`` (0 if missing)."""
+    total = 0
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return 0
+    for e in entries:
+        try:
+            if e.is_dir(follow_symlinks=False):
+                total += dir_size(Path(e.path))
+            elif e.is_file(follow_symlinks=False):
+                total += e.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+    return total
+
+
+class PhaseTimer:
+    """Wall time spent in consecutive named phases of one run.
+
+    ``switch(name)`` ends the current phase and starts ``name``; re-entering
+    a phase adds to its total. ``stop()`` ends the last one.
+    """
+
+    def __init__(self):
+        self.totals: Dict[str, float] = {}
+        self._current: Optional[str] = None
+        self._since = 0.0
+
+    def switch(self, name: Optional[str]):
+        now = time.perf_counter()
+        if self._current is not None:
+            self.totals[self._current] = self.totals.get(self._current, 0.0) + now - self._since
+        self._current, self._since = name, now
+
+    def stop(self) -> Dict[str, float]:
+        self.switch(None)
+        return self.as_dict()
+
+    def as_dict(self) -> Dict[str, float]:
+        return {k: round(v, 4) for k, v in self.totals.items()}
+
+
 async def run_streamed(cmd: List[str], timeout: Optional[int] = None, on_stdout=None, on_stderr=None) -> int:
     proc = await asyncio.create_subprocess_exec(
         *cmd,
@@ -36,16 +114,21 @@ async def run_streamed(cmd: List[str], timeout: Optional[int] = None, on_stdout=
         stderr=asyncio.subprocess.PIPE,
     )
     async def reader(stream, cb):
-        if not cb:
-            return
         while True:
             line = await stream.readline()
             if not line:
                 break
-            cb(line.decode(errors='ignore').rstrip())
+            if cb:
+                cb(line.decode(errors='ignore').rstrip())
     try:
         await asyncio.wait_for(asyncio.gather(reader(proc.stdout, on_stdout), reader(proc.stderr, on_stderr)), timeout=timeout)
     except asyncio.TimeoutError:
         proc.kill()
+        await proc.wait()
         return 124
+    except asyncio.CancelledError:
+        # 调用方被取消（如服务停止）时不留下孤儿进程
+        if proc.returncode is None:
+            proc.kill()
+        raise
     return await proc.wait()
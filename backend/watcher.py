@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# inotify(7) 事件位
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+
+FilesCallback = Callable[[str, List[Path]], None]
+RescanCallback = Callable[[str], None]
+
+
+def _load_inotify():
+    """libc's inotify functions, or None where they do not exist (non-Linux, odd libc)."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        init1, add, rm = libc.inotify_init1, libc.inotify_add_watch, libc.inotify_rm_watch
+    except (OSError, AttributeError):
+        return None
+    init1.argtypes = [ctypes.c_int]
+    add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    rm.argtypes = [ctypes.c_int, ctypes.c_int]
+    return init1, add, rm
+
+
+class UploadWatcher:
+    """Watch the upload dirs and report files once they have finished changing.
+
+    Uses inotify when the platform has it (one watch per directory, added
+    recursively as directories appear) and falls back to stat-snapshot
+    polling every ``interval`` seconds per root otherwise, e.g. when the
+    root does not exist yet or ``max_user_watches`` is exhausted.
+
+    Events only mark a path as pending. Every ``interval`` seconds the
+    pending paths are stat'ed, and a path is reported through
+    ``on_files(kind, paths)`` once its size and mtime have been unchanged
+    for ``settle`` seconds (a path that stays missing is reported as well,
+    as a deletion). A burst of writes to one file thus yields one report.
+    ``on_rescan(kind)`` asks for a full scan: at start (to catch up on
+    changes made while nothing was watching), after a queue overflow, and
+    when a directory is moved out of the tree.
+    """
+
+    def __init__(self, roots: Dict[str, Tuple[Path, Iterable[str]]], on_files: FilesCallback, on_rescan: RescanCallback,
+                 interval: float = 2.0, settle: float = 3.0, logger=None):
+        self.roots = {kind: (Path(root), frozenset(exts)) for kind, (root, exts) in roots.items()}
+        self.on_files = on_files
+        self.on_rescan = on_rescan
+        self.interval = interval
+        self.settle = settle
+        self.logger = logger
+        # path -> (kind, 最近一次 (size, mtime_ns)，None 表示不存在, 该状态首次出现的时间)
+        self._pending: Dict[Path, Tuple[str, Optional[Tuple[int, int]], float]] = {}
+        self._fd: Optional[int] = None
+        self._inotify = None
+        self._wds: Dict[int, Tuple[str, Path]] = {}
+        self._poll: Dict[str, Dict[Path, Tuple[int, int]]] = {}  # 轮询模式的库 -> 上一次快照
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def mode(self) -> str:
+        if not self._poll:
+            return 'inotify'
+        return 'poll' if len(self._poll) == len(self.roots) else 'inotify+poll'
+
+    def _log(self, msg: str, *args):
+        if self.logger:
+            self.logger.info(msg, *args)
+
+    def _wanted(self, kind: str, path: Path) -> bool:
+        return path.suffix.lower() in self.roots[kind][1]
+
+    def mark(self, kind: str, path: Path):
+        """Queue ``path`` for the settle check (later events for it just reset the clock)."""
+        if self._wanted(kind, path):
+            self._pending[path] = (kind, (-1, -1), time.monotonic())
+
+    # ---- inotify ----
+    def _open_inotify(self) -> bool:
+        self._inotify = _load_inotify()
+        if self._inotify is None:
+            return False
+        fd = self._inotify[0](os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return False
+        self._fd = fd
+        asyncio.get_running_loop().add_reader(fd, self._read_events)
+        return True
+
+    def _watch_tree(self, kind: str, top: Path, mark_files: bool = False) -> bool:
+        """Add a watch for ``top`` and every directory below it; False if a watch could not be added."""
+        add = self._inotify[1]
+        for dirpath, dirnames, filenames in os.walk(top):
+            wd = add(self._fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOENT, errno.ENOTDIR):  # 遍历期间被删掉
+                    dirnames[:] = []
+                    continue
+                self._log('[WATCH] inotify_add_watch 失败（%s）：%s', os.strerror(err), dirpath)
+                return False
+            self._wds[wd] = (kind, Path(dirpath))
+            if mark_files:
+                # 目录先于监听建立，里面已有的文件不会再产生事件
+                for fn in filenames:
+                    self.mark(kind, Path(dirpath) / fn)
+        return True
+
+    def _read_events(self):
+        try:
+            buf = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._log('[WATCH] 读取 inotify 失败：%s', e)
+            return
+        pos = 0
+        while pos + _EVENT.size <= len(buf):
+            wd, mask, _cookie, length = _EVENT.unpack_from(buf, pos)
+            raw = buf[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b'\0')
+            pos += _EVENT.size + length
+            self._handle_event(wd, mask, os.fsdecode(raw))
+
+    def _handle_event(self, wd: int, mask: int, name: str):
+        if mask & IN_Q_OVERFLOW:
+            # 事件队列溢出：不知道丢了哪些，整库重扫
+            self._log('[WATCH] inotify 事件队列溢出，触发全量扫描')
+            for kind in self.roots:
+                if kind not in self._poll:
+                    self.on_rescan(kind)
+            return
+        if mask & IN_IGNORED:
+            self._wds.pop(wd, None)
+            return
+        entry = self._wds.get(wd)
+        if entry is None:
+            return
+        kind, parent = entry
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            if parent == self.roots[kind][0]:
+                # 上传根目录本身没了：改为轮询，等它重新出现
+                self._log('[WATCH] 上传目录被移除，改为轮询：%s', parent)
+                self._poll[kind] = {}
+                self.on_rescan(kind)
+            return
+        if not name:
+            return
+        path = parent / name
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                if not self._watch_tree(kind, path, mark_files=True):
+                    self._poll[kind] = self._snapshot(kind)
+            elif mask & IN_MOVED_FROM:
+                # 子目录被移出：其中文件不会逐个产生事件
+                self.on_rescan(kind)
+            return
+        self.mark(kind, path)
+
+    # ---- polling ----
+    def _snapshot(self, kind: str) -> Dict[Path, Tuple[int, int]]:
+        root, exts = self.roots[kind]
+        snap: Dict[Path, Tuple[int, int]] = {}
+        for dirpath, _dirnames, filenames in os.walk(root):
+            for fn in filenames:
+                if os.path.splitext(fn)[1].lower() not in exts:
+                    continue
+                p = Path(dirpath) / fn
+                try:
+                    st = p.stat()
+                except FileNotFoundError:
+                    continue
+                snap[p] = (st.st_size, st.st_mtime_ns)
+        return snap
+
+    def _poll_once(self):
+        for kind, prev in list(self._poll.items()):
+            snap = self._snapshot(kind)
+            for p in snap.keys() | prev.keys():
+                if snap.get(p) != prev.get(p):
+                    self.mark(kind, p)
+            self._poll[kind] = snap
+
+    # ---- settle ----
+    def _settled(self) -> Dict[str, List[Path]]:
+        now = time.monotonic()
+        ready: Dict[str, List[Path]] = {}
+        for path, (kind, last, since) in list(self._pending.items()):
+            try:
+                st = path.stat()
+                sig = (st.st_size, st.st_mtime_ns)
+            except (FileNotFoundError, NotADirectoryError):
+                sig = None
+            if sig != last:
+                self._pending[path] = (kind, sig, now)
+            elif now - since >= self.settle:
+                del self._pending[path]
+                ready.setdefault(kind, []).append(path)
+        return ready
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if self._poll:
+                    await asyncio.to_thread(self._poll_once)
+                for kind, paths in self._settled().items():
+                    self._log('[WATCH] %s：%d 个文件已稳定，加入队列', kind, len(paths))
+                    self.on_files(kind, sorted(paths))
+            except Exception as e:  # pragma: no cover - 不让单次异常终止监听
+                if self.logger:
+                    self.logger.exception('[WATCH] 处理文件变更失败：%s', e)
+
+    async def start(self):
+        use_inotify = self._open_inotify()
+        for kind, (root, _exts) in self.roots.items():
+            if not (use_inotify and root.is_dir() and self._watch_tree(kind, root)):
+                self._poll[kind] = self._snapshot(kind)
+            self.on_rescan(kind)
+        self._log('[WATCH] 开始监听上传目录（%s）：%s', self.mode, ', '.join(str(r) for r, _ in self.roots.values()))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._fd is not None:
+            asyncio.get_running_loop().remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        self._wds.clear()
+        self._pending.clear()
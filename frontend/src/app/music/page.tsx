@@ -3,14 +3,19 @@ import { useEffect, useMemo, useRef, useState } from 'react'
 import Image from 'next/image'
 // import { HlsAudio } from '@/components/HlsPlayer'
 import { AudioPlayer, type PlayMode } from '@/components/ui/audio-player'
-import { getJSON, postJSON, openScanWS } from '@/lib/api'
+import { getJSON, postJSON, openScanWS, upsertProgress, waitForJob, type Job } from '@/lib/api'
 import { Button } from '@/components/ui/button'
 import { Window } from '@/components/ui/window'
 import { Skeleton } from '@/components/ui/skeleton'
 import { Music, RefreshCw, History, X, Repeat, Repeat1, Shuffle } from 'lucide-react'
 import { toast } from 'sonner'
 
-type Track = { id: string; artist?: string; title?: string; originalFile?: string; hlsUrl?: string; hasHLS?: boolean; format?: string }
+type Loudness = { integrated: number; truePeak?: number | null; peak?: number | null; lra?: number | null }
+type Track = {
+  id: string; artist?: string; title?: string; originalFile?: string; hlsUrl?: string; hasHLS?: boolean; format?: string
+  loudness?: Loudness; replayGain?: { trackGain: number; trackPeak?: number | null }; normalizedHlsUrl?: string
+  renditions?: string[]
+}
 
 export default function MusicPage() {
   const [list, setList] = useState<Track[]>([])
@@ -121,6 +126,7 @@ export default function MusicPage() {
     try {
       ws = openScanWS('/ws/scan/music', {
         onLog: (line) => setLogs(prev => [...prev, line].slice(-500)),
+        onProgress: (p) => setLogs(prev => upsertProgress(prev, p).slice(-500)),
         onDone: async () => {
           await load()
           toast.success('音乐扫描完成')
@@ -131,6 +137,8 @@ export default function MusicPage() {
 
           if (/already running/i.test(msg)) {
             toast.error('有一个音乐扫描正在进行中，请稍后再试')
+          } else if (/fell behind/i.test(msg)) {
+            toast.error('日志推送跟不上，连接已断开；扫描仍在后台进行，可重新打开查看')
           } else if (/debounced/i.test(msg)) {
             const m = msg.match(/(~?(\d+)s)/i)
             const left = m?.[2] ? `约 ${m[2]} 秒后重试` : '稍后重试'
@@ -145,8 +153,10 @@ export default function MusicPage() {
     } catch {
 
       try {
-        const data = await postJSON<{ logs?: string[]; result?: unknown }>('/api/scan/music')
-        setLogs(data.logs || [])
+        const data = await postJSON<{ job?: Job | null }>('/api/scan/music')
+        const job = data.job ? await waitForJob(data.job.id) : null
+        setLogs(job?.result?.logs || [])
+        if (job?.state === 'failed') throw new Error(job.error || 'scan job failed')
         await load()
         toast.success('音乐扫描完成')
       } catch (err) {
@@ -264,7 +274,8 @@ export default function MusicPage() {
                         <>
                           <div className="absolute inset-x-0 bottom-0 p-2 lg:hidden">
                             <AudioPlayer
-                              src={selected.hlsUrl}
+                              src={selected.normalizedHlsUrl ?? selected.hlsUrl}
+                              gainDb={selected.normalizedHlsUrl ? undefined : selected.replayGain?.trackGain}
                               className="bg-transparent dark:bg-transparent border-0 shadow-none rounded-none"
                               onPrev={handlePrev}
                               onNext={handleNext}
@@ -275,7 +286,8 @@ export default function MusicPage() {
                           </div>
                           <div className="absolute inset-x-0 bottom-0 p-2 hidden lg:block">
                             <AudioPlayer
-                              src={selected.hlsUrl}
+                              src={selected.normalizedHlsUrl ?? selected.hlsUrl}
+                              gainDb={selected.normalizedHlsUrl ? undefined : selected.replayGain?.trackGain}
                               className="bg-transparent dark:bg-transparent border-0 shadow-none rounded-none"
                               onPrev={handlePrev}
                               onNext={handleNext}
@@ -1,14 +1,14 @@
 "use client"
 import { useEffect, useMemo, useRef, useState } from 'react'
 import { HlsVideo } from '@/components/HlsPlayer'
-import { getJSON, postJSON, openScanWS } from '@/lib/api'
+import { getJSON, postJSON, openScanWS, upsertProgress, waitForJob, type Job } from '@/lib/api'
 import { Button } from '@/components/ui/button'
 import { Window } from '@/components/ui/window'
 import { Skeleton } from '@/components/ui/skeleton'
 import { Play, RefreshCw, History, X } from 'lucide-react'
 import { toast } from 'sonner'
 
-type Track = { id: string; artist?: string; title?: string; originalFile?: string; hlsUrl?: string; hasHLS?: boolean; format?: string }
+type Track = { id: string; artist?: string; title?: string; originalFile?: string; hlsUrl?: string; hasHLS?: boolean; format?: string; poster?: string; thumbnails?: string }
 
 export default function VideoPage() {
   const [list, setList] = useState<Track[]>([])
@@ -92,6 +92,7 @@ export default function VideoPage() {
     try {
       ws = openScanWS('/ws/scan/video', {
         onLog: (line) => setLogs(prev => [...prev, line].slice(-500)),
+        onProgress: (p) => setLogs(prev => upsertProgress(prev, p).slice(-500)),
         onDone: async () => {
           await load()
           toast.success('视频扫描完成')
@@ -101,6 +102,8 @@ export default function VideoPage() {
           setLogs(prev => [...prev, `ERROR: ${msg}`])
           if (/already running/i.test(msg)) {
             toast.error('有一个视频扫描正在进行中，请稍后再试')
+          } else if (/fell behind/i.test(msg)) {
+            toast.error('日志推送跟不上，连接已断开；扫描仍在后台进行，可重新打开查看')
           } else if (/debounced/i.test(msg)) {
             const m = msg.match(/(~?(\d+)s)/i)
             const left = m?.[2] ? `约 ${m[2]} 秒后重试` : '稍后重试'
@@ -114,8 +117,10 @@ export default function VideoPage() {
       })
     } catch {
       try {
-        const data = await postJSON<{ logs?: string[]; result?: unknown }>('/api/scan/video')
-        setLogs(data.logs || [])
+        const data = await postJSON<{ job?: Job | null }>('/api/scan/video')
+        const job = data.job ? await waitForJob(data.job.id) : null
+        setLogs(job?.result?.logs || [])
+        if (job?.state === 'failed') throw new Error(job.error || 'scan job failed')
         await load()
         toast.success('视频扫描完成')
       } catch (err) {
@@ -200,8 +205,17 @@ export default function VideoPage() {
                         onClick={() => setSelectedId(item.id)}
                         className={`w-full text-left px-4 py-3 focus:outline-none focus-visible:ring-2 focus-visible:ring-blue-500 transition-colors ${active ? 'bg-blue-50 dark:bg-blue-900/20' : 'hover:bg-slate-50 dark:hover:bg-slate-800/60'}`}
                       >
-                        <div className="text-sm font-medium truncate text-slate-900 dark:text-slate-100">{item.title || item.id}</div>
-                        <div className="text-xs text-slate-600 dark:text-slate-300 truncate">{item.artist || '—'}</div>
+                        <div className="flex items-center gap-3">
+                          {item.poster && (
+                            // 封面是后端生成的小 WebP，直接用 img，不经过 next/image
+                            // eslint-disable-next-line @next/next/no-img-element
+                            <img src={item.poster} alt="" loading="lazy" decoding="async" className="flex-none w-16 aspect-video object-cover rounded-sm bg-slate-200 dark:bg-slate-800" />
+                          )}
+                          <div className="min-w-0">
+                            <div className="text-sm font-medium truncate text-slate-900 dark:text-slate-100">{item.title || item.id}</div>
+                            <div className="text-xs text-slate-600 dark:text-slate-300 truncate">{item.artist || '—'}</div>
+                          </div>
+                        </div>
                       </button>
                     </li>
                   )
@@ -217,9 +231,10 @@ export default function VideoPage() {
                   </div>
                   <div className="p-4">
                     {selected.hlsUrl ? (
-                      <div className={`relative w-full aspect-video overflow-hidden rounded-sm bg-black transition-all duration-500 ease-out ${videoReady ? 'opacity-100 translate-y-0' : 'opacity-0 translate-y-1'}`}>
+                      <div className={`relative w-full aspect-video overflow-hidden rounded-sm bg-black transition-all duration-500 ease-out ${videoReady || selected.poster ? 'opacity-100 translate-y-0' : 'opacity-0 translate-y-1'}`}>
                         <HlsVideo
                           src={selected.hlsUrl}
+                          poster={selected.poster}
                           className="absolute inset-0 w-full h-full block !m-0 object-contain object-center"
                           onCanPlay={() => setVideoReady(true)}
                         />
@@ -13,7 +13,8 @@ export function HlsVideo({ src, poster, className, onCanPlay }: { src: string, p
     if (video.canPlayType('application/vnd.apple.mpegurl')) {
       video.src = src
     } else if (Hls.isSupported()) {
-      hls = new Hls({ enableWorker: true })
+      // 多码率（master playlist）时自动切换清晰度，且不超过播放器实际尺寸
+      hls = new Hls({ enableWorker: true, capLevelToPlayerSize: true, startLevel: -1 })
       hls.loadSource(src)
       hls.attachMedia(video)
     }
@@ -31,7 +32,8 @@ export function HlsAudio({ src, className }: { src: string, className?: string }
     if (audio.canPlayType('application/vnd.apple.mpegurl')) {
       audio.src = src
     } else if (Hls.isSupported()) {
-      hls = new Hls({ enableWorker: true })
+      // 多码率音频（master playlist）按带宽估计起播并自动切档
+      hls = new Hls({ enableWorker: true, startLevel: -1 })
       hls.loadSource(src)
       hls.attachMedia(audio)
     }
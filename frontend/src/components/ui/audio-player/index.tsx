@@ -19,11 +19,13 @@ export interface AudioPlayerProps {
   variant?: 'full' | 'compact'
   mode?: PlayMode
   onModeChange?: (mode: PlayMode) => void
+  /** ReplayGain track gain (dB); only attenuation is applied, since el.volume cannot exceed 1 */
+  gainDb?: number
 }
 
 export type PlayMode = 'all' | 'one' | 'shuffle'
 
-export function AudioPlayer({ src, className, autoPlay, onPrev, onNext, variant = 'full', mode: modeProp, onModeChange }: AudioPlayerProps) {
+export function AudioPlayer({ src, className, autoPlay, onPrev, onNext, variant = 'full', mode: modeProp, onModeChange, gainDb }: AudioPlayerProps) {
   const audioRef = useRef<HTMLAudioElement | null>(null)
   const [ready, setReady] = useState(false)
   const [playing, setPlaying] = useState(false)
@@ -38,6 +40,8 @@ export function AudioPlayer({ src, className, autoPlay, onPrev, onNext, variant
   const [showVol, setShowVol] = useState(false)
   const volWrapRef = useRef<HTMLDivElement | null>(null)
   const wasPlayingRef = useRef(false)
+  // 响度增益：滑块显示的是用户音量，实际 el.volume = 用户音量 × 增益系数
+  const gain = useMemo(() => (gainDb == null || !isFinite(gainDb) ? 1 : Math.min(1, Math.pow(10, gainDb / 20))), [gainDb])
 
   useEffect(() => { seekingRef.current = seeking }, [seeking])
 
@@ -74,7 +78,7 @@ export function AudioPlayer({ src, className, autoPlay, onPrev, onNext, variant
       const onPlay = () => setPlaying(true)
       const onPause = () => setPlaying(false)
       const onCanPlay = () => setReady(true)
-      const onVolume = () => { setMuted(el.muted); setVolume(el.volume) }
+      const onVolume = () => { setMuted(el.muted) }
       const onEnded = () => setPlaying(false)
 
       el.addEventListener('loadedmetadata', onLoadedMeta)
@@ -104,7 +108,8 @@ export function AudioPlayer({ src, className, autoPlay, onPrev, onNext, variant
       el.src = src
       el.load()
     } else if (Hls.isSupported()) {
-      hls = new Hls({ enableWorker: true })
+      // 多码率音频（master playlist）按带宽估计起播并自动切档
+      hls = new Hls({ enableWorker: true, startLevel: -1 })
       hls.loadSource(src)
       hls.attachMedia(el)
     } else {
@@ -175,11 +180,17 @@ export function AudioPlayer({ src, className, autoPlay, onPrev, onNext, variant
     el.muted = !el.muted
   }
 
+  useEffect(() => {
+    const el = audioRef.current
+    if (el) el.volume = volume * gain
+  }, [volume, gain, src])
+
   const changeVolume = (v: number) => {
     const el = audioRef.current
     if (!el) return
-    el.volume = Math.min(1, Math.max(0, v))
-    el.muted = el.volume === 0
+    const next = Math.min(1, Math.max(0, v))
+    setVolume(next)
+    el.muted = next === 0
   }
 
   const commitSeek = (pct: number | null) => {
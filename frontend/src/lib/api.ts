@@ -50,8 +50,71 @@ export async function postJSON<T>(url: string, body?: unknown, init?: RequestIni
   return res.json() as Promise<T>
 }
 
+export type Job = {
+  id: number
+  kind: 'video' | 'music'
+  type: 'scan' | 'transcode' | 'playlist'
+  state: 'queued' | 'running' | 'done' | 'failed'
+  error?: string | null
+  result?: { logs?: string[]; [key: string]: unknown } | null
+}
+
+// 轮询后台任务直到结束（done/failed）
+export async function waitForJob(id: number, intervalMs = 1000): Promise<Job> {
+  for (;;) {
+    const job = await getJSON<Job>(`/api/jobs/${id}`)
+    if (job.state === 'done' || job.state === 'failed') return job
+    await new Promise(resolve => setTimeout(resolve, intervalMs))
+  }
+}
+
+export type ScanProgress = {
+  job: string
+  file: string
+  percent: number | null
+  outTime: number | null
+  duration: number | null
+  speed: number | null
+  fps: number | null
+  bitrateKbps: number | null
+  size: number | null
+  eta: number | null
+  elapsed: number
+  done: boolean
+}
+
+// 进度在日志窗口里按任务原地刷新，行首标记用于识别
+export function progressLine(p: ScanProgress): string {
+  const parts = [p.percent != null ? `${p.percent.toFixed(1)}%` : '--']
+  if (p.speed != null) parts.push(`${p.speed}x`)
+  if (p.fps) parts.push(`${p.fps} fps`)
+  if (p.bitrateKbps != null) parts.push(`${Math.round(p.bitrateKbps)} kbps`)
+  if (p.eta != null && !p.done) parts.push(`剩余 ${Math.ceil(p.eta)}s`)
+  return `[PROGRESS ${p.job}] ${p.file} ${parts.join(' · ')}`
+}
+
+export function upsertProgress(lines: string[], p: ScanProgress): string[] {
+  const tag = `[PROGRESS ${p.job}]`
+  let i = lines.length - 1
+  while (i >= 0 && !lines[i].startsWith(tag)) i--
+  if (i < 0) return [...lines, progressLine(p)]
+  const next = lines.slice()
+  next[i] = progressLine(p)
+  return next
+}
+
+// 扫描事件（后端 backend/services/events.py）；line 为服务端渲染好的日志行，纯数据事件（probed / 进度）没有
+export type ScanEvent = {
+  event: string
+  ts: number
+  line?: string
+  [key: string]: unknown
+}
+
 export function openScanWS(path: '/ws/scan/video' | '/ws/scan/music', handlers: {
   onLog?: (line: string) => void
+  onProgress?: (progress: ScanProgress) => void
+  onEvents?: (events: ScanEvent[]) => void
   onDone?: (result: unknown) => void
   onError?: (message: string) => void
   onClose?: () => void
@@ -60,8 +123,18 @@ export function openScanWS(path: '/ws/scan/video' | '/ws/scan/music', handlers:
   const ws = new WebSocket((WS_BASE || '') + path)
   ws.onmessage = (ev) => {
     try {
-      const data = JSON.parse(ev.data as string) as { type: string; line?: string; result?: unknown; message?: string }
-      if (data.type === 'log' && data.line) handlers.onLog?.(data.line)
+      const data = JSON.parse(ev.data as string) as {
+        type: string; line?: string; result?: unknown; message?: string; events?: ScanEvent[]
+      }
+      if (data.type === 'batch' && data.events) {
+        handlers.onEvents?.(data.events)
+        for (const e of data.events) {
+          if (e.event === 'transcode_progress') handlers.onProgress?.(e as unknown as ScanProgress)
+          else if (e.line) handlers.onLog?.(e.line)
+        }
+      }
+      else if (data.type === 'log' && data.line) handlers.onLog?.(data.line)
+      else if (data.type === 'progress') handlers.onProgress?.(data as unknown as ScanProgress)
       else if (data.type === 'done') handlers.onDone?.(data.result)
       else if (data.type === 'error') handlers.onError?.(data.message || 'unknown error')
     } catch {
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""Load-test the app over real HTTP: latency percentiles, throughput and per-route CPU.
+
+Boots ``create_app()`` under Hypercorn in a child process on a throw-away
+media/site tree, then drives it with keep-alive HTTP/1.1 connections:
+
+1. each route alone (``--per-route`` requests), measuring the server
+   process's CPU time per request from /proc;
+2. a weighted mix of all routes (``--requests``), reporting p50/p90/p99
+   latency per route and overall, requests/sec and MB/s.
+
+Routes: ``playlist`` (/api/video/playlist), ``m3u8``, ``segment``,
+``next-static`` (/_next/static), ``site-index`` (/), ``site-dir``
+(catch-all resolving to dir/index.html), ``site-html`` (catch-all resolving
+to page.html) and ``site-404`` (catch-all miss falling back to 404.html).
+Every request carries an allowed ``Origin`` unless ``--no-origin`` is given,
+so the CORS hook does its full work.
+
+    python scripts/bench_http.py --concurrency 16 --requests 5000
+    python scripts/bench_http.py --mix playlist=1,segment=8 --segment-size 2097152 --out http.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+ORIGIN = 'http://localhost:3000'  # 在默认的本地开发白名单内
+
+DEFAULT_MIX = 'playlist=2,m3u8=3,segment=10,next-static=2,site-index=1,site-dir=1,site-html=1,site-404=1'
+
+
+# ---------- 夹具 ----------
+def setup_env(tmp: Path):
+    for key in ('VIDEO_UPLOAD_DIR', 'VIDEO_HLS_DIR', 'MUSIC_UPLOAD_DIR', 'MUSIC_HLS_DIR'):
+        os.environ[key] = str(tmp / key.lower())
+    os.environ['VIDEO_PLAYLIST_FILE'] = str(tmp / 'video-playlist' / 'playlist.json')
+    os.environ['MUSIC_PLAYLIST_FILE'] = str(tmp / 'music-playlist' / 'playlist.json')
+    os.environ['PROBE_CACHE_FILE'] = str(tmp / 'cache' / 'probe.json')
+    os.environ['JOBS_DB_FILE'] = str(tmp / 'cache' / 'jobs.sqlite3')
+    os.environ['CATALOG_DB_FILE'] = str(tmp / 'cache' / 'catalog.sqlite3')
+    os.environ['FRONTEND_ENABLE'] = '1'
+    os.environ['FRONTEND_SITE_DIR'] = str(tmp / 'site')
+    os.environ['MEDIA_OFFLOAD'] = ''
+    os.environ['WATCH_UPLOADS'] = '0'
+
+
+def build_fixtures(tmp: Path, args) -> Dict[str, List[str]]:
+    """Write the media and site files; returns route name -> URLs."""
+    hls = tmp / 'video_hls_dir' / 'bench'
+    hls.mkdir(parents=True)
+    segs = [f'segment_{i:03d}.ts' for i in range(args.segments)]
+    payload = os.urandom(args.segment_size)
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:6', '#EXT-X-MEDIA-SEQUENCE:0']
+    for s in segs:
+        (hls / s).write_bytes(payload)
+        lines += ['#EXTINF:6.000000,', s]
+    (hls / 'playlist.m3u8').write_text('\n'.join(lines + ['#EXT-X-ENDLIST', '']))
+
+    playlist = tmp / 'video-playlist' / 'playlist.json'
+    playlist.parent.mkdir(parents=True)
+    tracks = [{'id': f'{i:08x}', 'artist': f'Artist{i % 40}', 'title': f'Title {i}',
+               'originalFile': f'/video-upload/Artist{i % 40} - Title {i}.mp4',
+               'hlsUrl': '/video-hls/bench/playlist.m3u8', 'hasHLS': True, 'format': 'mp4', 'duration': 180.0}
+              for i in range(args.tracks)]
+    playlist.write_text(json.dumps(tracks, ensure_ascii=False, separators=(',', ':')), encoding='utf-8')
+
+    site = tmp / 'site'
+    (site / '_next' / 'static' / 'chunks').mkdir(parents=True)
+    (site / 'about').mkdir()
+    page = '<!doctype html><html><body>' + 'x' * args.page_size + '</body></html>'
+    for rel in ('index.html', '404.html', 'about/index.html', 'player.html'):
+        (site / rel).write_text(page)
+    chunks = [f'chunk-{i}.js' for i in range(8)]
+    for c in chunks:
+        (site / '_next' / 'static' / 'chunks' / c).write_text('/*js*/' + 'y' * args.asset_size)
+
+    return {
+        'playlist': ['/api/video/playlist'],
+        'm3u8': ['/video-hls/bench/playlist.m3u8'],
+        'segment': [f'/video-hls/bench/{s}' for s in segs],
+        'next-static': [f'/_next/static/chunks/{c}' for c in chunks],
+        'site-index': ['/'],
+        'site-dir': ['/about'],
+        'site-html': ['/player'],
+        'site-404': ['/no/such/page'],
+    }
+
+
+# ---------- 服务端（子进程） ----------
+def serve(port: int):
+    from hypercorn.asyncio import serve as hypercorn_serve
+    from hypercorn.config import Config as HyperConfig
+    from backend.app import create_app
+
+    config = HyperConfig()
+    config.bind = [f'127.0.0.1:{port}']
+    config.accesslog = None
+    asyncio.run(hypercorn_serve(create_app(), config))
+
+
+def proc_cpu(pid: int) -> Optional[float]:
+    """user+system CPU seconds of ``pid`` (Linux /proc), or None."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+# ---------- 客户端 ----------
+class Conn:
+    """One keep-alive HTTP/1.1 connection; bodies are read and discarded."""
+
+    def __init__(self, port: int, headers: Dict[str, str]):
+        self.port = port
+        self.extra = ''.join(f'{k}: {v}\r\n' for k, v in headers.items())
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def get(self, path: str) -> Tuple[int, int]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+        self.writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n{self.extra}\r\n'.encode('latin-1'))
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length, chunked, close = None, False, False
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name, value = name.strip().lower(), value.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'transfer-encoding' and 'chunked' in value:
+                chunked = True
+            elif name == 'connection' and value == 'close':
+                close = True
+        size = 0
+        if chunked:
+            while True:
+                n = int((await self.reader.readline()).split(b';')[0], 16)
+                size += await self._discard(n)
+                await self.reader.readline()
+                if n == 0:
+                    break
+        elif length is not None:
+            size = await self._discard(length)
+        if close:
+            self.close()
+        return status, size
+
+    async def _discard(self, n: int) -> int:
+        left = n
+        while left:
+            chunk = await self.reader.read(min(left, 1 << 18))
+            if not chunk:
+                raise ConnectionError('connection closed mid-body')
+            left -= len(chunk)
+        return n
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def summarize(lat: List[float]) -> dict:
+    if not lat:
+        return {}
+    s = sorted(lat)
+
+    def pct(p: float) -> float:
+        return round(s[min(len(s) - 1, int(p / 100 * len(s)))] * 1000, 3)
+
+    return {'n': len(s), 'mean_ms': round(sum(s) / len(s) * 1000, 3),
+            'p50_ms': pct(50), 'p90_ms': pct(90), 'p99_ms': pct(99), 'max_ms': round(s[-1] * 1000, 3)}
+
+
+async def drive(port: int, pid: int, picks: List[Tuple[str, str]], concurrency: int, headers: Dict[str, str]) -> dict:
+    """Send ``picks`` ((route, url) pairs) over ``concurrency`` connections."""
+    lat: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    sent = 0
+    it = iter(picks)
+
+    async def worker():
+        nonlocal sent
+        conn = Conn(port, headers)
+        try:
+            for route, url in it:
+                t0 = time.perf_counter()
+                try:
+                    status, size = await conn.get(url)
+                except (OSError, ConnectionError, ValueError, IndexError, asyncio.IncompleteReadError):
+                    conn.close()
+                    errors[route] = errors.get(route, 0) + 1
+                    continue
+                lat.setdefault(route, []).append(time.perf_counter() - t0)
+                sent += size
+                if status >= 400:
+                    errors[route] = errors.get(route, 0) + 1
+        finally:
+            conn.close()
+
+    cpu0, t0 = proc_cpu(pid), time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall, cpu1 = time.perf_counter() - t0, proc_cpu(pid)
+    cpu = cpu1 - cpu0 if cpu0 is not None and cpu1 is not None else None
+    total = sum(len(v) for v in lat.values())
+    return {
+        'requests': total,
+        'errors': errors,
+        'wall_s': round(wall, 3),
+        'req_per_s': round(total / wall, 1) if wall else None,
+        'mb_per_s': round(sent / wall / 1e6, 2) if wall else None,
+        'server_cpu_s': round(cpu, 3) if cpu is not None else None,
+        'server_cpu_ms_per_req': round(cpu / total * 1000, 4) if cpu is not None and total else None,
+        'latency': summarize([x for v in lat.values() for x in v]),
+        'routes': {r: summarize(v) for r, v in sorted(lat.items())},
+    }
+
+
+async def wait_ready(port: int, proc: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f'服务进程已退出（code={proc.returncode}）')
+        conn = Conn(port, {})
+        try:
+            if (await conn.get('/api/health'))[0] == 200:
+                return
+        except (OSError, ConnectionError, ValueError, IndexError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            conn.close()
+        await asyncio.sleep(0.1)
+    raise SystemExit('服务启动超时')
+
+
+def parse_mix(spec: str, routes: Dict[str, List[str]]) -> Dict[str, float]:
+    mix = {}
+    for item in spec.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in routes:
+            raise SystemExit(f'未知路由 {name!r}，可选：{", ".join(routes)}')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as d:
+        tmp = Path(d)
+        setup_env(tmp)
+        routes = build_fixtures(tmp, args)
+        mix = parse_mix(args.mix, routes)
+        headers = {} if args.no_origin else {'Origin': ORIGIN}
+        rng = random.Random(args.seed)
+
+        proc = subprocess.Popen([sys.executable, __file__, '--serve', str(args.port)], env=os.environ.copy())
+        try:
+            await wait_ready(args.port, proc)
+            # 预热：每个 URL 走一遍，页缓存和播放列表缓存就绪
+            await drive(args.port, proc.pid, [(r, u) for r in mix for u in routes[r]], args.concurrency, headers)
+
+            per_route = {}
+            for route in mix:
+                picks = [(route, routes[route][i % len(routes[route])]) for i in range(args.per_route)]
+                per_route[route] = await drive(args.port, proc.pid, picks, args.concurrency, headers)
+                per_route[route].pop('routes')
+
+            names, weights = list(mix), list(mix.values())
+            picks = [(r, rng.choice(routes[r])) for r in rng.choices(names, weights, k=args.requests)]
+            mixed = await drive(args.port, proc.pid, picks, args.concurrency, headers)
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    report = {
+        'params': {'concurrency': args.concurrency, 'requests': args.requests, 'per_route': args.per_route,
+                   'mix': mix, 'segment_size': args.segment_size, 'tracks': args.tracks,
+                   'origin': None if args.no_origin else ORIGIN},
+        'per_route': per_route,
+        'mixed': mixed,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + '\n', encoding='utf-8')
+    print(text)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--serve', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    p.add_argument('--port', type=int, default=8765)
+    p.add_argument('--concurrency', type=int, default=16, help='keep-alive connections')
+    p.add_argument('--requests', type=int, default=3000, help='requests in the mixed run')
+    p.add_argument('--per-route', type=int, default=500, help='requests per route in the isolated runs')
+    p.add_argument('--mix', default=DEFAULT_MIX, help=f'route=weight list (default: {DEFAULT_MIX})')
+    p.add_argument('--segments', type=int, default=20)
+    p.add_argument('--segment-size', type=int, default=512 * 1024, help='bytes per segment')
+    p.add_argument('--tracks', type=int, default=500, help='entries in the video playlist')
+    p.add_argument('--page-size', type=int, default=16 * 1024, help='bytes per site HTML page')
+    p.add_argument('--asset-size', type=int, default=64 * 1024, help='bytes per _next/static chunk')
+    p.add_argument('--no-origin', action='store_true', help='send no Origin header (CORS hook does less work)')
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--out', help='also write the JSON report to this file')
+    a = p.parse_args()
+    if a.serve:
+        serve(a.serve)
+    else:
+        asyncio.run(main(a))
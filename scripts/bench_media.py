@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Benchmark HLS segment serving: ``serve_media`` vs. the old ``send_from_directory`` handler.
+
+Runs in-process through Quart's test client (full request/response path,
+no sockets), so the numbers compare the Python-side cost per segment.
+Reports segments/sec of wall time and segments per CPU-second (one core).
+
+    python scripts/bench_media.py --segments 20 --size 1048576 --requests 500 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+
+def setup_env(tmp: Path):
+    for key in ('VIDEO_UPLOAD_DIR', 'VIDEO_HLS_DIR', 'MUSIC_UPLOAD_DIR', 'MUSIC_HLS_DIR'):
+        os.environ[key] = str(tmp / key.lower())
+    os.environ['VIDEO_PLAYLIST_FILE'] = str(tmp / 'video-playlist' / 'playlist.json')
+    os.environ['MUSIC_PLAYLIST_FILE'] = str(tmp / 'music-playlist' / 'playlist.json')
+    os.environ['PROBE_CACHE_FILE'] = str(tmp / 'cache' / 'probe.json')
+    os.environ['JOBS_DB_FILE'] = str(tmp / 'cache' / 'jobs.sqlite3')
+    os.environ['CATALOG_DB_FILE'] = str(tmp / 'cache' / 'catalog.sqlite3')
+    os.environ['FRONTEND_ENABLE'] = '0'
+    os.environ['MEDIA_OFFLOAD'] = ''
+
+
+async def run(client, urls, requests: int, concurrency: int, headers=None) -> dict:
+    it = iter(range(requests))
+    sent = 0
+
+    async def worker():
+        nonlocal sent
+        for i in it:
+            r = await client.get(urls[i % len(urls)], headers=headers or {})
+            body = await r.get_data()
+            if r.status_code not in (200, 206, 304):
+                raise RuntimeError(f'{urls[i % len(urls)]}: HTTP {r.status_code}')
+            sent += len(body)
+
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - t0
+    return {
+        'requests': requests,
+        'wall_s': round(wall, 3),
+        'cpu_s': round(cpu, 3),
+        'segments_per_s': round(requests / wall, 1),
+        'segments_per_cpu_s': round(requests / cpu, 1) if cpu else None,
+        'mb_per_s': round(sent / wall / 1e6, 1),
+    }
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as d:
+        tmp = Path(d)
+        setup_env(tmp)
+        from quart import send_from_directory
+        from backend.app import create_app
+
+        app = create_app()
+        cfg = app.config['APP_CONFIG']
+
+        # 旧实现：send_from_directory + 修正 MIME，挂在单独的路径上对比
+        @app.get('/legacy-hls/<path:filename>')
+        async def _legacy(filename: str):
+            resp = await send_from_directory(str(cfg.VIDEO_HLS_DIR), filename)
+            if filename.endswith('.ts'):
+                resp.mimetype = 'video/mp2t'
+            return resp
+
+        outdir = cfg.VIDEO_HLS_DIR / 'bench'
+        outdir.mkdir(parents=True, exist_ok=True)
+        payload = os.urandom(args.size)
+        names = [f'segment_{i:03d}.ts' for i in range(args.segments)]
+        for n in names:
+            (outdir / n).write_bytes(payload)
+
+        client = app.test_client()
+        results = {}
+        for label, prefix in (('legacy', '/legacy-hls'), ('serve_media', '/video-hls')):
+            urls = [f'{prefix}/bench/{n}' for n in names]
+            await run(client, urls, min(50, args.requests), args.concurrency)  # 预热页缓存
+            results[label] = await run(client, urls, args.requests, args.concurrency)
+            if args.range:
+                results[label + '_range'] = await run(client, urls, args.requests, args.concurrency,
+                                                      headers={'Range': f'bytes=0-{args.size // 2}'})
+        report = {
+            'segment_bytes': args.size,
+            'segments': args.segments,
+            'concurrency': args.concurrency,
+            'results': results,
+            'speedup_per_cpu': round(results['serve_media']['segments_per_cpu_s'] / results['legacy']['segments_per_cpu_s'], 2),
+        }
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--segments', type=int, default=20)
+    p.add_argument('--size', type=int, default=1 << 20, help='bytes per segment')
+    p.add_argument('--requests', type=int, default=500)
+    p.add_argument('--concurrency', type=int, default=8)
+    p.add_argument('--range', action='store_true', help='also benchmark half-segment range requests')
+    asyncio.run(main(p.parse_args()))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Benchmark the scan pipeline on a synthetic upload tree, phase by phase.
+
+Builds a throw-away tree of ``--files`` uploads per library, spread over
+``--depth`` directory levels with ``--fanout`` sub-directories each, and runs
+``scan_and_convert_videos`` / ``scan_and_convert_music`` ``--runs`` times
+(the first run is cold, later ones rescan an unchanged tree). Each run
+reports the scan's own phase timings (walk, probe, transcode, meta,
+backfill, playlist, catalog) plus wall and CPU time, as JSON.
+
+Fixtures:
+  --media stub   zero-byte files; probing and transcoding fail fast, which
+                 isolates walk / metadata / catalog overhead. Content dedup is
+                 off unless --dedup is given (all stubs would share one output).
+  --media real   short clips rendered once with ffmpeg's lavfi sources
+                 (testsrc + sine for video, sine for music) and stream-copied
+                 per file with a distinct tag, so no two uploads are identical.
+
+    python scripts/bench_scan.py --files 500 --depth 2 --media stub --runs 3 --out scan.json
+    python scripts/bench_scan.py --files 20 --media real --seconds 2 --kind music
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+# (扩展名, lavfi 生成参数)
+FIXTURES = {
+    'video': ('.mp4', lambda s: ['-f', 'lavfi', '-i', f'testsrc=duration={s}:size=320x240:rate=25',
+                                 '-f', 'lavfi', '-i', f'sine=frequency=440:duration={s}',
+                                 '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+                                 '-c:a', 'aac', '-shortest']),
+    'music': ('.m4a', lambda s: ['-f', 'lavfi', '-i', f'sine=frequency=440:duration={s}', '-c:a', 'aac']),
+}
+
+
+def setup_env(tmp: Path, dedup: bool):
+    for key in ('VIDEO_UPLOAD_DIR', 'VIDEO_HLS_DIR', 'MUSIC_UPLOAD_DIR', 'MUSIC_HLS_DIR'):
+        os.environ[key] = str(tmp / key.lower())
+    os.environ['VIDEO_PLAYLIST_FILE'] = str(tmp / 'video-playlist' / 'playlist.json')
+    os.environ['MUSIC_PLAYLIST_FILE'] = str(tmp / 'music-playlist' / 'playlist.json')
+    os.environ['PROBE_CACHE_FILE'] = str(tmp / 'cache' / 'probe.json')
+    os.environ['JOBS_DB_FILE'] = str(tmp / 'cache' / 'jobs.sqlite3')
+    os.environ['CATALOG_DB_FILE'] = str(tmp / 'cache' / 'catalog.sqlite3')
+    os.environ['UPLOAD_DEDUP'] = '1' if dedup else '0'
+
+
+def tree_dirs(root: Path, depth: int, fanout: int) -> list[Path]:
+    """Leaf directories of a ``fanout``-ary tree ``depth`` levels deep (``root`` itself at depth 0)."""
+    level = [root]
+    for d in range(depth):
+        level = [p / f'd{d}_{i}' for p in level for i in range(fanout)]
+    return level
+
+
+def render_base(kind: str, seconds: float, tmp: Path) -> Path:
+    ext, args = FIXTURES[kind]
+    out = tmp / f'base-{kind}{ext}'
+    subprocess.run(['ffmpeg', '-v', 'error', '-y', *args(seconds), str(out)], check=True)
+    if not out.exists() or out.stat().st_size == 0:
+        raise SystemExit(f'ffmpeg 未能生成 {out}')
+    return out
+
+
+def populate(kind: str, upload_dir: Path, args, tmp: Path) -> int:
+    ext = FIXTURES[kind][0]
+    base = render_base(kind, args.seconds, tmp) if args.media == 'real' else None
+    dirs = tree_dirs(upload_dir, args.depth, args.fanout)
+    for i in range(args.files):
+        d = dirs[i % len(dirs)]
+        d.mkdir(parents=True, exist_ok=True)
+        dst = d / f'Artist{i % 50} - {kind} {i:05d}{ext}'
+        if base is None:
+            dst.touch()
+        else:
+            # 流复制 + 不同的元数据标签：几乎不耗时，且每个文件内容都不同
+            subprocess.run(['ffmpeg', '-v', 'error', '-y', '-i', str(base), '-c', 'copy',
+                            '-metadata', f'comment=bench {i}', str(dst)], check=True)
+    return len(dirs)
+
+
+def git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def timed(scan, cfg) -> dict:
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    result = await scan(cfg, log=lambda line: None)
+    return {
+        'wall_s': round(time.perf_counter() - t0, 4),
+        'cpu_s': round(time.process_time() - cpu0, 4),
+        'phases': result.get('phases', {}),
+        'count': result.get('count'),
+        'updated': result.get('updated'),
+    }
+
+
+async def main(args):
+    if args.media == 'real' and not shutil.which('ffmpeg'):
+        raise SystemExit('--media real 需要 ffmpeg（请安装并加入 PATH）')
+    with tempfile.TemporaryDirectory() as d:
+        tmp = Path(d)
+        setup_env(tmp, args.dedup or args.media == 'real')
+        from backend.catalog import close_catalogs
+        from backend.config import Config
+        from backend.services.music import scan_and_convert_music
+        from backend.services.video import scan_and_convert_videos
+
+        cfg = Config.from_env()
+        scans = {'video': (scan_and_convert_videos, cfg.VIDEO_UPLOAD_DIR),
+                 'music': (scan_and_convert_music, cfg.MUSIC_UPLOAD_DIR)}
+        kinds = [args.kind] if args.kind else ['video', 'music']
+        report = {
+            'commit': git_rev(),
+            'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+                        'ffmpeg': shutil.which('ffmpeg'), 'transcode_concurrency': cfg.TRANSCODE_CONCURRENCY},
+            'params': {'files': args.files, 'depth': args.depth, 'fanout': args.fanout, 'media': args.media,
+                       'seconds': args.seconds if args.media == 'real' else None, 'runs': args.runs,
+                       'dedup': cfg.UPLOAD_DEDUP},
+            'results': {},
+        }
+        for kind in kinds:
+            scan, upload_dir = scans[kind]
+            t0 = time.perf_counter()
+            dirs = populate(kind, upload_dir, args, tmp)
+            fixture_s = round(time.perf_counter() - t0, 3)
+            runs = []
+            for i in range(args.runs):
+                run = await timed(scan, cfg)
+                run['run'] = 'cold' if i == 0 else 'warm'
+                runs.append(run)
+            report['results'][kind] = {'fixture_s': fixture_s, 'dirs': dirs, 'runs': runs}
+        close_catalogs()
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        Path(args.out).write_text(text + '\n', encoding='utf-8')
+    print(text)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--files', type=int, default=200, help='uploads per library')
+    p.add_argument('--depth', type=int, default=2, help='directory levels below the upload dir')
+    p.add_argument('--fanout', type=int, default=4, help='sub-directories per level')
+    p.add_argument('--media', choices=('stub', 'real'), default='stub')
+    p.add_argument('--seconds', type=float, default=2.0, help='clip length for --media real')
+    p.add_argument('--kind', choices=('video', 'music'))
+    p.add_argument('--runs', type=int, default=2, help='scans per library (first cold, then warm rescans)')
+    p.add_argument('--dedup', action='store_true', help='keep UPLOAD_DEDUP on for stub trees')
+    p.add_argument('--out', help='also write the JSON report to this file')
+    asyncio.run(main(p.parse_args()))
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Measure cold start: import time, create_app() time and time to first response.
+
+Each run boots a fresh interpreter that imports ``backend.app``, calls
+``create_app()`` and serves it under Hypercorn on a throw-away tree whose
+media dirs do not exist yet. The parent polls the port and times the first
+answered request of each probe (``/api/health``, ``/api/video/playlist`` and
+the exported site's ``/``), measured from process spawn. The child also
+reports which scan-service modules were imported during startup and whether
+any library directory was created. Both should be empty/false: the services
+load on the first scan, and the directories are created then too.
+
+    python scripts/bench_startup.py --runs 10
+    python scripts/bench_startup.py --runs 5 --out startup.json
+    python scripts/bench_startup.py --runs 5 --watch --strict
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+PROBES = {'health': '/api/health', 'playlist': '/api/video/playlist', 'site-index': '/'}
+# 启动时不应被导入的模块：扫描服务在首次扫描时才加载
+LAZY_MODULES = ('backend.services.video', 'backend.services.music', 'backend.services.probe',
+                'backend.services.scheduler', 'backend.services.manifest', 'backend.services.library')
+LIBRARY_DIRS = ('video_upload_dir', 'video_hls_dir', 'music_upload_dir', 'music_hls_dir', 'video-playlist', 'music-playlist')
+
+
+# ---------- 夹具 ----------
+def setup_env(tmp: Path, watch: bool = False):
+    for key in ('VIDEO_UPLOAD_DIR', 'VIDEO_HLS_DIR', 'MUSIC_UPLOAD_DIR', 'MUSIC_HLS_DIR'):
+        os.environ[key] = str(tmp / key.lower())
+    os.environ['VIDEO_PLAYLIST_FILE'] = str(tmp / 'video-playlist' / 'playlist.json')
+    os.environ['MUSIC_PLAYLIST_FILE'] = str(tmp / 'music-playlist' / 'playlist.json')
+    os.environ['PROBE_CACHE_FILE'] = str(tmp / 'cache' / 'probe.json')
+    os.environ['JOBS_DB_FILE'] = str(tmp / 'cache' / 'jobs.sqlite3')
+    os.environ['CATALOG_DB_FILE'] = str(tmp / 'cache' / 'catalog.sqlite3')
+    os.environ['FRONTEND_ENABLE'] = '1'
+    os.environ['FRONTEND_SITE_DIR'] = str(tmp / 'site')
+    os.environ['WATCH_UPLOADS'] = '1' if watch else '0'
+
+
+def build_site(tmp: Path):
+    site = tmp / 'site'
+    (site / '_next' / 'static' / 'chunks').mkdir(parents=True, exist_ok=True)
+    (site / 'index.html').write_text('<!doctype html><title>bench</title>', encoding='utf-8')
+    (site / '404.html').write_text('<!doctype html><title>404</title>', encoding='utf-8')
+    (site / '_next' / 'static' / 'chunks' / 'main.js').write_text('console.log(1)', encoding='utf-8')
+
+
+# ---------- 服务端（子进程） ----------
+def serve(port: int):
+    t0 = time.monotonic()
+    from backend.app import create_app
+    t1 = time.monotonic()
+    app = create_app()
+    t2 = time.monotonic()
+    report = {
+        'import_s': t1 - t0,
+        'create_app_s': t2 - t1,
+        'ready_at': t2,
+        'lazy_loaded': [m for m in LAZY_MODULES if m in sys.modules],
+    }
+    print(json.dumps(report), flush=True)
+
+    from hypercorn.asyncio import serve as hypercorn_serve
+    from hypercorn.config import Config as HyperConfig
+
+    config = HyperConfig()
+    config.bind = [f'127.0.0.1:{port}']
+    config.accesslog = None
+    asyncio.run(hypercorn_serve(app, config))
+
+
+# ---------- 客户端 ----------
+async def get_status(port: int, path: str) -> Optional[int]:
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return None
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n'.encode('latin-1'))
+        await writer.drain()
+        line = await reader.readline()
+        await reader.read()
+        return int(line.split()[1]) if line else None
+    except (OSError, IndexError, ValueError):
+        return None
+    finally:
+        writer.close()
+
+
+async def first_responses(port: int, proc: subprocess.Popen, spawned: float, timeout: float) -> Dict[str, float]:
+    """Seconds from spawn until each probe first gets an HTTP status (any status counts)."""
+    done: Dict[str, float] = {}
+    deadline = spawned + timeout
+    while len(done) < len(PROBES):
+        if proc.poll() is not None:
+            raise RuntimeError(f'server exited with code {proc.returncode}')
+        if time.monotonic() > deadline:
+            raise TimeoutError(f'no response within {timeout}s: {sorted(set(PROBES) - set(done))}')
+        for name, path in PROBES.items():
+            if name in done:
+                continue
+            status = await get_status(port, path)
+            if status is not None:
+                done[name] = time.monotonic() - spawned
+        if len(done) < len(PROBES):
+            await asyncio.sleep(0.002)
+    return done
+
+
+def one_run(port: int, timeout: float, watch: bool = False) -> dict:
+    with tempfile.TemporaryDirectory(prefix='bench-startup-') as d:
+        tmp = Path(d)
+        setup_env(tmp, watch)
+        build_site(tmp)
+        spawned = time.monotonic()
+        proc = subprocess.Popen([sys.executable, __file__, '--serve', str(port)],
+                                env=os.environ.copy(), stdout=subprocess.PIPE, text=True)
+        try:
+            first = asyncio.run(first_responses(port, proc, spawned, timeout))
+            child = json.loads(proc.stdout.readline())
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+        return {
+            'import_s': child['import_s'],
+            'create_app_s': child['create_app_s'],
+            'spawn_to_ready_s': child['ready_at'] - spawned,
+            **{f'first_{k}_s': v for k, v in first.items()},
+            'lazy_loaded': child['lazy_loaded'],
+            # 上传监听启动后会立即排队一次全量扫描，由它建目录，不算启动期行为
+            'dirs_created': [] if watch else [n for n in LIBRARY_DIRS if (tmp / n).exists()],
+        }
+
+
+def summarize(values: List[float]) -> dict:
+    return {'median_ms': round(statistics.median(values) * 1000, 2), 'min_ms': round(min(values) * 1000, 2),
+            'max_ms': round(max(values) * 1000, 2)}
+
+
+def main(args):
+    runs = [one_run(args.port, args.timeout, args.watch) for _ in range(args.runs)]
+    metrics = [k for k in runs[0] if k.endswith('_s')]
+    report = {
+        'runs': args.runs,
+        'watch': args.watch,
+        'python': sys.version.split()[0],
+        'timings': {k[:-2]: summarize([r[k] for r in runs]) for k in metrics},
+        'lazy_loaded': sorted({m for r in runs for m in r['lazy_loaded']}),
+        'dirs_created': sorted({n for r in runs for n in r['dirs_created']}),
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        Path(args.out).write_text(text + '\n', encoding='utf-8')
+    if args.strict and (report['lazy_loaded'] or report['dirs_created']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--runs', type=int, default=5, help='cold starts to measure')
+    p.add_argument('--port', type=int, default=8765)
+    p.add_argument('--timeout', type=float, default=30.0, help='seconds to wait for the first responses')
+    p.add_argument('--strict', action='store_true',
+                   help='exit 1 if a scan service was imported or a library dir created during startup')
+    p.add_argument('--watch', action='store_true',
+                   help='start with WATCH_UPLOADS=1 (the upload watcher must not import the scan services either)')
+    p.add_argument('--out', help='also write the JSON report to this file')
+    p.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.serve:
+        serve(args.serve)
+    else:
+        main(args)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Export the catalog's track metadata to per-directory meta.json files, or import it back.
+
+meta.json is no longer written by scans; it exists for disaster recovery
+(e.g. HLS outputs copied to a new host without the catalog database).
+
+    python scripts/catalog_meta.py export [--kind video|music]
+    python scripts/catalog_meta.py import [--kind video|music]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+
+def main(args):
+    from backend.catalog import catalog_for
+    from backend.config import Config
+
+    cfg = Config.from_env()
+    catalog = catalog_for(cfg)
+    hls_dirs = {'video': cfg.VIDEO_HLS_DIR, 'music': cfg.MUSIC_HLS_DIR}
+    for kind in ([args.kind] if args.kind else ['video', 'music']):
+        if args.action == 'export':
+            n = catalog.export_meta(kind, hls_dirs[kind])
+            print(f"[EXPORT] {kind}: 写出 {n} 个 meta.json 到 {hls_dirs[kind]}")
+        else:
+            n = catalog.import_meta(kind, hls_dirs[kind])
+            print(f"[IMPORT] {kind}: 读取 {n} 个 meta.json，下次扫描时补入播放列表")
+    catalog.close()
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('action', choices=('export', 'import'))
+    p.add_argument('--kind', choices=('video', 'music'))
+    main(p.parse_args())